@@ -0,0 +1,152 @@
+"""
+Accuracy tiers:  how hard solveState works for a state, by name.  A tier sets the relative tolerance every
+solver stops at (brentq, fsolve, the near-critical solvers and the pairSolver check), the property backend
+and the evaluation and time allowance of each solve.
+    display      for the calculators' labels:  tolerance 1e-7 on pyXSteam, 300 evaluations.  Within 1e-3 of the
+                 IF97 state, which is as close as pyXSteam's backward equations for p-h and p-s get (0.02 K).
+                 0.72 ms a state, 7.2 times as fast as reference.
+    engineering  tolerance 1e-8 on the kernel backend, 300 evaluations.  Within 1e-6.  3.4 ms a state, 1.5 times
+                 as fast as reference.
+    reference    tolerance 1e-11 on the kernel backend, 1000 evaluations.  Within 1e-8.  5.2 ms a state.
+The bounds are the largest relative difference (t in kelvin, x absolute) of p, t, v, u, h, s from the state a
+workload was made from, where the pair fixes that state.  Where it hardly does (u-h, u-s and h-s near the
+critical point, liquid u-h) a solve to the same tolerance lands further away.  The times are those of the
+benchmark below on 300 states in SI units on one CPU (English units give the same within 5%), where the process
+default (no tier) takes 1.0 ms a state; every tier solves the same rows, the 2 of 300 none can solve being u-h
+pairs with no state.  The evaluations allowed are the same for display and engineering:  an ill-conditioned pair
+(liquid u-s, say) can take fsolve its full 300 whatever the tolerance.  The tabulated backend is not
+a tier's:  it only pays off on arrays, and one call at a time pyXSteam is faster than both IF97 backends.
+The tier is chosen per call with the accuracy argument of StateSolver.solveState, and per process with
+setAccuracy or the THERMO_ACCURACY environment variable; with no tier, the solvers use their own tolerances on
+the process default backend, as they always have.
+    python AccuracyTier.py [--n 300] [--english] [--seed 0]
+solves a workload in every tier and measures the speed and the error bounds.
+"""
+#region imports
+import os
+from collections import namedtuple
+from StateValidator import solveBudget
+#endregion
+
+#region class definitions
+accuracyTier = namedtuple('accuracyTier', ['name', 'rtol', 'backend', 'maxEvaluations', 'maxSeconds', 'bound'])
+
+tiers = {
+    'display': accuracyTier('display', 1e-7, 'xsteam', 300, 0.5, 1e-3),
+    'engineering': accuracyTier('engineering', 1e-8, 'kernel', 300, 1.0, 1e-6),
+    'reference': accuracyTier('reference', 1e-11, 'kernel', 1000, 5.0, 1e-8),
+}
+_default = [os.environ.get('THERMO_ACCURACY') or None]
+#endregion
+
+#region function definitions
+def getAccuracy(name=None):
+    """
+    :param name: one of tiers, the process default if None
+    :return: the accuracyTier, or None if neither is set
+    """
+    name = _default[0] if name is None else name
+    if name is None:
+        return None
+    if name not in tiers:
+        raise ValueError("Unknown accuracy tier {:}, expected one of {:}".format(name, list(tiers)))
+    return tiers[name]
+
+def setAccuracy(name):
+    """
+    Make a tier the default for the process
+    :param name: one of tiers, or None for the solvers' own tolerances
+    :return: nothing
+    """
+    if name is not None and name not in tiers:
+        raise ValueError("Unknown accuracy tier {:}, expected one of {:}".format(name, list(tiers)))
+    _default[0] = name
+
+def tierBudget(tier):
+    """
+    :return: a new solveBudget with a tier's allowance and tolerance
+    """
+    return solveBudget(tier.maxEvaluations, tier.maxSeconds, tier.rtol)
+
+def benchmarkTiers(n=300, SI=True, seed=0):
+    """
+    Solve one workload in every tier, and with the process default, and measure each one's time and its
+    difference from the states the workload was made from.  The differences are taken over the states the
+    reference tier finds within 1e-6; the rest have another state with the same two values (u-h, x with h or s
+    near the critical point, ...) and say nothing about accuracy.
+    :param n: rows in the workload
+    :return: {tier name (None for the default): dict of timings, failures and differences}
+    """
+    import time
+    import numpy as np
+    from IF97 import toKelvin
+    from StateSolver import solveState
+    from WorkloadGenerator import makeWorkload
+    work = makeWorkload(n, SI=SI, seed=seed)
+    rows = work.rows()
+    for name in tiers:  # build the backends' tables before timing
+        solveState('p', 'x', 10.0 if SI else 150.0, 0.5, SI, accuracy=name)
+    results = {}
+    errors = {}
+    for name in ('reference', None) + tuple(k for k in tiers if k != 'reference'):
+        errors[name] = np.full(len(rows), np.nan)
+        failed = 0
+        t0 = time.perf_counter()
+        for i, (p1, p2, a, b) in enumerate(rows):
+            try:
+                s = solveState(p1, p2, a, b, SI, accuracy=name)
+            except Exception:
+                failed += 1
+                continue
+            ref = {k: work.ref[k][i] for k in 'ptvuhsx'}
+            errors[name][i] = max([abs(s.v / ref['v'] - 1.0), abs(s.x - ref['x']),
+                                   abs(toKelvin(s.t, SI) / toKelvin(ref['t'], SI) - 1.0)] +
+                                  [abs(getattr(s, k) - ref[k]) / max(abs(ref[k]), 1.0) for k in 'puhs'])
+        results[name] = {'ms per state': 1e3 * (time.perf_counter() - t0) / len(rows), 'failed': failed}
+    fixed = errors['reference'] <= 1e-6
+    for name in results:
+        e = errors[name][fixed & ~np.isnan(errors[name])]
+        results[name].update({'median error': float(np.median(e)), 'p99 error': float(np.percentile(e, 99)),
+                              'largest error': float(np.max(e))})
+    return results
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Time the accuracy tiers and measure their error bounds")
+    parser.add_argument('--n', type=int, default=300, help="states in the workload")
+    parser.add_argument('--english', action='store_true', help="use English units")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    # rows a tier once failed that every other tier solves:  a near-critical v-p state whose nested volume roots
+    # used up the display allowance, and liquid u-s states that fsolve takes 300 evaluations to close
+    import sys
+    from StateSolver import solveState
+    pinned = [('v', 'p', 0.0016735643641147494, 312.5438122152316),
+              ('u', 's', 3.927473834988087, 0.014353417742274782),
+              ('s', 'u', 0.08341173602489087, 23.0117575445905)]
+    failures = []
+    for row in pinned:
+        for name in (None,) + tuple(tiers):
+            try:
+                solveState(*row, True, accuracy=name)
+            except Exception as e:
+                failures.append("{:} in tier {:}: {:}".format(row, name, e))
+    print("pinned rows: {:} of {:} solves failed".format(len(failures), len(pinned) * (len(tiers) + 1)))
+    for f in failures:
+        print("  " + f)
+    results = benchmarkTiers(args.n, not args.english, args.seed)
+    base = results['reference']['ms per state']
+    columns = list(results[None])
+    print("{:12}".format("tier") + "".join("{:>16}".format(c) for c in columns) + "{:>16}{:>12}".format(
+        "vs reference", "bound"))
+    for name in (None,) + tuple(tiers):
+        row = results[name]
+        print("{:12}".format(name or "(default)") + "".join("{:>16.3g}".format(row[c]) for c in columns) +
+              "{:>16.2f}{:>12}".format(base / row['ms per state'], "{:g}".format(tiers[name].bound) if name else ""))
+    if failures:
+        sys.exit(1)
+#endregion
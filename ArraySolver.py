@@ -0,0 +1,247 @@
+#region imports
+from collections import namedtuple
+import numpy as np
+from IF97Array import propertiesPT, saturationP, tsatP
+from IF97 import toMPa, fromKelvin, _tToK
+from RegionClassifier import classifyPairArray
+from StateSolver import getSteamTable, solveState
+from StateBatch import stateColumns
+from AccuracyTier import getAccuracy
+#endregion
+
+#region class definitions
+# what happened to a batch:  how many points Newton solved, how many were two-phase (solved by bisection on the
+# saturation line), how many went to the scalar solver and how many of those failed, the number of Newton
+# iterations the batch took and fallback / points
+newtonReport = namedtuple('newtonReport', ['points', 'newton', 'twoPhase', 'fallback', 'failed', 'iterations',
+                                           'fallbackRate'])
+#endregion
+
+#region function definitions
+def _scaledResiduals(vals, aName, a, bName, b):
+    """
+    :return: residuals of the two properties relative to the specified values (v is ~0.001, h ~1000)
+    """
+    sA = np.abs(a) if aName == 'v' else np.maximum(np.abs(a), 1.0)
+    sB = np.abs(b) if bName == 'v' else np.maximum(np.abs(b), 1.0)
+    return (a - vals[aName]) / sA, (b - vals[bName]) / sB, sA, sB
+
+def _newton(aName, a, bName, b, p0, t0, SI, tol, maxIter, damping=1e-3):
+    """
+    Damped Newton in (ln p, t) on all points at once, the damping being Levenberg-Marquardt's: each point
+    carries its own mu, which shrinks after a step that lowers its residual (towards the plain Newton step)
+    and grows after one that does not (towards a short steepest-descent step).  Converged points drop out of
+    the active set and a point is given up once its mu passes 1e8.
+    :param damping: every point's first mu; small for seeds already close to the root
+    :return: (p, t, converged mask, iterations)
+    """
+    n = len(a)
+    tScale = 100.0 / _tToK[SI]  # t is iterated in units of 100 K so both unknowns are of order one
+    lnp, tau = np.log(p0), t0 / tScale
+    mu = np.full(n, damping)
+    done = np.zeros(n, dtype=bool)
+    stuck = ~np.isfinite(lnp) | ~np.isfinite(tau)
+    iterations = 0
+    for iterations in range(1, maxIter + 1):
+        idx = np.flatnonzero(~done & ~stuck)
+        if len(idx) == 0:
+            iterations -= 1
+            break
+        P, T = np.exp(lnp[idx]), tau[idx] * tScale
+        vals, dp, dT = propertiesPT(P, T, SI, derivatives=True)
+        fa, fb, sA, sB = _scaledResiduals(vals, aName, a[idx], bName, b[idx])
+        merit = fa ** 2 + fb ** 2
+        conv = (np.abs(fa) < tol) & (np.abs(fb) < tol)
+        done[idx[conv]] = True
+        bad = ~np.isfinite(merit)
+        stuck[idx[bad]] = True
+        keep = ~conv & ~bad
+        idx, P, fa, fb, merit, sA, sB = idx[keep], P[keep], fa[keep], fb[keep], merit[keep], sA[keep], sB[keep]
+        if len(idx) == 0:
+            continue
+        # Jacobian of the scaled residuals with respect to (ln p, t / tScale)
+        J11 = -dp[aName][keep] * P / sA
+        J12 = -dT[aName][keep] * tScale / sA
+        J21 = -dp[bName][keep] * P / sB
+        J22 = -dT[bName][keep] * tScale / sB
+        # (J'J + mu I) d = -J'f
+        m = mu[idx]
+        A11 = J11 ** 2 + J21 ** 2 + m
+        A12 = J11 * J12 + J21 * J22
+        A22 = J12 ** 2 + J22 ** 2 + m
+        g1 = J11 * fa + J21 * fb
+        g2 = J12 * fa + J22 * fb
+        det = A11 * A22 - A12 ** 2
+        dlnp = np.clip(-(A22 * g1 - A12 * g2) / det, -1.0, 1.0)
+        dtau = np.clip(-(A11 * g2 - A12 * g1) / det, -0.5, 0.5)
+        trialLnp = lnp[idx] + dlnp
+        trialTau = tau[idx] + dtau
+        trial = propertiesPT(np.exp(trialLnp), trialTau * tScale, SI)
+        ta, tb = _scaledResiduals(trial, aName, a[idx], bName, b[idx])[:2]
+        better = np.isfinite(ta) & np.isfinite(tb) & (ta ** 2 + tb ** 2 < merit)
+        acc = idx[better]
+        lnp[acc], tau[acc] = trialLnp[better], trialTau[better]
+        mu[acc] = np.maximum(mu[acc] / 3.0, 1e-12)
+        rej = idx[~better]
+        mu[rej] *= 4.0
+        stuck[rej[mu[rej] > 1e8]] = True
+    return np.exp(lnp), tau * tScale, done, iterations
+
+def _bisectSaturation(aName, a, bName, b, lo, hi, SI, iterations=60):
+    """
+    For two-phase points: bisect each bracket of saturation pressures for the one where both properties give
+    the same quality, all points together.
+    :return: (p, x), nan where the kernel cannot evaluate the saturation line (tsat above 623.15 K)
+    """
+    def residual(p):
+        sat = saturationP(p, SI)
+        x = (a - sat[aName + 'L']) / (sat[aName + 'V'] - sat[aName + 'L'])
+        return b - (sat[bName + 'L'] + x * (sat[bName + 'V'] - sat[bName + 'L'])), x
+
+    gLo = residual(lo)[0]
+    for i in range(iterations):
+        mid = 0.5 * (lo + hi)
+        gMid = residual(mid)[0]
+        same = np.sign(gMid) == np.sign(gLo)
+        lo = np.where(same, mid, lo)
+        gLo = np.where(same, gMid, gLo)
+        hi = np.where(same, hi, mid)
+    p = 0.5 * (lo + hi)
+    g, x = residual(p)
+    bad = ~np.isfinite(g) | ~np.isfinite(x)
+    return np.where(bad, np.nan, p), np.where(bad, np.nan, x)
+
+def solvePairArray(stProp1, stProp2, stPropVal1, stPropVal2, SI=True, tol=None, maxIter=100, seedP=None,
+                   seedT=None, damping=1e-3, accuracy=None):
+    """
+    Invert many states specified by the same pair of v, u, h and s at once.  The region of every point comes
+    from RegionClassifier.classifyPairArray; single-phase points are solved together by damped Newton on the
+    IF97Array kernel and two-phase points by bisection along the saturation line.  Points neither can finish
+    (region 3, the near-critical region, or Newton stalling) are handed one by one to StateSolver.solveState.
+    :param stProp1: first specified property, one of 'v','u','h','s'
+    :param stProp2: second specified property, another of 'v','u','h','s'
+    :param stPropVal1: array of values of stProp1
+    :param stPropVal2: array of values of stProp2
+    :param SI: boolean True=SI units, False = English units
+    :param tol: convergence tolerance on the residuals relative to the specified values, the accuracy tier's
+                rtol or 1e-9 if None
+    :param maxIter: most Newton iterations
+    :param seedP: pressure (or array of them) single-phase points start from, e.g. a nearby state's shared by
+                  points scattered around it; the classifier's seeds if None
+    :param seedT: temperature to start from with seedP
+    :param damping: first Levenberg-Marquardt mu of every point; the default suits the classifier's seeds, and
+                    seeds within a few percent of the roots converge in a third of the steps from 1e-12
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None; the points handed
+                     to StateSolver are solved to it too
+    :return: (stateColumns, newtonReport)
+    """
+    if tol is None:
+        tier = getAccuracy(accuracy)
+        tol = 1e-9 if tier is None else tier.rtol
+    aName, bName = stProp1.lower(), stProp2.lower()
+    if aName == bName or aName not in 'vuhs' or bName not in 'vuhs':
+        raise ValueError("solvePairArray takes two different properties of v, u, h and s, got {:}".format(
+            [stProp1, stProp2]))
+    st = getSteamTable(SI)
+    a = np.asarray(stPropVal1, float).ravel()
+    b = np.asarray(stPropVal2, float).ravel()
+    n = len(a)
+    cols = stateColumns(n)
+    twoPhase, lo, hi, liquid, cP, cT = classifyPairArray(st, SI, aName, a, bName, b)
+    seedP = cP if seedP is None else np.broadcast_to(np.asarray(seedP, float), (n,))
+    seedT = cT if seedT is None else np.broadcast_to(np.asarray(seedT, float), (n,))
+
+    # single phase
+    single = np.flatnonzero(~twoPhase)
+    p, t, conv, iterations = _newton(aName, a[single], bName, b[single], seedP[single], seedT[single], SI,
+                                     tol, maxIter, damping)
+    ok = single[conv]
+    p, t = p[conv], t[conv]
+    vals = propertiesPT(p, t, SI)
+    P = toMPa(p, SI)
+    pc = st.criticalPressure()
+    with np.errstate(invalid='ignore'):
+        tSat = np.where(p < pc, fromKelvin(tsatP(np.minimum(P, 22.064)), SI), st.criticalTemperatur())
+    liq = t < tSat
+    for k in 'vuhs':
+        getattr(cols, k)[ok] = vals[k]
+    cols.p[ok], cols.t[ok], cols.x[ok] = p, t, np.where(liq, 0.0, 1.0)
+    for i, isLiquid in zip(ok, liq):
+        cols.region[i] = "sub-cooled liquid" if isLiquid else "super-heated vapor"
+
+    # two-phase
+    two = np.flatnonzero(twoPhase)
+    pTwo, xTwo = _bisectSaturation(aName, a[two], bName, b[two], lo[two], hi[two], SI)
+    good = np.isfinite(pTwo)
+    okTwo, pTwo, xTwo = two[good], pTwo[good], xTwo[good]
+    sat = saturationP(pTwo, SI)
+    for k in 'vuhs':
+        getattr(cols, k)[okTwo] = sat[k + 'L'] + xTwo * (sat[k + 'V'] - sat[k + 'L'])
+    cols.p[okTwo], cols.t[okTwo], cols.x[okTwo] = pTwo, sat['tsat'], xTwo
+    for i in okTwo:
+        cols.region[i] = "two-phase"
+
+    # stragglers
+    rest = np.setdiff1d(np.arange(n), np.concatenate([ok, okTwo]))
+    failed = 0
+    for i in rest:
+        try:
+            cols.setRow(i, solveState(aName, bName, a[i], b[i], SI, accuracy=accuracy))
+        except Exception as e:
+            cols.errors[int(i)] = str(e)
+            failed += 1
+    report = newtonReport(n, len(ok), len(okTwo), len(rest), failed, iterations, len(rest) / n if n else 0.0)
+    return cols, report
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # invert states made from random (p, t) and saturated mixtures, and compare with the scalar path
+    import logging
+    import time
+    import itertools
+    from IF97 import fromMPa
+    logging.disable(logging.CRITICAL)
+    rng = np.random.default_rng(2)
+    SI = True
+    st = getSteamTable(SI)
+    n = 4000
+    P = 10 ** rng.uniform(-2.5, 1.9, n)
+    T = rng.uniform(275.0, 1070.0, n)
+    p, t = fromMPa(P, SI), fromKelvin(T, SI)
+    ref = propertiesPT(p, t, SI)
+    keep = ref['region'] > 0
+    p, t = p[keep], t[keep]
+    ref = {k: v[keep] for k, v in ref.items()}
+    # a quarter of the points as two-phase mixtures
+    m = len(p) // 4
+    pSat = fromMPa(10 ** rng.uniform(-2.5, np.log10(15.0), m), SI)
+    x = rng.uniform(0.02, 0.98, m)
+    sat = saturationP(pSat, SI)
+    p = np.concatenate([p, pSat])
+    t = np.concatenate([t, sat['tsat']])
+    for k in 'vuhs':
+        ref[k] = np.concatenate([ref[k], sat[k + 'L'] + x * (sat[k + 'V'] - sat[k + 'L'])])
+    for aName, bName in itertools.combinations('vuhs', 2):
+        t0 = time.perf_counter()
+        cols, report = solvePairArray(aName, bName, ref[aName], ref[bName], SI)
+        dt = time.perf_counter() - t0
+        solved = ~np.isnan(cols.p)
+        # a state that reproduces the specified pair but is not the reference one is another state with the
+        # same pair (compressed liquid u-h, for one), not an error
+        wrong = np.sum(solved & ~((np.abs(getattr(cols, aName) / ref[aName] - 1) < 1e-6) &
+                                  (np.abs(getattr(cols, bName) / ref[bName] - 1) < 1e-6)))
+        other = np.sum(solved & ~((np.abs(cols.p / p - 1) < 1e-5) & (np.abs(cols.t - t) < 1e-3))) - wrong
+        print("{:}{:}: {:} points in {:0.3f} s ({:0.0f}/s), {:} Newton iterations, {:} two-phase, fallback {:} "
+              "({:0.1%}, {:} failed), {:} not matching the pair, {:} at another state with the same pair".format(
+                aName, bName, report.points, dt, report.points / dt, report.iterations, report.twoPhase,
+                report.fallback, report.fallbackRate, report.failed, wrong, other))
+    rows = list(zip(ref['u'][:200], ref['s'][:200]))
+    t0 = time.perf_counter()
+    for u, s in rows:
+        try:
+            solveState('u', 's', u, s, SI)
+        except Exception:
+            pass
+    print("scalar solveState, us: {:0.0f}/s".format(len(rows) / (time.perf_counter() - t0)))
+#endregion
@@ -0,0 +1,199 @@
+#region imports
+import os
+import threading
+import time
+from PyQt5 import QtCore, QtWidgets
+from StateBatch import stateColumns, parseRows, solveBatchStream
+#endregion
+
+#region class definitions
+class batchWorker(QtCore.QThread):
+    # (first row, list of stateResult or exception) for every chunk that finishes
+    chunkDone = QtCore.pyqtSignal(int, list)
+
+    def __init__(self, rows, SI, maxWorkers, processes=True, parent=None):
+        '''
+        Runs StateBatch.solveBatchStream off the GUI thread and hands the results back chunk by chunk
+        :param rows: list of (stProp1, stProp2, stPropVal1, stPropVal2)
+        :param SI: boolean True=SI units, False = English units
+        :param maxWorkers: size of the worker pool
+        :param processes: use a process pool rather than a thread pool
+        '''
+        super().__init__(parent)
+        self.rows = rows
+        self.SI = SI
+        self.maxWorkers = maxWorkers
+        self.processes = processes
+        self.cancelEvent = threading.Event()
+
+    def cancel(self):
+        self.cancelEvent.set()
+
+    def run(self):
+        for start, results in solveBatchStream(self.rows, self.SI, self.maxWorkers, processes=self.processes,
+                                               cancel=self.cancelEvent):
+            self.chunkDone.emit(start, results)
+
+class batchTab(QtWidgets.QWidget):
+    # columns of the results table:  the specified pair, then the state
+    headers = ['Prop 1', 'Prop 2', 'Value 1', 'Value 2', 'Region', 'p', 'T', 'v', 'u', 'h', 's', 'x', 'Error']
+
+    def __init__(self, isSI, parent=None):
+        '''
+        A tab for solving many state definitions at once.  Rows are pasted or loaded as
+        "property, property, value, value" lines (see StateBatch.parseRows), run on a pool of worker processes,
+        shown in the table as they finish and exported with stateColumns.save.
+        :param isSI: function returning True when the window is set to SI units
+        '''
+        super().__init__(parent)
+        self.isSI = isSI
+        self.worker = None
+        self.rows = []
+        self.cols = stateColumns(0)
+        self.done = 0
+        self.setupUi()
+
+    def setupUi(self):
+        """
+        Builds the widgets in code; the tab is not part of ThermoStateCalc.ui
+        :return: nothing
+        """
+        layout = QtWidgets.QVBoxLayout(self)
+        self._te_Rows = QtWidgets.QPlainTextEdit(self)
+        self._te_Rows.setPlaceholderText("One state per line:  property, property, value, value\n"
+                                         "p, t, 10, 250\nh, s, 3200, 7.0")
+        self._te_Rows.setMaximumHeight(110)
+        layout.addWidget(self._te_Rows)
+        buttons = QtWidgets.QHBoxLayout()
+        self._pb_Load = QtWidgets.QPushButton("Load...", self)
+        self._pb_Run = QtWidgets.QPushButton("Run", self)
+        self._pb_Cancel = QtWidgets.QPushButton("Cancel", self)
+        self._pb_Export = QtWidgets.QPushButton("Export...", self)
+        self._sb_Workers = QtWidgets.QSpinBox(self)
+        self._sb_Workers.setRange(1, max(os.cpu_count() or 1, 1))
+        self._sb_Workers.setValue(max((os.cpu_count() or 1) - 1, 1))
+        self._sb_Workers.setPrefix("workers: ")
+        self._pb_Cancel.setEnabled(False)
+        self._pb_Export.setEnabled(False)
+        for w in (self._pb_Load, self._pb_Run, self._pb_Cancel, self._pb_Export, self._sb_Workers):
+            buttons.addWidget(w)
+        layout.addLayout(buttons)
+        self._prg_Batch = QtWidgets.QProgressBar(self)
+        layout.addWidget(self._prg_Batch)
+        self._lbl_BatchStatus = QtWidgets.QLabel("", self)
+        layout.addWidget(self._lbl_BatchStatus)
+        self._tbl_Results = QtWidgets.QTableWidget(0, len(self.headers), self)
+        self._tbl_Results.setHorizontalHeaderLabels(self.headers)
+        self._tbl_Results.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self._tbl_Results)
+
+        self._pb_Load.clicked.connect(self.loadRows)
+        self._pb_Run.clicked.connect(self.runBatch)
+        self._pb_Cancel.clicked.connect(self.cancelBatch)
+        self._pb_Export.clicked.connect(self.exportResults)
+
+    def loadRows(self):
+        """
+        Put the contents of a text or CSV file in the rows box
+        :return: nothing
+        """
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Load state definitions", "",
+                                                        "CSV or text (*.csv *.txt);;All files (*)")
+        if path:
+            with open(path) as f:
+                self._te_Rows.setPlainText(f.read())
+
+    def runBatch(self):
+        """
+        Read the rows, fill the table with the specified pairs and start the worker
+        :return: nothing
+        """
+        try:
+            self.rows = parseRows(self._te_Rows.toPlainText())
+        except ValueError as e:
+            self._lbl_BatchStatus.setText("Warning:  {:}".format(e))
+            return
+        if not self.rows:
+            self._lbl_BatchStatus.setText("Warning:  no rows to solve")
+            return
+        n = len(self.rows)
+        self.cols = stateColumns(n)
+        self.done = 0
+        self.started = time.perf_counter()
+        self._tbl_Results.setRowCount(0)
+        self._tbl_Results.setRowCount(n)
+        for i, row in enumerate(self.rows):
+            for j, value in enumerate(row):
+                self._tbl_Results.setItem(i, j, QtWidgets.QTableWidgetItem(str(value)))
+        self._prg_Batch.setRange(0, n)
+        self._prg_Batch.setValue(0)
+        self._lbl_BatchStatus.setText("Solving {:} states...".format(n))
+        self.worker = batchWorker(self.rows, self.isSI(), self._sb_Workers.value(), parent=self)
+        self.worker.chunkDone.connect(self.showChunk)
+        self.worker.finished.connect(self.batchFinished)
+        self._pb_Run.setEnabled(False)
+        self._pb_Cancel.setEnabled(True)
+        self._pb_Export.setEnabled(False)
+        self.worker.start()
+
+    def showChunk(self, start, results):
+        """
+        Store a finished chunk and show it in the table
+        :param start: index of the chunk's first row
+        :param results: stateResult or exception per row
+        :return: nothing
+        """
+        for k, result in enumerate(results):
+            i = start + k
+            if isinstance(result, Exception):
+                self.cols.errors[i] = str(result)
+                self._tbl_Results.setItem(i, len(self.headers) - 1, QtWidgets.QTableWidgetItem(str(result)))
+                continue
+            self.cols.setRow(i, result)
+            self._tbl_Results.setItem(i, 4, QtWidgets.QTableWidgetItem(result.region))
+            for j, value in enumerate(result[1:]):
+                self._tbl_Results.setItem(i, 5 + j, QtWidgets.QTableWidgetItem("{:0.5g}".format(value)))
+        self.done += len(results)
+        self._prg_Batch.setValue(self.done)
+
+    def cancelBatch(self):
+        """
+        Stop the batch; rows already solved are kept
+        :return: nothing
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self._pb_Cancel.setEnabled(False)
+
+    def stopBatch(self):
+        """
+        Cancel a running batch and wait for its worker thread to end, for when the tab is about to be destroyed:
+        Qt aborts the program if a QThread is destroyed while it is still running.  The chunks already being
+        solved are finished first.
+        :return: nothing
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+
+    def batchFinished(self):
+        cancelled = self.worker.cancelEvent.is_set()
+        self._lbl_BatchStatus.setText("{:} {:} of {:} states in {:0.2f} s, {:} failed".format(
+            "Cancelled after" if cancelled else "Solved", self.done, len(self.rows),
+            time.perf_counter() - self.started, len(self.cols.errors)))
+        self.worker = None
+        self._pb_Run.setEnabled(True)
+        self._pb_Cancel.setEnabled(False)
+        self._pb_Export.setEnabled(True)
+
+    def exportResults(self):
+        """
+        Write the results with stateColumns.save, as .npz columns or CSV by the file name
+        :return: nothing
+        """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export results", "states.npz",
+                                                        "NumPy columns (*.npz);;CSV (*.csv)")
+        if path:
+            self.cols.save(path)
+            self._lbl_BatchStatus.setText("Wrote {:} states to {:}".format(len(self.cols), path))
+#endregion
@@ -0,0 +1,172 @@
+"""
+Solves a file of state definitions too big to read whole, a chunk of lines at a time.  The input is the text
+StateBatch.parseRows reads (property, property, value, value on each line, e.g. "p, h, 10, 2800"); the output is
+the CSV stateColumns.save writes, with the input line number in front of every row:
+    line,region,p,t,v,u,h,s,x,error
+A chunk is read, solved with the array solvers (grouped by pair), appended to the output and flushed to disk, and
+only then is it recorded as done in a checkpoint file next to the output (output + '.progress'), which holds the
+byte offset reached in the input and the length of the output.  Run again after a crash, the pipeline cuts the
+output back to the last recorded chunk and carries on from there; memory use is that of one chunk, whatever the
+size of the file.  A line that cannot be read gives an error row, blank lines, # comments and a header before the
+first row are skipped.
+    python ChunkedPipeline.py input.txt output.csv [--chunk 20000] [--en] [--restart]
+"""
+#region imports
+import json
+import os
+import time
+import numpy as np
+from StateBatch import stateColumns, csvHeader, parseRow, _properties
+from StateSolver import solveState
+from Uncertainty import solveSamples
+#endregion
+
+#region function definitions
+def solveChunk(rows, SI=True, minArray=64):
+    """
+    Solve rows grouped by pair, each group in one call of Uncertainty.solveSamples
+    :param rows: list of (stProp1, stProp2, stPropVal1, stPropVal2)
+    :param SI: boolean True=SI units, False = English units
+    :param minArray: smallest group worth the array solvers' set-up; smaller ones go to solveState one by one
+    :return: a stateColumns in the order of rows
+    """
+    cols = stateColumns(len(rows))
+    groups = {}
+    for i, row in enumerate(rows):
+        groups.setdefault(row[:2], []).append(i)
+    for (p1, p2), idx in groups.items():
+        if len(idx) < minArray:
+            for i in idx:
+                try:
+                    cols.setRow(i, solveState(*rows[i], SI))
+                except Exception as e:
+                    cols.errors[i] = str(e)
+            continue
+        idx = np.array(idx)
+        try:
+            part = solveSamples(p1, p2, np.array([rows[i][2] for i in idx]), np.array([rows[i][3] for i in idx]), SI)
+        except Exception as e:
+            for i in idx.tolist():
+                cols.errors[i] = str(e)
+            continue
+        cols.region.codes[idx] = part.region.codes
+        for k in _properties:
+            getattr(cols, k)[idx] = getattr(part, k)
+        for j in np.flatnonzero(np.isnan(part.p)).tolist():
+            cols.errors[int(idx[j])] = part.errors.get(j, "no state found")
+    return cols
+
+def _loadCheckpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _saveCheckpoint(path, state):
+    """
+    Replace the checkpoint in one step, so a crash leaves the old one or the new one and never half of either
+    """
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def processFile(inputPath, outputPath, chunk=20000, SI=True, resume=True, report=None):
+    """
+    Solve every state definition in a file, a chunk at a time
+    :param inputPath: text file of state definitions
+    :param outputPath: CSV file written
+    :param chunk: rows solved together; memory use grows with it, not with the file
+    :param SI: boolean True=SI units, False = English units
+    :param resume: carry on from the checkpoint of an earlier run on the same input; False starts over
+    :param report: function called with a dict (chunk, firstLine, lastLine, rows, errors, seconds, rate) after each
+                   chunk is written, or None
+    :return: dict of the run:  chunks, rows, errors, lines read, done
+    """
+    checkpointPath = outputPath + '.progress'
+    source = {'input': os.path.abspath(inputPath), 'inputSize': os.path.getsize(inputPath), 'SI': SI}
+    state = _loadCheckpoint(checkpointPath) if resume else None
+    if state is not None and ({k: state.get(k) for k in source} != source or not os.path.exists(outputPath) or
+                              os.path.getsize(outputPath) < state['outputSize']):
+        state = None  # another input, or an output that is not the one the checkpoint describes
+    if state is None:
+        state = dict(source, offset=0, line=0, outputSize=0, chunks=0, rows=0, errors=0, done=False)
+        with open(outputPath, 'wb') as out:
+            out.write(("line," + csvHeader).encode())
+            state['outputSize'] = out.tell()
+        _saveCheckpoint(checkpointPath, state)
+    if state['done']:
+        return {k: state[k] for k in ('chunks', 'rows', 'errors', 'line', 'done')}
+    os.truncate(outputPath, state['outputSize'])  # drop whatever a crashed run wrote after its last chunk
+    unreadable = None
+    with open(inputPath, 'rb') as f, open(outputPath, 'ab') as out:
+        f.seek(state['offset'])
+        line = state['line']
+        while True:
+            t0 = time.perf_counter()
+            entries, rows = [], []  # entries are (line number, index in rows or None for a line that cannot be read)
+            while len(entries) < chunk:
+                raw = f.readline()
+                if not raw:
+                    break
+                line += 1
+                try:
+                    row = parseRow(raw.decode('utf-8', 'replace'))
+                except ValueError:
+                    if state['rows'] or entries:  # a header is only skipped before the first row
+                        entries.append((line, None))
+                    continue
+                if row is not None:
+                    rows.append(row)
+                    entries.append((line, len(rows) - 1))
+            if not entries:
+                break
+            cols = solveChunk(rows, SI)
+            lines = cols.csvLines()
+            if unreadable is None:
+                bad = stateColumns(1)
+                bad.errors[0] = "cannot read the line as property, property, value, value"
+                unreadable = bad.csvLines()[0]
+            out.write(''.join('{:},{:}'.format(n, unreadable if i is None else lines[i]) for n, i in entries).encode())
+            out.flush()
+            os.fsync(out.fileno())
+            errors = len(cols.errors) + sum(1 for n, i in entries if i is None)
+            state.update(offset=f.tell(), line=line, outputSize=out.tell(), chunks=state['chunks'] + 1,
+                         rows=state['rows'] + len(entries), errors=state['errors'] + errors)
+            _saveCheckpoint(checkpointPath, state)
+            if report is not None:
+                dt = time.perf_counter() - t0
+                report({'chunk': state['chunks'], 'firstLine': entries[0][0], 'lastLine': entries[-1][0],
+                        'rows': len(entries), 'errors': errors, 'seconds': dt, 'rate': len(entries) / dt if dt else
+                        float('nan')})
+    state['done'] = True
+    _saveCheckpoint(checkpointPath, state)
+    return {k: state[k] for k in ('chunks', 'rows', 'errors', 'line', 'done')}
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import sys
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Solve a file of state definitions a chunk at a time")
+    parser.add_argument('input', help="text file of property, property, value, value lines")
+    parser.add_argument('output', help="CSV file of the states, resumed if a checkpoint of it exists")
+    parser.add_argument('--chunk', type=int, default=20000, help="rows solved together")
+    parser.add_argument('--en', action='store_true', help="the values are in English units")
+    parser.add_argument('--restart', action='store_true', help="ignore any checkpoint and start over")
+
+    def show(r):
+        sys.stderr.write("chunk {:}: lines {:}-{:}, {:} rows in {:0.2f} s ({:0.0f} rows/s), {:} errors\n".format(
+            r['chunk'], r['firstLine'], r['lastLine'], r['rows'], r['seconds'], r['rate'], r['errors']))
+
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    run = processFile(args.input, args.output, args.chunk, not args.en, not args.restart, show)
+    dt = time.perf_counter() - t0
+    sys.stderr.write("{:} rows in {:} chunks, {:} errors; this run {:0.2f} s\n".format(
+        run['rows'], run['chunks'], run['errors'], dt))
+#endregion
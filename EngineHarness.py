@@ -0,0 +1,225 @@
+"""
+Runs every state engine in the repo over one corpus of inputs and reports, for each pair of specified properties,
+how often each engine fails, how often it lands away from the state the inputs were made from, how often it
+disagrees with the NewCalc engine, and how fast it is.  NewCalc.thermoState is the baseline:  its setState still
+solves the pairs with p or t itself, in _handlePressureCases and _handleTemperatureCases (the others it hands to
+solveState).  ThermoStateCalc_app.thermoState.setState is a call to StateSolver.solveState, so the app is not an
+engine of its own here; it is the solveState row, labelled 'solveState (ThermoStateCalc_app)'.
+    python EngineHarness.py [--n 30] [--english] [--seed 1]
+"""
+#region imports
+import argparse
+import itertools
+import logging
+import math
+import random
+import time
+import numpy as np
+from StateSolver import getSteamTable, completeState, solveState
+from IF97 import fromMPa, fromKelvin
+#endregion
+
+#region class definitions
+class engine:
+    def __init__(self, name, solveRows, pairs=None):
+        '''
+        One way of solving states.
+        :param name: label in the report
+        :param solveRows: function(prop1, prop2, values1, values2, SI) returning a list with a stateResult-like
+                          object (region, p, t, v, u, h, s, x attributes) or the exception raised, per row
+        :param pairs: the pairs it handles, all 21 if None
+        '''
+        self.name = name
+        self.solveRows = solveRows
+        self.pairs = pairs
+
+class rowState:
+    def __init__(self, row):
+        '''
+        A row() dict of a stateColumns with its keys as attributes
+        '''
+        self.__dict__.update(row)
+#endregion
+
+#region function definitions
+#region engines
+def _scalar(makeState):
+    """
+    An engine calling setState on a fresh thermoState for every row, as the GUIs do
+    """
+    def solveRows(prop1, prop2, values1, values2, SI):
+        out = []
+        for a, b in zip(values1, values2):
+            try:
+                state = makeState()
+                state.setState(prop1, prop2, a, b, SI)
+                out.append(state)
+            except Exception as e:
+                out.append(e)
+        return out
+    return solveRows
+
+def _solveStateRows(prop1, prop2, values1, values2, SI):
+    out = []
+    for a, b in zip(values1, values2):
+        try:
+            out.append(solveState(prop1, prop2, a, b, SI))
+        except Exception as e:
+            out.append(e)
+    return out
+
+def _columnsToRows(cols):
+    out = []
+    for i in range(len(cols)):
+        if i in cols.errors:
+            out.append(RuntimeError(cols.errors[i]))
+        else:
+            out.append(rowState(cols.row(i)))
+    return out
+
+def _arrayPairRows(prop1, prop2, values1, values2, SI):
+    from ArraySolver import solvePairArray
+    return _columnsToRows(solvePairArray(prop1, prop2, values1, values2, SI)[0])
+
+def _processRows(prop1, prop2, values1, values2, SI):
+    from StateProcess import statesPT, statesPY
+    if prop1 == 'p' and prop2 == 't':
+        return _columnsToRows(statesPT(values1, values2, SI))
+    return _columnsToRows(statesPY(values1, prop2, values2, SI))
+
+def defaultEngines():
+    """
+    :return: the engines in the repo, the NewCalc baseline first.  ThermoStateCalc_app.thermoState is not one of
+             them:  its setState only calls solveState, so it is the solveState engine under another name.
+    """
+    import NewCalc
+    return [engine('NewCalc', _scalar(NewCalc.thermoState)),
+            engine('solveState (ThermoStateCalc_app)', _solveStateRows),
+            engine('ArraySolver', _arrayPairRows, [a + b for a, b in itertools.combinations('vhus', 2)]),
+            engine('StateProcess', _processRows, ['pt', 'pv', 'ph', 'pu', 'ps'])]
+#endregion
+
+def makeCorpus(n=30, SI=True, seed=1):
+    """
+    Reference states to invert: n sub-cooled liquid, n super-heated vapor and n two-phase, made from (p, t) or
+    (p, x) with completeState, so the state every pair of their properties should give back is known.
+    :return: list of stateResult
+    """
+    rng = random.Random(seed)
+    st = getSteamTable(True)
+    states = []
+    for i in range(n):
+        p = 10 ** rng.uniform(-1.0, 2.3)
+        tTop = min(st.tsat_p(p) if p < 220.0 else 370.0, 370.0)
+        states.append(('sub-cooled liquid', p, rng.uniform(5.0, tTop - 5.0), None))
+    for i in range(n):
+        p = 10 ** rng.uniform(-1.5, 2.3)
+        states.append(('super-heated vapor', p, rng.uniform((st.tsat_p(p) if p < 220.0 else 380.0) + 5.0, 700.0),
+                       None))
+    for i in range(n):
+        p = 10 ** rng.uniform(-1.5, 2.2)
+        states.append(('two-phase', p, st.tsat_p(p), rng.uniform(0.02, 0.98)))
+    out = []
+    stU = getSteamTable(SI)
+    for region, p, t, x in states:
+        if not SI:
+            p, t = fromMPa(p / 10.0, False), fromKelvin(t + 273.15, False)
+        if region == 'two-phase':
+            t = stU.tsat_p(p)
+        out.append(completeState(stU, region, p, t, x))
+    return out
+
+def _rowsFor(pair, corpus):
+    """
+    The reference states a pair can be made from (x only fixes two-phase states, p and t do not fix them)
+    """
+    if 'x' in pair:
+        return [r for r in corpus if r.region == 'two-phase']
+    if pair == 'pt':
+        return [r for r in corpus if r.region != 'two-phase']
+    return corpus
+
+def _same(a, b, SI):
+    tTol = 0.01 if SI else 0.018
+    return abs(a.p / b.p - 1.0) < 1e-4 and abs(a.t - b.t) < tTol
+
+def runHarness(engines, corpus, SI=True):
+    """
+    Solve every pair of every reference state with every engine
+    :return: {pair: {engine name: dict(n, failed, wrong, disagree, seconds)}}
+    """
+    pairs = [a + b for a, b in itertools.combinations('ptvhusx', 2)]
+    report = {}
+    for pair in pairs:
+        refs = _rowsFor(pair, corpus)
+        values1 = np.array([getattr(r, pair[0]) for r in refs])
+        values2 = np.array([getattr(r, pair[1]) for r in refs])
+        report[pair] = {}
+        baseline = None
+        for eng in engines:
+            if eng.pairs is not None and pair not in eng.pairs:
+                continue
+            t0 = time.perf_counter()
+            results = eng.solveRows(pair[0], pair[1], values1, values2, SI)
+            seconds = time.perf_counter() - t0
+            failed = wrong = disagree = 0
+            for i, (ref, res) in enumerate(zip(refs, results)):
+                if isinstance(res, Exception) or res.p is None or res.t is None or \
+                        math.isnan(res.p) or math.isnan(res.t):
+                    failed += 1
+                    continue
+                if not _same(res, ref, SI):
+                    wrong += 1
+                if baseline is not None and not isinstance(baseline[i], Exception) and not _same(res, baseline[i], SI):
+                    disagree += 1
+            if baseline is None:
+                baseline = results
+            report[pair][eng.name] = {'n': len(refs), 'failed': failed, 'wrong': wrong, 'disagree': disagree,
+                                      'seconds': seconds}
+    return report
+
+def printReport(report, engines):
+    names = [e.name for e in engines]
+    print("per pair: failed / wrong state / disagrees with {:} / ms per state".format(names[0]))
+    print("pair " + "".join("{:>34}".format(n) for n in names))
+    totals = {n: {'n': 0, 'failed': 0, 'wrong': 0, 'disagree': 0, 'seconds': 0.0} for n in names}
+    for pair, byEngine in report.items():
+        line = "{:4} ".format(pair)
+        for n in names:
+            r = byEngine.get(n)
+            if r is None:
+                line += "{:>34}".format("-")
+                continue
+            line += "{:>34}".format("{:}/{:}/{:}/{:0.3f}".format(r['failed'], r['wrong'], r['disagree'],
+                                                                  1000.0 * r['seconds'] / r['n']))
+            for k in totals[n]:
+                totals[n][k] += r[k]
+        print(line)
+    print("\ntotals over the pairs each engine handles:")
+    for n in names:
+        t = totals[n]
+        print("  {:32} {:5} states, failure rate {:6.1%}, wrong {:6.1%}, disagree {:6.1%}, {:0.3f} ms/state".format(
+            n, t['n'], t['failed'] / t['n'], t['wrong'] / t['n'], t['disagree'] / t['n'], 1000 * t['seconds'] / t['n']))
+    # speed against the baseline on the same pairs
+    print("\nspeed relative to {:} on the pairs both handle:".format(names[0]))
+    for n in names[1:]:
+        mine = sum(r[n]['seconds'] for r in report.values() if n in r)
+        theirs = sum(r[names[0]]['seconds'] for r in report.values() if n in r)
+        print("  {:32} {:0.2f}x".format(n, theirs / mine if mine else float('nan')))
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import os
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')  # the GUI modules only need to import
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Compare the state engines on a shared corpus")
+    parser.add_argument('--n', type=int, default=30, help="reference states per region")
+    parser.add_argument('--english', action='store_true', help="use English units")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    SI = not args.english
+    engines = defaultEngines()
+    corpus = makeCorpus(args.n, SI, args.seed)
+    printReport(runHarness(engines, corpus, SI), engines)
+#endregion
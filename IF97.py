@@ -0,0 +1,336 @@
+"""
+IAPWS-IF97 Gibbs free energy equations for region 1 (liquid) and region 2 (vapor), with the first partial
+derivatives of v, u, h and s with respect to p and T.  pyXSteam only gives the properties themselves, so
+these derivatives are what the solvers in StateSolver hand to fsolve as an analytic Jacobian.
+Region 3 (around the critical point) is the Helmholtz free energy equation in density and temperature, with
+derivatives with respect to v and T, for NearCritical.
+Release on the IAPWS Industrial formulation 1997 for the Thermodynamic Properties of Water and Steam
+"""
+#region imports
+import math
+#endregion
+
+#region constants
+R = 0.461526  # kJ/kg*K, specific gas constant used by IF97
+T_ABS = 273.15  # K at 0 C
+
+# region 1, Table 2 (p* = 16.53 MPa, T* = 1386 K)
+I1 = (0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 8, 8, 21, 23, 29, 30,
+      31, 32)
+J1 = (-2, -1, 0, 1, 2, 3, 4, 5, -9, -7, -1, 0, 1, 3, -3, 0, 1, 3, 17, -4, 0, 6, -5, -2, 10, -8, -11, -6,
+      -29, -31, -38, -39, -40, -41)
+n1 = (0.14632971213167, -0.84548187169114, -3.756360367204, 3.3855169168385, -0.95791963387872,
+      0.15772038513228, -0.016616417199501, 8.1214629983568e-04, 2.8319080123804e-04,
+      -6.0706301565874e-04, -0.018990068218419, -0.032529748770505, -0.021841717175414,
+      -5.283835796993e-05, -4.7184321073267e-04, -3.0001780793026e-04, 4.7661393906987e-05,
+      -4.4141845330846e-06, -7.2694996297594e-16, -3.1679644845054e-05, -2.8270797985312e-06,
+      -8.5205128120103e-10, -2.2425281908e-06, -6.5171222895601e-07, -1.4341729937924e-13,
+      -4.0516996860117e-07, -1.2734301741641e-09, -1.7424871230634e-10, -6.8762131295531e-19,
+      1.4478307828521e-20, 2.6335781662795e-23, -1.1947622640071e-23, 1.8228094581404e-24,
+      -9.3537087292458e-26)
+
+# region 2, Tables 10 and 11 (p* = 1 MPa, T* = 540 K)
+J0 = (0, 1, -5, -4, -3, -2, -1, 2, 3)
+n0 = (-9.6927686500217, 10.086655968018, -0.005608791128302, 0.071452738081455, -0.40710498223928,
+      1.4240819171444, -4.383951131945, -0.28408632460772, 0.021268463753307)
+Ir = (1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4, 5, 6, 6, 6, 7, 7, 7, 8, 8, 9, 10, 10, 10, 16,
+      16, 18, 20, 20, 20, 21, 22, 23, 24, 24, 24)
+Jr = (0, 1, 2, 3, 6, 1, 2, 4, 7, 36, 0, 1, 3, 6, 35, 1, 2, 3, 7, 3, 16, 35, 0, 11, 25, 8, 36, 13, 4, 10,
+      14, 29, 50, 57, 20, 35, 48, 21, 53, 39, 26, 40, 58)
+nr = (-0.0017731742473213, -0.017834862292358, -0.045996013696365, -0.057581259083432,
+      -0.05032527872793, -3.3032641670203e-05, -0.00018948987516315, -0.0039392777243355,
+      -0.043797295650573, -2.6674547914087e-05, 2.0481737692309e-08, 4.3870667284435e-07,
+      -3.227767723857e-05, -0.0015033924542148, -0.040668253562649, -7.8847309559367e-10,
+      1.2790717852285e-08, 4.8225372718507e-07, 2.2922076337661e-06, -1.6714766451061e-11,
+      -0.0021171472321355, -23.895741934104, -5.905956432427e-18, -1.2621808899101e-06,
+      -0.038946842435739, 1.1256211360459e-11, -8.2311340897998, 1.9809712802088e-08,
+      1.0406965210174e-19, -1.0234747095929e-13, -1.0018179379511e-09, -8.0882908646985e-11,
+      0.10693031879409, -0.33662250574171, 8.9185845355421e-25, 3.0629316876232e-13,
+      -4.2002467698208e-06, -5.9056029685639e-26, 3.7826947613457e-06, -1.2768608934681e-15,
+      7.3087610595061e-29, 5.5414715350778e-17, -9.436970724121e-07)
+
+# region 3, Table 30 (rho* = 322 kg/m^3, T* = 647.096 K); the first term is n1 * ln(delta)
+I3 = (0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 6, 6, 6, 7, 8, 9,
+      9, 10, 10, 11)
+J3 = (0, 1, 2, 7, 10, 12, 23, 2, 6, 15, 17, 0, 2, 6, 7, 22, 26, 0, 2, 4, 16, 26, 0, 2, 4, 26, 1, 3, 26, 0, 2,
+      26, 2, 26, 2, 26, 0, 1, 26)
+n3_1 = 0.10658070028513e1
+n3 = (-0.15732845290239e2, 0.20944396974307e2, -0.76867707878716e1, 0.26185947787954e1, -0.28080781148620e1,
+      0.12053369696517e1, -0.84566812812502e-2, -0.12654315477714e1, -0.11524407806681e1, 0.88521043984318,
+      -0.64207765181607, 0.38493460186671, -0.85214708824206, 0.48972281541877e1, -0.30502617256965e1,
+      0.39420536879154e-1, 0.12558408424308, -0.27999329698710, 0.13899799569460e1, -0.20189915023570e1,
+      -0.82147637173963e-2, -0.47596035734923, 0.43984074473500e-1, -0.44476435428739, 0.90572070719733,
+      0.70522450087967, 0.10770512626332, -0.32913623258954, -0.50871062041158, -0.22175400873096e-1,
+      0.94260751665092e-1, 0.16436278447961, -0.13503372241348e-1, -0.14834345352472e-1, 0.57922953628084e-3,
+      0.32308904703711e-2, 0.80964802996215e-4, -0.16557679795037e-3, -0.44923899061815e-4)
+RHO_C = 322.0  # kg/m^3
+T_C = 647.096  # K
+
+# region 4 saturation-pressure equation, Table 34
+n4 = (0.11670521452767e4, -0.72421316703206e6, -0.17073846940092e2, 0.12020824702470e5,
+      -0.32325550322333e7, 0.14915108613530e2, -0.48232657361591e4, 0.40511340542057e6,
+      -0.23855557567849, 0.65017534844798e3)
+
+# B23 boundary between regions 2 and 3, Eq. 5 and 6
+n23 = (0.34805185628969e3, -0.11671859879975e1, 0.10192970039326e-2, 0.57254459862746e3, 0.13918839778870e2)
+
+# conversions from the MKS (bar, C, kJ/kg) and FLS (psi, F, btu/lb) unit systems to IF97's MPa and K, with the
+# same factors pyXSteam's UnitConverter uses so the two agree to round-off
+_pToMPa = {True: 0.1, False: 0.00689475729}
+_tToK = {True: 1.0, False: 5.0 / 9.0}  # dK per unit temperature difference
+_vToSI = {True: 1.0, False: 0.0624279606}
+_eToSI = {True: 1.0, False: 2.32600}  # for u and h
+_sToSI = {True: 1.0, False: 1.0 / 0.238845896627}
+#endregion
+
+#region function definitions
+def toMPa(p, SI=True):
+    """
+    :param p: pressure in bar (SI) or psi
+    :return: pressure in MPa
+    """
+    return p * _pToMPa[SI]
+
+def fromMPa(P, SI=True):
+    """
+    :param P: pressure in MPa
+    :return: pressure in bar (SI) or psi
+    """
+    return P / _pToMPa[SI]
+
+def toKelvin(t, SI=True):
+    """
+    :param t: temperature in C (SI) or F
+    :return: temperature in K
+    """
+    return t + T_ABS if SI else (t - 32.0) * 5.0 / 9.0 + T_ABS
+
+def fromKelvin(T, SI=True):
+    """
+    :param T: temperature in K
+    :return: temperature in C (SI) or F
+    """
+    return T - T_ABS if SI else (T - T_ABS) * 9.0 / 5.0 + 32.0
+
+def psatT(T):
+    """
+    Saturation pressure, region 4 (Eq. 30)
+    :param T: temperature in K
+    :return: pressure in MPa
+    """
+    theta = T + n4[8] / (T - n4[9])
+    A = theta ** 2 + n4[0] * theta + n4[1]
+    B = n4[2] * theta ** 2 + n4[3] * theta + n4[4]
+    C = n4[5] * theta ** 2 + n4[6] * theta + n4[7]
+    return (2 * C / (-B + math.sqrt(B ** 2 - 4 * A * C))) ** 4
+
+def pB23(T):
+    """
+    Pressure on the boundary between regions 2 and 3 (Eq. 5)
+    :param T: temperature in K
+    :return: pressure in MPa
+    """
+    return n23[0] + n23[1] * T + n23[2] * T ** 2
+
+def tB23(P):
+    """
+    Temperature on the boundary between regions 2 and 3 (Eq. 6)
+    :param P: pressure in MPa, 16.5292 to 100
+    :return: temperature in K
+    """
+    return n23[3] + math.sqrt((P - n23[4]) / n23[2])
+
+def regionPT(P, T):
+    """
+    IF97 region of a single-phase point, restricted to the regions this module can evaluate.
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: 1, 2, or None if the point is outside regions 1 and 2
+    """
+    if not (273.15 <= T <= 1073.15 and 0.0 < P <= 100.0):
+        return None
+    if T <= 623.15:
+        return 1 if P >= psatT(T) else 2
+    return 2 if P <= pB23(T) else None
+
+def regionNumber(P, T):
+    """
+    IF97 region of a single-phase point (region 4, the saturation line itself, is never returned)
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: 1, 2, 3 or 5, or None outside the range of IF97
+    """
+    if P <= 0.0 or T < 273.15:
+        return None
+    if T > 1073.15:
+        return 5 if T <= 2273.15 and P <= 50.0 else None
+    if P > 100.0:
+        return None
+    if T <= 623.15:
+        return 1 if P >= psatT(T) else 2
+    return 2 if P <= pB23(T) else 3
+
+def gamma1(P, T):
+    """
+    Dimensionless Gibbs free energy of region 1 and its derivatives (Eq. 7, Table 4)
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: (pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau)
+    """
+    pi = P / 16.53
+    tau = 1386.0 / T
+    a = 7.1 - pi
+    b = tau - 1.222
+    g = g_pi = g_pipi = g_tau = g_tautau = g_pitau = 0.0
+    for I, J, n in zip(I1, J1, n1):
+        term = n * a ** I * b ** J
+        dpi = term * I / a
+        dtau = term * J / b
+        g += term
+        g_pi -= dpi
+        g_pipi += dpi * (I - 1) / a
+        g_tau += dtau
+        g_tautau += dtau * (J - 1) / b
+        g_pitau -= dpi * J / b
+    return pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau
+
+def gamma2(P, T):
+    """
+    Dimensionless Gibbs free energy of region 2 (ideal + residual part) and its derivatives (Eq. 15-17)
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: (pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau)
+    """
+    pi = P
+    tau = 540.0 / T
+    b = tau - 0.5
+    # ideal-gas part
+    g = math.log(pi)
+    g_pi = 1.0 / pi
+    g_pipi = -1.0 / pi ** 2
+    g_tau = g_tautau = g_pitau = 0.0
+    for J, n in zip(J0, n0):
+        term = n * tau ** J
+        g += term
+        g_tau += term * J / tau
+        g_tautau += term * J * (J - 1) / tau ** 2
+    # residual part
+    for I, J, n in zip(Ir, Jr, nr):
+        term = n * pi ** I * b ** J
+        dpi = term * I / pi
+        dtau = term * J / b
+        g += term
+        g_pi += dpi
+        g_pipi += dpi * (I - 1) / pi
+        g_tau += dtau
+        g_tautau += dtau * (J - 1) / b
+        g_pitau += dpi * J / b
+    return pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau
+
+def phi3(delta, tau):
+    """
+    Dimensionless Helmholtz free energy of region 3 and its derivatives (Eq. 28, Table 32)
+    :param delta: rho / 322 kg/m^3
+    :param tau: 647.096 K / T
+    :return: (phi, phi_d, phi_dd, phi_t, phi_tt, phi_dt)
+    """
+    f = n3_1 * math.log(delta)
+    f_d = n3_1 / delta
+    f_dd = -n3_1 / delta ** 2
+    f_t = f_tt = f_dt = 0.0
+    for I, J, n in zip(I3, J3, n3):
+        term = n * delta ** I * tau ** J
+        dd = term * I / delta
+        dt = term * J / tau
+        f += term
+        f_d += dd
+        f_dd += dd * (I - 1) / delta
+        f_t += dt
+        f_tt += dt * (J - 1) / tau
+        f_dt += dd * J / tau
+    return f, f_d, f_dd, f_t, f_tt, f_dt
+
+def properties3(v, t, SI=True):
+    """
+    p, v, u, h, s from the region 3 equation and their partial derivatives with respect to v (at constant T)
+    and T (at constant v), all in the caller's unit system.  The equation is evaluated wherever it is asked,
+    so checking that (p, t) lies in region 3 is left to the caller.
+    :param v: specific volume in m^3/kg (SI) or ft^3/lb
+    :param t: temperature in C (SI) or F
+    :param SI: boolean True=SI units, False = English units
+    :return: (values, dv, dT) where each is a dict keyed by 'p', 'v', 'u', 'h', 's'
+    """
+    rho = 1.0 / (v * _vToSI[SI])
+    T = toKelvin(t, SI)
+    delta, tau = rho / RHO_C, T_C / T
+    f, f_d, f_dd, f_t, f_tt, f_dt = phi3(delta, tau)
+    # properties in MPa, kJ/kg and kJ/kg*K
+    P = rho * R * T * delta * f_d / 1000.0
+    u = R * T * tau * f_t
+    h = u + 1000.0 * P / rho
+    s = R * (tau * f_t - f)
+    # derivatives per kg/m^3 and per K
+    dP_drho = R * T * (2.0 * delta * f_d + delta ** 2 * f_dd) / 1000.0
+    dP_dT = rho * R * delta * (f_d - tau * f_dt) / 1000.0
+    du_drho = R * T * tau * f_dt * delta / rho
+    du_dT = -R * tau ** 2 * f_tt
+    dh_drho = du_drho + 1000.0 * (dP_drho / rho - P / rho ** 2)
+    dh_dT = du_dT + 1000.0 * dP_dT / rho
+    ds_drho = R * (tau * f_dt - f_d) * delta / rho
+    ds_dT = du_dT / T
+    # back to the caller's units, d/dv = -rho^2 d/drho in SI
+    kV = -rho * rho * _vToSI[SI]
+    kT = _tToK[SI]
+    scale = {'p': 1.0 / _pToMPa[SI], 'v': _vToSI[SI], 'u': _eToSI[SI], 'h': _eToSI[SI], 's': _sToSI[SI]}
+    values = {'p': P, 'v': 1.0 / rho, 'u': u, 'h': h, 's': s}
+    dv = {'p': dP_drho, 'v': -1.0 / rho ** 2, 'u': du_drho, 'h': dh_drho, 's': ds_drho}
+    dT = {'p': dP_dT, 'v': 0.0, 'u': du_dT, 'h': dh_dT, 's': ds_dT}
+    for k in scale:
+        values[k] = values[k] / scale[k] if k != 'p' else values[k] * scale[k]
+        dv[k] = dv[k] * kV / scale[k] if k != 'p' else dv[k] * kV * scale[k]
+        dT[k] = dT[k] * kT / scale[k] if k != 'p' else dT[k] * kT * scale[k]
+    return values, dv, dT
+
+def propertiesPT(p, t, SI=True):
+    """
+    v, u, h, s and their partial derivatives with respect to p (at constant T) and T (at constant p), all in
+    the caller's unit system.
+    :param p: pressure in bar (SI) or psi
+    :param t: temperature in C (SI) or F
+    :param SI: boolean True=SI units, False = English units
+    :return: (values, dp, dT) where each is a dict keyed by 'v', 'u', 'h', 's', or None outside regions 1 and 2
+    """
+    P = p * _pToMPa[SI]
+    T = toKelvin(t, SI)
+    region = regionPT(P, T)
+    if region is None:
+        return None
+    pStar = 16.53 if region == 1 else 1.0
+    pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau = (gamma1 if region == 1 else gamma2)(P, T)
+    # properties in m^3/kg, kJ/kg and kJ/kg*K
+    v = R * T * g_pi / pStar / 1000.0
+    h = R * T * tau * g_tau
+    u = h - P * 1000.0 * v
+    s = R * (tau * g_tau - g)
+    # derivatives per MPa and per K
+    dv_dP = R * T * g_pipi / pStar ** 2 / 1000.0
+    dv_dT = R * (g_pi - tau * g_pitau) / pStar / 1000.0
+    dh_dP = R * T * tau * g_pitau / pStar
+    dh_dT = -R * tau ** 2 * g_tautau
+    du_dP = dh_dP - 1000.0 * (v + P * dv_dP)
+    du_dT = dh_dT - 1000.0 * P * dv_dT
+    ds_dP = -1000.0 * dv_dT
+    ds_dT = dh_dT / T
+    # back to the caller's units
+    kP = _pToMPa[SI]
+    kT = _tToK[SI]
+    scale = {'v': _vToSI[SI], 'u': _eToSI[SI], 'h': _eToSI[SI], 's': _sToSI[SI]}
+    values = {'v': v, 'u': u, 'h': h, 's': s}
+    dp = {'v': dv_dP, 'u': du_dP, 'h': dh_dP, 's': ds_dP}
+    dT = {'v': dv_dT, 'u': du_dT, 'h': dh_dT, 's': ds_dT}
+    for k in scale:
+        values[k] = values[k] / scale[k]
+        dp[k] = dp[k] * kP / scale[k]
+        dT[k] = dT[k] * kT / scale[k]
+    return values, dp, dT
+#endregion
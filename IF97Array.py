@@ -0,0 +1,336 @@
+"""
+Vectorized IAPWS-IF97 for regions 1, 2 and the saturation line (region 4), and region 3 from (v, T).  Where
+IF97.py and pyXSteam take one (p, T) per call, these functions take NumPy arrays and evaluate every point in
+one pass, so thousands of states cost about as much Python overhead as one.  Points outside regions 1 and 2
+come back from propertiesPT as nan.
+The coefficients are the ones in IF97.py.
+"""
+#region imports
+import numpy as np
+import IF97
+from IF97 import R, toMPa, fromMPa, toKelvin, fromKelvin, _pToMPa, _tToK, _vToSI, _eToSI, _sToSI
+#endregion
+
+#region constants
+_I1, _J1, _n1 = np.array(IF97.I1, float), np.array(IF97.J1, float), np.array(IF97.n1)
+_J0, _n0 = np.array(IF97.J0, float), np.array(IF97.n0)
+_Ir, _Jr, _nr = np.array(IF97.Ir, float), np.array(IF97.Jr, float), np.array(IF97.nr)
+_I3, _J3, _n3 = np.array(IF97.I3, float), np.array(IF97.J3, float), np.array(IF97.n3)
+_n4 = IF97.n4
+_n23 = IF97.n23
+_wToSI = {True: 1.0, False: 0.3048}  # ft/s to m/s
+# the properties propertiesPT returns
+forwardProperties = ('v', 'u', 'h', 's', 'cp', 'cv', 'w')
+#endregion
+
+#region function definitions
+#region region 4 and boundaries
+def psatT(T):
+    """
+    Saturation pressure, region 4 (Eq. 30), for any array of temperatures
+    :param T: temperature in K
+    :return: pressure in MPa
+    """
+    T = np.asarray(T, float)
+    theta = T + _n4[8] / (T - _n4[9])
+    A = theta ** 2 + _n4[0] * theta + _n4[1]
+    B = _n4[2] * theta ** 2 + _n4[3] * theta + _n4[4]
+    C = _n4[5] * theta ** 2 + _n4[6] * theta + _n4[7]
+    return (2 * C / (-B + np.sqrt(B ** 2 - 4 * A * C))) ** 4
+
+def tsatP(P):
+    """
+    Saturation temperature, region 4 (Eq. 31), for any array of pressures
+    :param P: pressure in MPa
+    :return: temperature in K
+    """
+    beta = np.asarray(P, float) ** 0.25
+    E = beta ** 2 + _n4[2] * beta + _n4[5]
+    F = _n4[0] * beta ** 2 + _n4[3] * beta + _n4[6]
+    G = _n4[1] * beta ** 2 + _n4[4] * beta + _n4[7]
+    D = 2 * G / (-F - np.sqrt(F ** 2 - 4 * E * G))
+    return (_n4[9] + D - np.sqrt((_n4[9] + D) ** 2 - 4 * (_n4[8] + _n4[9] * D))) / 2
+
+def regionPT(P, T):
+    """
+    IF97 region of each point, restricted to the regions this module evaluates
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: int array, 1 or 2, 0 outside regions 1 and 2
+    """
+    P, T = np.broadcast_arrays(np.asarray(P, float), np.asarray(T, float))
+    inRange = (T >= 273.15) & (T <= 1073.15) & (P > 0.0) & (P <= 100.0)
+    low = T <= 623.15
+    with np.errstate(invalid='ignore'):
+        liquid = low & (P >= psatT(np.minimum(T, 623.15)))
+        vapor = (low & ~liquid) | (~low & (P <= _n23[0] + _n23[1] * T + _n23[2] * T ** 2))
+    return np.where(inRange, np.where(liquid, 1, np.where(vapor, 2, 0)), 0)
+#endregion
+
+#region Gibbs free energy
+def gamma1(P, T):
+    """
+    Dimensionless Gibbs free energy of region 1 and its derivatives (Eq. 7, Table 4) for arrays of points
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: (pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau), each an array
+    """
+    pi = P / 16.53
+    tau = 1386.0 / T
+    a = (7.1 - pi)[:, None]
+    b = (tau - 1.222)[:, None]
+    term = _n1 * a ** _I1 * b ** _J1
+    dpi = term * _I1 / a
+    dtau = term * _J1 / b
+    g = term.sum(1)
+    g_pi = -dpi.sum(1)
+    g_pipi = (dpi * (_I1 - 1) / a).sum(1)
+    g_tau = dtau.sum(1)
+    g_tautau = (dtau * (_J1 - 1) / b).sum(1)
+    g_pitau = -(dpi * _J1 / b).sum(1)
+    return pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau
+
+def gamma2(P, T):
+    """
+    Dimensionless Gibbs free energy of region 2 (ideal + residual part) and its derivatives (Eq. 15-17) for
+    arrays of points
+    :param P: pressure in MPa
+    :param T: temperature in K
+    :return: (pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau), each an array
+    """
+    pi = P
+    tau = 540.0 / T
+    # ideal-gas part
+    t0 = _n0 * tau[:, None] ** _J0
+    g = np.log(pi) + t0.sum(1)
+    g_pi = 1.0 / pi
+    g_pipi = -1.0 / pi ** 2
+    g_tau = (t0 * _J0).sum(1) / tau
+    g_tautau = (t0 * _J0 * (_J0 - 1)).sum(1) / tau ** 2
+    # residual part
+    p = pi[:, None]
+    b = (tau - 0.5)[:, None]
+    term = _nr * p ** _Ir * b ** _Jr
+    dpi = term * _Ir / p
+    dtau = term * _Jr / b
+    g = g + term.sum(1)
+    g_pi = g_pi + dpi.sum(1)
+    g_pipi = g_pipi + (dpi * (_Ir - 1) / p).sum(1)
+    g_tau = g_tau + dtau.sum(1)
+    g_tautau = g_tautau + (dtau * (_Jr - 1) / b).sum(1)
+    g_pitau = (dpi * _Jr / b).sum(1)
+    return pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau
+#endregion
+
+def _forwardSI(P, T, region, derivatives):
+    """
+    Properties of points that all lie in one region, in MPa, K, m^3/kg, kJ/kg, kJ/kg*K and m/s
+    :return: (values, dp, dT) dicts of arrays, dp and dT None unless derivatives
+    """
+    pStar = 16.53 if region == 1 else 1.0
+    pi, tau, g, g_pi, g_pipi, g_tau, g_tautau, g_pitau = (gamma1 if region == 1 else gamma2)(P, T)
+    v = R * T * g_pi / pStar / 1000.0
+    h = R * T * tau * g_tau
+    u = h - P * 1000.0 * v
+    s = R * (tau * g_tau - g)
+    cp = -R * tau ** 2 * g_tautau
+    # the same expressions hold in both regions since g holds the ideal part too
+    k = g_pi - tau * g_pitau
+    cv = cp + R * k ** 2 / g_pipi
+    w = np.sqrt(1000.0 * R * T * g_pi ** 2 / (k ** 2 / (tau ** 2 * g_tautau) - g_pipi))
+    values = {'v': v, 'u': u, 'h': h, 's': s, 'cp': cp, 'cv': cv, 'w': w}
+    if not derivatives:
+        return values, None, None
+    dv_dP = R * T * g_pipi / pStar ** 2 / 1000.0
+    dv_dT = R * k / pStar / 1000.0
+    dh_dP = R * T * tau * g_pitau / pStar
+    dh_dT = cp
+    dp = {'v': dv_dP, 'u': dh_dP - 1000.0 * (v + P * dv_dP), 'h': dh_dP, 's': -1000.0 * dv_dT}
+    dT = {'v': dv_dT, 'u': dh_dT - 1000.0 * P * dv_dT, 'h': dh_dT, 's': dh_dT / T}
+    return values, dp, dT
+
+#region Helmholtz free energy
+def properties3(v, t, SI=True):
+    """
+    p, u, h and s at arrays of (v, t) from the region 3 equation (IF97.properties3 without the derivatives).
+    As there, checking that the points lie in region 3 is left to the caller.
+    :param v: specific volume in m^3/kg (SI) or ft^3/lb
+    :param t: temperature in C (SI) or F, broadcastable with v
+    :param SI: boolean True=SI units, False = English units
+    :return: dict of arrays keyed by 'p', 'v', 'u', 'h', 's'
+    """
+    v, t = np.broadcast_arrays(np.asarray(v, float), np.asarray(t, float))
+    rho = 1.0 / (v * _vToSI[SI])
+    T = toKelvin(t, SI)
+    delta, tau = (rho / IF97.RHO_C)[..., None], (IF97.T_C / T)[..., None]
+    term = _n3 * delta ** _I3 * tau ** _J3
+    f = IF97.n3_1 * np.log(delta[..., 0]) + term.sum(axis=-1)
+    f_d = IF97.n3_1 / delta[..., 0] + (term * _I3).sum(axis=-1) / delta[..., 0]
+    f_t = (term * _J3).sum(axis=-1) / tau[..., 0]
+    delta, tau = delta[..., 0], tau[..., 0]
+    P = rho * R * T * delta * f_d / 1000.0
+    u = R * T * tau * f_t
+    h = u + 1000.0 * P / rho
+    s = R * (tau * f_t - f)
+    return {'p': fromMPa(P, SI), 'v': v.astype(float), 'u': u / _eToSI[SI], 'h': h / _eToSI[SI],
+            's': s / _sToSI[SI]}
+#endregion
+
+def _scales(SI):
+    """
+    :return: {prop: factor from the caller's units to SI}
+    """
+    return {'v': _vToSI[SI], 'u': _eToSI[SI], 'h': _eToSI[SI], 's': _sToSI[SI], 'cp': _sToSI[SI],
+            'cv': _sToSI[SI], 'w': _wToSI[SI]}
+
+def propertiesPT(p, t, SI=True, derivatives=False):
+    """
+    All forward properties at arrays of (p, t) in one pass.  Points in region 1 and region 2 are evaluated
+    separately, each with every term of its Gibbs equation applied to all of its points at once.
+    :param p: pressure in bar (SI) or psi, any shape
+    :param t: temperature in C (SI) or F, broadcastable with p
+    :param SI: boolean True=SI units, False = English units
+    :param derivatives: also return the derivatives of v, u, h and s with respect to p and t
+    :return: dict of arrays keyed by forwardProperties plus 'region' (1, 2 or 0 for outside, then nan values).
+             With derivatives: (values, dp, dT) where dp and dT are dicts keyed 'v', 'u', 'h', 's'.
+    """
+    p, t = np.broadcast_arrays(np.asarray(p, float), np.asarray(t, float))
+    shape = p.shape
+    P = toMPa(p.ravel(), SI)
+    T = toKelvin(t.ravel(), SI)
+    region = regionPT(P, T)
+    values = {k: np.full(P.shape, np.nan) for k in forwardProperties}
+    dp = {k: np.full(P.shape, np.nan) for k in 'vuhs'} if derivatives else None
+    dT = {k: np.full(P.shape, np.nan) for k in 'vuhs'} if derivatives else None
+    for r in (1, 2):
+        idx = np.flatnonzero(region == r)
+        if len(idx) == 0:
+            continue
+        vals, dpr, dTr = _forwardSI(P[idx], T[idx], r, derivatives)
+        for k in forwardProperties:
+            values[k][idx] = vals[k]
+        if derivatives:
+            for k in 'vuhs':
+                dp[k][idx] = dpr[k]
+                dT[k][idx] = dTr[k]
+    # back to the caller's units
+    scale = _scales(SI)
+    for k in forwardProperties:
+        values[k] = (values[k] / scale[k]).reshape(shape)
+    values['region'] = region.reshape(shape)
+    if not derivatives:
+        return values
+    for k in 'vuhs':
+        dp[k] = (dp[k] * _pToMPa[SI] / scale[k]).reshape(shape)
+        dT[k] = (dT[k] * _tToK[SI] / scale[k]).reshape(shape)
+    return values, dp, dT
+
+def saturationP(p, SI=True):
+    """
+    The saturation line at arrays of pressures: tsat and the saturated liquid (L) and vapor (V) properties,
+    named as in pyXSteam (vL_p, vV_p, ...).  Above 623.15 K the saturated liquid lies in region 3, which this
+    module does not evaluate, so those points are nan.
+    :param p: pressure in bar (SI) or psi
+    :param SI: boolean True=SI units, False = English units
+    :return: dict of arrays with keys 'tsat', 'vL', 'vV', 'uL', 'uV', 'hL', 'hV', 'sL', 'sV'
+    """
+    p = np.asarray(p, float)
+    P = toMPa(p, SI)
+    with np.errstate(invalid='ignore'):
+        T = tsatP(np.where(P > 0.0, P, np.nan))
+    T = np.where((T >= 273.15) & (T <= 623.15), T, np.nan)
+    ok = ~np.isnan(T)
+    out = {'tsat': fromKelvin(T, SI)}
+    scale = _scales(SI)
+    for region, side in ((1, 'L'), (2, 'V')):
+        vals = {k: np.full(P.shape, np.nan) for k in 'vuhs'}
+        if ok.any():
+            res = _forwardSI(P[ok], T[ok], region, False)[0]
+            for k in 'vuhs':
+                vals[k][ok] = res[k] / scale[k]
+        for k in 'vuhs':
+            out[k + side] = vals[k]
+    return out
+
+def saturationT(t, SI=True):
+    """
+    :param t: temperature in C (SI) or F
+    :param SI: boolean True=SI units, False = English units
+    :return: saturation pressure in bar (SI) or psi, nan outside 273.15 K to the critical point
+    """
+    T = toKelvin(np.asarray(t, float), SI)
+    with np.errstate(invalid='ignore'):
+        P = psatT(T)
+    return fromMPa(np.where((T >= 273.15) & (T <= 647.096), P, np.nan), SI)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # differential check against pyXSteam, failing (exit status 1) if any property of either region or of the
+    # saturation line differs by more than its tolerance, and a values/second benchmark
+    import logging
+    import sys
+    import time
+    from pyXSteam.XSteam import XSteam
+    logging.disable(logging.CRITICAL)
+    # relative tolerances; pyXSteam converts cp and cv to BTU/lb R with a factor 4.3e-7 from the one used here
+    tolerance = {True: {}, False: {'cp': 1e-6, 'cv': 1e-6}}
+    defaultTolerance = 1e-9
+    failures = []
+    rng = np.random.default_rng(1)
+    for SI in (True, False):
+        st = XSteam(XSteam.UNIT_SYSTEM_MKS if SI else XSteam.UNIT_SYSTEM_FLS)
+        n = 3000
+        P = 10 ** rng.uniform(-3, 2, n)
+        T = rng.uniform(273.16, 1073.15, n)
+        p, t = fromMPa(P, SI), fromKelvin(T, SI)
+        props = propertiesPT(p, t, SI)
+        names = {'v': 'v_pt', 'u': 'u_pt', 'h': 'h_pt', 's': 's_pt', 'cp': 'Cp_pt', 'cv': 'Cv_pt', 'w': 'w_pt'}
+        worst = {}
+        for region in (1, 2):
+            inside = props['region'] == region
+            for k, fn in names.items():
+                ref = np.array([getattr(st, fn)(pi, ti) for pi, ti in zip(p[inside], t[inside])])
+                # pyXSteam has no value within a few hundredths of a kelvin of saturation; nan here still fails
+                known = ~np.isnan(ref)
+                worst[(region, k)] = np.max(np.abs(props[k][inside][known] / ref[known] - 1))
+        pS = fromMPa(10 ** rng.uniform(-3, np.log10(16.5), 500), SI)
+        sat = saturationP(pS, SI)
+        worst[(4, 'tsat')] = np.max(np.abs(toKelvin(sat['tsat'], SI) /
+                                           toKelvin(np.array([st.tsat_p(x) for x in pS]), SI) - 1))
+        for k in ('vL', 'vV', 'hL', 'hV', 'sL', 'sV'):
+            fn = getattr(st, k + '_p')
+            worst[(4, k)] = np.max(np.abs(sat[k] / np.array([fn(x) for x in pS]) - 1))
+        tS = sat['tsat']
+        worst[(4, 'psat')] = np.max(np.abs(saturationT(tS, SI) / pS - 1))
+        units = 'SI' if SI else 'English'
+        print("{:} units, {:} points in regions 1-2, largest relative difference from pyXSteam:".format(
+            units, int((props['region'] > 0).sum())))
+        for region in (1, 2, 4):
+            print("  region {:}: ".format(region) + ", ".join("{:} {:0.1e}".format(k, e) for (r, k), e in
+                                                             worst.items() if r == region))
+        for (region, k), e in worst.items():
+            limit = tolerance[SI].get(k, defaultTolerance)
+            if not e <= limit:  # nan fails too
+                failures.append("{:} units, region {:}, {:}: {:0.1e} > {:0.0e}".format(units, region, k, e, limit))
+
+    for n in (1000, 100000):
+        P = 10 ** rng.uniform(-3, 2, n)
+        T = rng.uniform(273.16, 1073.15, n)
+        p, t = fromMPa(P, True), fromKelvin(T, True)
+        t0 = time.perf_counter()
+        propertiesPT(p, t)
+        dt = time.perf_counter() - t0
+        print("kernel: {:} points in {:0.4f} s, {:0.3g} values/s ({:} properties each)".format(
+            n, dt, n * len(forwardProperties) / dt, len(forwardProperties)))
+    st = XSteam(XSteam.UNIT_SYSTEM_MKS)
+    t0 = time.perf_counter()
+    for pi, ti in zip(p[:2000], t[:2000]):
+        st.v_pt(pi, ti), st.u_pt(pi, ti), st.h_pt(pi, ti), st.s_pt(pi, ti)
+    dt = time.perf_counter() - t0
+    print("pyXSteam: {:0.3g} values/s (v, u, h, s one call each)".format(2000 * 4 / dt))
+    if failures:
+        print("differential check FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("differential check passed")
+#endregion
@@ -0,0 +1,365 @@
+#region imports
+import math
+from functools import lru_cache
+import numpy as np
+from IF97 import properties3, toMPa, fromMPa, toKelvin, fromKelvin, psatT, pB23, tB23, regionNumber, _tToK
+from StateValidator import convergenceError
+#endregion
+
+#region constants
+# tolerances of the near-critical solvers:  residuals relative to the specified values (unless the solveBudget
+# gives another), and the most steps one bracketed root or one two-dimensional solve may take before it is a
+# convergenceError
+nearCriticalTolerance = 1e-11
+maxIterations = 60
+
+# region 3 is 623.15 K <= T <= T_B23(p), psat(623.15 K) = 16.529 MPa <= p <= 100 MPa
+_tLow3 = 623.15
+_tHigh3 = 863.15  # T_B23(100 MPa)
+_pLow3 = 16.5291642526
+_pHigh3 = 100.0
+#endregion
+
+#region function definitions
+def _rootInBracket(fn, lo, hi, tol, budget):
+    """
+    Root of fn between lo and hi by Newton steps kept inside the bracket:  every evaluation shrinks the
+    bracket to the side holding the sign change, and a step that would leave it is replaced by bisection, so
+    the root is found in at most maxIterations steps however poor the derivative is.
+    :param fn: function of x returning (f, df/dx)
+    :param tol: the bracket width at which to stop
+    :param budget: the solveBudget charged for every evaluation of fn
+    :return: the root, or None if fn does not change sign between lo and hi
+    """
+    budget.charge()
+    fLo = fn(lo)[0]
+    budget.charge()
+    fHi = fn(hi)[0]
+    if math.isnan(fLo) or math.isnan(fHi) or fLo * fHi > 0.0:
+        return None
+    if fLo == 0.0:
+        return lo
+    if fHi == 0.0:
+        return hi
+    rising = fHi > 0.0
+    x = 0.5 * (lo + hi)
+    for i in range(maxIterations):
+        budget.charge()
+        f, df = fn(x)
+        if f == 0.0 or hi - lo <= tol:
+            return x
+        if (f > 0.0) == rising:
+            hi = x
+        else:
+            lo = x
+        step = x - f / df if df != 0.0 else lo - 1.0
+        x = step if lo < step < hi else 0.5 * (lo + hi)
+        if abs(step - x) == 0.0 and abs(f / df) <= tol:
+            return x
+    raise convergenceError("Near-critical solve did not close its bracket in {:} steps".format(maxIterations))
+
+def _vSaturated(st, t):
+    """
+    Saturated liquid and vapor volumes at t below the critical temperature
+    """
+    p = st.psat_t(t)
+    return st.vL_p(p), st.vV_p(p)
+
+def _vBox(SI):
+    """
+    Volumes beyond both ends of region 3 (100 MPa at 623.15 K and 16.5 MPa at T_B23), for brackets
+    """
+    from IF97 import _vToSI
+    return 0.0012 / _vToSI[SI], 0.012 / _vToSI[SI]
+
+def volumePT(st, p, t, SI, budget, liquid=None):
+    """
+    Specific volume at (p, t) in region 3, by a bracketed root of p(v) on the isotherm.  Below the critical
+    temperature the isotherm has a loop inside the vapor dome, so the bracket stops at the saturated volume
+    on the phase's side.
+    :param liquid: which side of the dome, found from psat(t) if None
+    :return: v, or None where p(v) = p has no root in the bracket
+    """
+    vLow, vHigh = _vBox(SI)
+
+    def fn(v):
+        values, dv, dT = properties3(v, t, SI)
+        return values['p'] - p, dv['p']
+    # to a fraction of the smallest volume in region 3:  the solvers along an isobar take this root at every step,
+    # and a volume only as close as the tier's tolerance of the largest one is noisy enough to stall their Newton
+    # steps into bisecting the whole bracket
+    tol = 1e-2 * budget.tolerance(nearCriticalTolerance) * vLow
+    T = toKelvin(t, SI)
+    if T >= 647.096:
+        return _rootInBracket(fn, vLow, vHigh, tol, budget)
+    if liquid is None:
+        liquid = toMPa(p, SI) > psatT(T)
+    vL, vV = _vSaturated(st, t)
+    # the steam table's saturated volumes come from backward equations and can lie a little outside the region 3
+    # equation's own, so a state at saturation may need the bracket taken a little into the dome
+    for widen in (1.0, 1.002, 1.02):
+        lo, hi = (vLow, vL * widen) if liquid else (vV / widen, vHigh)
+        v = _rootInBracket(fn, lo, hi, tol, budget)
+        if v is not None:
+            return v
+    return None
+
+def _state(st, v, t, SI):
+    """
+    The complete state at (v, t) from the region 3 equation
+    :return: (region, p, t, v, u, h, s, x) or None outside region 3
+    """
+    values = properties3(v, t, SI)[0]
+    p = values['p']
+    P, T = toMPa(p, SI), toKelvin(t, SI)
+    if regionNumber(P, T) != 3:
+        return None
+    if P < 22.064:
+        liquid = T < toKelvin(st.tsat_p(p), SI)
+    else:
+        liquid = T < 647.096
+    return ("sub-cooled liquid" if liquid else "super-heated vapor", p, t, values['v'], values['u'],
+            values['h'], values['s'], 0.0 if liquid else 1.0)
+
+def _scale(name, value):
+    return abs(value) if name == 'v' else max(abs(value), 1.0)
+
+def _solveP(st, SI, p, prop, b, info, budget):
+    """
+    p and one of t, v, u, h, s:  t, if not given, is the bracketed root of prop along the isobar between
+    623.15 K and T_B23(p), cut at saturation on the classifier's side of the dome (every one of v, u, h and s
+    rises with t along an isobar).  The volume at each t is itself a bracketed root.
+    """
+    P = toMPa(p, SI)
+    if P < _pLow3 or P > _pHigh3 or info.region == "two-phase":
+        return None
+    if prop == 't':
+        if regionNumber(P, toKelvin(b, SI)) != 3:
+            return None
+        v = volumePT(st, p, b, SI, budget)
+        return None if v is None else _state(st, v, b, SI)
+    tLow, tHigh = fromKelvin(_tLow3, SI), fromKelvin(tB23(P), SI)
+    liquid = None
+    if P < 22.064:
+        tSat = st.tsat_p(p)
+        liquid = info.region == "sub-cooled liquid"
+        tLow, tHigh = (tLow, tSat) if liquid else (tSat, tHigh)
+    if tHigh <= tLow:
+        return None
+    last = {}
+
+    def fn(t):
+        v = volumePT(st, p, t, SI, budget, liquid)
+        if v is None:
+            return float('nan'), 1.0
+        values, dv, dT = properties3(v, t, SI)
+        last['v'] = v
+        # along the isobar:  d/dt = d/dt|v - d/dv|t * (dp/dt|v) / (dp/dv|t)
+        return (values[prop] - b) / _scale(prop, b), \
+               (dT[prop] - dv[prop] * dT['p'] / dv['p']) / _scale(prop, b)
+    t = _rootInBracket(fn, tLow, tHigh, 10.0 * budget.tolerance(nearCriticalTolerance), budget)
+    if t is None:
+        return None
+    fn(t)
+    return _state(st, last['v'], t, SI)
+
+def _solveT(st, SI, t, prop, b, info, budget):
+    """
+    t and one of v, u, h, s:  v, if not given, is the bracketed root of prop along the isotherm between the
+    volumes at 100 MPa and on the B23 boundary, cut at saturation on the classifier's side of the dome below
+    the critical temperature.
+    """
+    T = toKelvin(t, SI)
+    if T < _tLow3 or T > _tHigh3 or info.region == "two-phase":
+        return None
+    if prop == 'v':
+        return _state(st, b, t, SI)
+    pB = fromMPa(pB23(T), SI)
+    if T < 647.096:
+        liquid = info.region == "sub-cooled liquid"
+        vL, vV = _vSaturated(st, t)
+        lo = volumePT(st, fromMPa(_pHigh3, SI), t, SI, budget, True) if liquid else vV
+        hi = vL if liquid else volumePT(st, pB, t, SI, budget, False)
+    else:
+        lo = volumePT(st, fromMPa(_pHigh3, SI), t, SI, budget)
+        hi = volumePT(st, pB, t, SI, budget)
+    if lo is None or hi is None:
+        return None
+
+    def fn(v):
+        values, dv, dT = properties3(v, t, SI)
+        return (values[prop] - b) / _scale(prop, b), dv[prop] / _scale(prop, b)
+    v = _rootInBracket(fn, lo, hi, 1e-2 * budget.tolerance(nearCriticalTolerance) * hi, budget)
+    return None if v is None else _state(st, v, t, SI)
+
+def _solveV(st, SI, v, prop, b, budget):
+    """
+    v and one of u, h, s:  every one of them rises with t at constant v, so t is a bracketed root between
+    623.15 K and T_B23(100 MPa)
+    """
+    def fn(t):
+        values, dv, dT = properties3(v, t, SI)
+        return (values[prop] - b) / _scale(prop, b), dT[prop] / _scale(prop, b)
+    tLow, tHigh = fromKelvin(_tLow3, SI), fromKelvin(_tHigh3, SI)
+    t = _rootInBracket(fn, tLow, tHigh, 10.0 * budget.tolerance(nearCriticalTolerance), budget)
+    return None if t is None else _state(st, v, t, SI)
+
+@lru_cache(maxsize=None)
+def region3Ranges(SI):
+    """
+    The range of u, h and s over region 3 in the caller's units, from a grid of (v, t) with the region's
+    states kept, widened by 1%.  Pairs of these outside the range are not looked for in region 3.
+    :return: {prop: (low, high)}
+    """
+    vLow, vHigh = _vBox(SI)
+    V = np.geomspace(vLow, vHigh, 40)
+    out = {}
+    for t in np.linspace(fromKelvin(_tLow3, SI), fromKelvin(_tHigh3, SI), 40):
+        for v in V:
+            values = properties3(v, t, SI)[0]
+            if regionNumber(toMPa(values['p'], SI), toKelvin(t, SI)) != 3:
+                continue
+            for k in 'uhs':
+                lo, hi = out.get(k, (values[k], values[k]))
+                out[k] = (min(lo, values[k]), max(hi, values[k]))
+    return {k: (lo - 0.01 * (hi - lo), hi + 0.01 * (hi - lo)) for k, (lo, hi) in out.items()}
+
+def _solvePair(st, SI, aName, a, bName, b, info, budget):
+    """
+    Two of u, h and s:  Levenberg-Marquardt damped Newton in (ln v, t) inside the region 3 box, from the
+    classifier's seed moved into the box, at most maxIterations steps
+    """
+    ranges = region3Ranges(SI)
+    if not (ranges[aName][0] <= a <= ranges[aName][1] and ranges[bName][0] <= b <= ranges[bName][1]):
+        return None
+    vLow, vHigh = _vBox(SI)
+    lnvLow, lnvHigh = math.log(vLow), math.log(vHigh)
+    tLow, tHigh = fromKelvin(_tLow3, SI), fromKelvin(_tHigh3, SI)
+    tScale = 100.0 / _tToK[SI]
+    sA, sB = _scale(aName, a), _scale(bName, b)
+    t = min(max(info.seed[1], tLow), tHigh) if info.seed is not None else 0.5 * (tLow + tHigh)
+    v = volumePT(st, info.seed[0], t, SI, budget, info.region == "sub-cooled liquid") \
+        if info.seed is not None and _pLow3 <= toMPa(info.seed[0], SI) <= _pHigh3 else None
+    lnv = math.log(v) if v is not None else 0.5 * (lnvLow + lnvHigh)
+
+    def residual(lnv, t):
+        budget.charge()
+        values, dv, dT = properties3(math.exp(lnv), t, SI)
+        return (values[aName] - a) / sA, (values[bName] - b) / sB, dv, dT
+
+    mu = 1e-3
+    tol = budget.tolerance(nearCriticalTolerance)
+    fa, fb, dv, dT = residual(lnv, t)
+    for i in range(maxIterations):
+        if abs(fa) <= tol and abs(fb) <= tol:
+            return _state(st, math.exp(lnv), t, SI)
+        v = math.exp(lnv)
+        J11, J12 = dv[aName] * v / sA, dT[aName] * tScale / sA
+        J21, J22 = dv[bName] * v / sB, dT[bName] * tScale / sB
+        A11, A12, A22 = J11 ** 2 + J21 ** 2 + mu, J11 * J12 + J21 * J22, J12 ** 2 + J22 ** 2 + mu
+        g1, g2 = J11 * fa + J21 * fb, J12 * fa + J22 * fb
+        det = A11 * A22 - A12 ** 2
+        trialLnv = min(max(lnv - (A22 * g1 - A12 * g2) / det, lnvLow), lnvHigh)
+        trialT = min(max(t - (A11 * g2 - A12 * g1) / det * tScale, tLow), tHigh)
+        ta, tb, tdv, tdT = residual(trialLnv, trialT)
+        if ta ** 2 + tb ** 2 < fa ** 2 + fb ** 2:
+            lnv, t, fa, fb, dv, dT = trialLnv, trialT, ta, tb, tdv, tdT
+            mu = max(mu / 3.0, 1e-12)
+        else:
+            mu *= 4.0
+            if mu > 1e8:
+                return None
+    return None
+
+def solveNearCritical(st, SI, lead, a, other, b, info, budget):
+    """
+    States in IF97 region 3, around the critical point, solved from the region 3 equation itself with
+    bracketed roots (or, for two of u, h and s, a damped Newton confined to the region) and tight tolerances,
+    instead of fsolve on the steam table's backward equations.  Pairs whose state is not single phase in
+    region 3 give None and are left to the regular solvers.
+    :param st: the XSteam object for the unit system in use
+    :param SI: boolean True=SI units, False = English units
+    :param lead: the property that leads the case, as solveState orders them
+    :param a: value of lead
+    :param other: the other property
+    :param b: value of other
+    :param info: the regionInfo of the pair
+    :param budget: the solveBudget charged for every evaluation of the region 3 equation
+    :return: (region, p, t, v, u, h, s, x) or None
+    """
+    if other == 'x' or info.region == "two-phase":
+        return None
+    if lead == 'p':
+        return _solveP(st, SI, a, other, b, info, budget)
+    if lead == 't':
+        return _solveT(st, SI, a, other, b, info, budget)
+    if lead == 'v' or other == 'v':
+        v, prop, c = (a, other, b) if lead == 'v' else (b, lead, a)
+        vLow, vHigh = _vBox(SI)
+        if not vLow < v < vHigh:
+            return None
+        return _solveV(st, SI, v, prop, c, budget)
+    return _solvePair(st, SI, lead, a, other, b, info, budget)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # states in a band around the critical point, made from (v, t) with the region 3 equation, solved back from
+    # every pair with and without the near-critical mode:  failures, results not reproducing the pair to 1e-6,
+    # results reproducing it at another state (u and h only fix p*v = h - u, which a two-phase state also
+    # has), and the most and mean evaluations per solve
+    import itertools
+    import logging
+    import random
+    import time
+    from StateSolver import solveState, getSteamTable
+    from StateValidator import solveBudget
+    logging.disable(logging.CRITICAL)
+    SI = True
+    st = getSteamTable(SI)
+    rng = random.Random(6)
+    refs = []
+    while len(refs) < 60:
+        p, t = rng.uniform(200.0, 260.0), rng.uniform(355.0, 400.0)
+        if regionNumber(toMPa(p), toKelvin(t)) != 3 or (p < 220.64 and abs(t - st.tsat_p(p)) < 0.05):
+            continue
+        v = volumePT(st, p, t, SI, solveBudget(10 ** 6, 10.0))
+        if v is not None:
+            refs.append(_state(st, v, t, SI))
+    print("{:} states in region 3 with 200 <= p <= 260 bar, 355 <= t <= 400 C".format(len(refs)))
+    for nearCritical in (False, True):
+        print("nearCritical={:}".format(nearCritical))
+        totals = [0, 0, 0, 0, [], 0.0]
+        for aName, bName in itertools.combinations('ptvuhs', 2):
+            failed = wrong = other = 0
+            evaluations = []
+            t0 = time.perf_counter()
+            for r in refs:
+                budget = solveBudget(5000, 5.0)
+                ra = r[1 + 'ptvuhs'.index(aName)]
+                rb = r[1 + 'ptvuhs'.index(bName)]
+                try:
+                    s = solveState(aName, bName, ra, rb, SI, budget, nearCritical=nearCritical)
+                except Exception:
+                    failed += 1
+                    continue
+                evaluations.append(budget.spent())
+                sa, sb = s[1 + 'ptvuhs'.index(aName)], s[1 + 'ptvuhs'.index(bName)]
+                if not (abs(sa / ra - 1.0) < 1e-6 and abs(sb / rb - 1.0) < 1e-6):
+                    wrong += 1
+                elif not (abs(s.p / r[1] - 1.0) < 1e-6 and abs(s.t - r[2]) < 1e-4):
+                    other += 1
+            dt = time.perf_counter() - t0
+            print("  {:}{:}: failed {:2}, wrong {:2}, other state {:2}, evaluations max {:4} mean {:6.1f}, "
+                  "{:0.2f} ms/state".format(aName, bName, failed, wrong, other, max(evaluations, default=0),
+                float(np.mean(evaluations)) if evaluations else 0.0, 1000 * dt / len(refs)))
+            totals[0] += len(refs)
+            totals[1] += failed
+            totals[2] += wrong
+            totals[3] += other
+            totals[4] += evaluations
+            totals[5] += dt
+        print("  all: {:} solves, failed {:}, wrong {:}, other state {:}, evaluations max {:} mean {:0.1f}, "
+              "{:0.2f} ms/state".format(totals[0], totals[1], totals[2], totals[3], max(totals[4]),
+                                        float(np.mean(totals[4])), 1000 * totals[5] / totals[0]))
+#endregion
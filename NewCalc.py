@@ -11,6 +11,7 @@ from PyQt5.QtCore import Qt
 from ThermoStateCalc import Ui__frm_StateCalculator
 from pyXSteam.XSteam import XSteam
 from UnitConversion import UC
+from StateSolver import solveState
 from scipy.optimize import fsolve
 import traceback
 
@@ -411,18 +412,11 @@ class thermoState:
             self._handlePressureCases(SP, f1, f2)
         elif 't' in SP:
             self._handleTemperatureCases(SP, f1, f2)
-        elif 'v' in SP:
-            self._handleVolumeCases(SP, f1, f2)
-        elif 'h' in SP:
-            self._handleEnthalpyCases(SP, f1, f2)
-        elif 'u' in SP:
-            self._handleInternalEnergyCases(SP, f1, f2)
-        elif 's' in SP:
-            self._handleEntropyCases(SP, f1, f2)
-        elif 'x' in SP:
-            self._handleQualityCases(SP, f1, f2)
         else:
-            raise ValueError(f"Invalid property combination: {SP}")
+            # the pairs without p or t go to their StateSolver pairSolver, which returns the whole state
+            self.region, self.p, self.t, self.v, self.u, self.h, self.s, self.x = solveState(
+                stProp1, stProp2, f1, f2, SI)
+            return
 
         self.computeProperties()
 
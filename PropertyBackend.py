@@ -0,0 +1,376 @@
+"""
+Property backends:  what the solvers ask of a steam table, and interchangeable implementations of it.
+A backend is an object with pyXSteam's method names for
+    forward (p, T):  v_pt, u_pt, h_pt, s_pt
+    saturation:      tsat_p, psat_t, vL_p, vV_p, uL_p, uV_p, hL_p, hV_p, sL_p, sV_p
+    backward:        t_ph, t_ps
+    constants:       criticalPressure, criticalTemperatur, triplePointPressure
+in the unit system of its SI attribute.  Every backend here is an XSteam, so anything it does not override
+(region 3, region 5, the transport properties) is pyXSteam's.
+    xsteam     pyXSteam itself
+    kernel     the IF97 equations of IF97 and IF97Array; forward and saturation also take arrays
+    tabulated  bicubic splines over (ln p, t) fitted to the kernel once per process, below psat(623.15 K)
+The backend is chosen per process with setBackend (or the THERMO_BACKEND environment variable) and per call
+with the backend argument of StateSolver.getSteamTable / solveState.
+    python PropertyBackend.py [--target 1e-6] [--n 20000] [--use scalar|array]
+times every backend and picks the fastest whose forward and saturation values are within target of the IF97
+equations, by the time of single calls or per point on arrays.
+"""
+#region imports
+import os
+import threading
+import numpy as np
+from pyXSteam.XSteam import XSteam
+import IF97
+import IF97Array
+from IF97 import toMPa, fromMPa, toKelvin, fromKelvin
+#endregion
+
+#region class definitions
+# the protocol, by group
+forwardFunctions = ('v_pt', 'u_pt', 'h_pt', 's_pt')
+saturationFunctions = ('tsat_p', 'psat_t', 'vL_p', 'vV_p', 'uL_p', 'uV_p', 'hL_p', 'hV_p', 'sL_p', 'sV_p')
+backwardFunctions = ('t_ph', 't_ps')
+constantFunctions = ('criticalPressure', 'criticalTemperatur', 'triplePointPressure')
+
+_pSat623 = 16.529164253  # MPa, where the saturated liquid leaves region 1
+
+class xsteamBackend(XSteam):
+    name = 'xsteam'
+
+    def __init__(self, SI=True):
+        '''
+        pyXSteam, for one unit system
+        :param SI: boolean True=SI units, False = English units
+        '''
+        super().__init__(XSteam.UNIT_SYSTEM_MKS if SI else XSteam.UNIT_SYSTEM_FLS)
+        self.SI = SI
+
+class kernelBackend(xsteamBackend):
+    name = 'kernel'
+
+    def __init__(self, SI=True):
+        '''
+        The IF97 equations of regions 1, 2 and 4 (IF97.py for scalars, IF97Array for arrays), with pyXSteam for
+        points outside them
+        :param SI: boolean True=SI units, False = English units
+        '''
+        super().__init__(SI)
+
+    def _forward(self, prop, p, t):
+        if np.ndim(p) or np.ndim(t):
+            values = IF97Array.propertiesPT(p, t, self.SI)
+            out = values[prop]
+            bad = values['region'] == 0
+            if bad.any():
+                P, T = np.broadcast_arrays(np.asarray(p, float), np.asarray(t, float))
+                fallback = getattr(super(), prop + '_pt')
+                out[bad] = [fallback(a, b) for a, b in zip(P[bad], T[bad])]
+            return out
+        props = IF97.propertiesPT(p, t, self.SI)
+        if props is None:
+            return getattr(super(), prop + '_pt')(p, t)
+        return props[0][prop]
+
+    def v_pt(self, p, t):
+        return self._forward('v', p, t)
+
+    def u_pt(self, p, t):
+        return self._forward('u', p, t)
+
+    def h_pt(self, p, t):
+        return self._forward('h', p, t)
+
+    def s_pt(self, p, t):
+        return self._forward('s', p, t)
+
+    def tsat_p(self, p):
+        P = toMPa(np.asarray(p, float), self.SI)
+        T = IF97Array.tsatP(P)
+        out = np.where((P >= 611.212677e-6) & (P <= 22.064), fromKelvin(T, self.SI), np.nan)
+        return out if np.ndim(p) else float(out)
+
+    def psat_t(self, t):
+        T = toKelvin(np.asarray(t, float), self.SI)
+        out = np.where((T >= 273.15) & (T <= 647.096), fromMPa(IF97Array.psatT(T), self.SI), np.nan)
+        return out if np.ndim(t) else float(out)
+
+    def _saturated(self, key, p):
+        """
+        One saturated property; above psat(623.15 K), where the saturated liquid is in region 3, pyXSteam's
+        """
+        out = IF97Array.saturationP(np.atleast_1d(np.asarray(p, float)), self.SI)[key]
+        bad = np.isnan(out) & (np.atleast_1d(toMPa(np.asarray(p, float), self.SI)) <= 22.064)
+        if bad.any():
+            fallback = getattr(super(), key + '_p')
+            out[bad] = [fallback(a) for a in np.atleast_1d(p)[bad]]
+        return out if np.ndim(p) else float(out[0])
+
+    def vL_p(self, p):
+        return self._saturated('vL', p)
+
+    def vV_p(self, p):
+        return self._saturated('vV', p)
+
+    def uL_p(self, p):
+        return self._saturated('uL', p)
+
+    def uV_p(self, p):
+        return self._saturated('uV', p)
+
+    def hL_p(self, p):
+        return self._saturated('hL', p)
+
+    def hV_p(self, p):
+        return self._saturated('hV', p)
+
+    def sL_p(self, p):
+        return self._saturated('sL', p)
+
+    def sV_p(self, p):
+        return self._saturated('sV', p)
+
+    def _backward(self, prop, p, b):
+        """
+        t at (p, b) by Newton steps on the IF97 equations kept inside the bracket from the table limit to
+        saturation on b's side of the dome; tsat in the dome as pyXSteam gives it, and pyXSteam's backward
+        equation above psat(623.15 K) or if the bracket holds no root
+        """
+        fallback = getattr(super(), 't_p' + prop)
+        P = toMPa(p, self.SI)
+        if not 611.212677e-6 < P <= _pSat623:
+            return fallback(p, b)
+        tSat = self.tsat_p(p)
+        bL, bV = getattr(self, prop + 'L_p')(p), getattr(self, prop + 'V_p')(p)
+        if bL <= b <= bV:
+            return tSat
+        lo, hi = (fromKelvin(273.15, self.SI), tSat) if b < bL else (tSat, fromKelvin(1073.15, self.SI))
+        t = 0.5 * (lo + hi)
+        for i in range(60):
+            props = IF97.propertiesPT(p, t, self.SI)
+            if props is None:
+                return fallback(p, b)
+            f = props[0][prop] - b
+            if abs(f) <= 1e-11 * max(abs(b), 1.0):
+                return t
+            if f > 0.0:
+                hi = t
+            else:
+                lo = t
+            step = t - f / props[2][prop]
+            t = step if lo < step < hi else 0.5 * (lo + hi)
+        return fallback(p, b)
+
+    def t_ph(self, p, h):
+        if np.ndim(p) or np.ndim(h):
+            return np.vectorize(lambda a, b: self._backward('h', a, b))(p, h)
+        return self._backward('h', p, h)
+
+    def t_ps(self, p, s):
+        if np.ndim(p) or np.ndim(s):
+            return np.vectorize(lambda a, b: self._backward('s', a, b))(p, s)
+        return self._backward('s', p, s)
+
+class tabulatedBackend(kernelBackend):
+    name = 'tabulated'
+
+    def __init__(self, SI=True, nP=400, nT=160):
+        '''
+        Bicubic splines fitted to the kernel, for p from the triple point to psat(623.15 K):  the saturation
+        curve in ln p, and each single-phase property on a grid of ln p and a coordinate f running from
+        saturation (f = 0 for vapor, 1 for liquid) to the table's highest or lowest t as the square of the
+        distance, so the grid never straddles the dome and is finest next to it.  v is tabulated as ln v.  The
+        tables are built on first use; points outside them and the backward functions are the kernel's.
+        :param SI: boolean True=SI units, False = English units
+        :param nP: grid points in ln p
+        :param nT: grid points across each side of the dome
+        '''
+        super().__init__(SI)
+        self.nP, self.nT = nP, nT
+        self.lock = threading.Lock()
+        self.tables = None
+
+    def _build(self):
+        from scipy.interpolate import CubicSpline, RectBivariateSpline
+        SI = self.SI
+        P = np.geomspace(611.212677e-6 * 1.0001, _pSat623 * 0.9999, self.nP)
+        lnp = np.log(fromMPa(P, SI))
+        sat = IF97Array.saturationP(fromMPa(P, SI), SI)
+        tables = {'lnp': (lnp[0], lnp[-1]), 'sat': {}}
+        for k in ('tsat', 'vL', 'vV', 'uL', 'uV', 'hL', 'hV', 'sL', 'sV'):
+            y = np.log(sat[k]) if k[0] == 'v' and k != 'tsat' else sat[k]
+            tables['sat'][k] = CubicSpline(lnp, y)
+        tMin, tMax = fromKelvin(273.15, SI), fromKelvin(1073.15, SI)
+        frac = np.linspace(0.0, 1.0, self.nT)[None, :]
+        tSat = sat['tsat'][:, None]
+        for side, t in (('L', tSat - (tSat - tMin) * (1.0 - frac) ** 2), ('V', tSat + (tMax - tSat) * frac ** 2)):
+            pp = np.broadcast_to(fromMPa(P, SI)[:, None], t.shape)
+            # the ends of each isobar's side sit on the saturation line; nudge them onto the right side
+            edge = 1e-9 * (tMax - tMin)
+            t = np.clip(t, tMin, tMax)
+            t[:, -1 if side == 'L' else 0] += -edge if side == 'L' else edge
+            values = IF97Array.propertiesPT(pp.ravel(), t.ravel(), SI)
+            for k in 'vuhs':
+                y = values[k].reshape(t.shape)
+                tables[k + side] = RectBivariateSpline(lnp, frac[0], np.log(y) if k == 'v' else y)
+        tables['range'] = (tMin, tMax)
+        self.tables = tables
+
+    def _ready(self):
+        if self.tables is None:
+            with self.lock:
+                if self.tables is None:
+                    self._build()
+        return self.tables
+
+    def _forward(self, prop, p, t):
+        tables = self._ready()
+        p, t = np.asarray(p, float), np.asarray(t, float)
+        scalar = not (p.ndim or t.ndim)
+        p, t = (a.ravel() for a in np.broadcast_arrays(p, t))
+        lnp = np.log(p)
+        tMin, tMax = tables['range']
+        inside = (lnp >= tables['lnp'][0]) & (lnp <= tables['lnp'][1]) & (t >= tMin) & (t <= tMax)
+        out = np.full(len(p), np.nan)
+        if inside.any():
+            x = lnp[inside]
+            tSat = tables['sat']['tsat'](x)
+            ti = t[inside]
+            liquid = ti < tSat
+            with np.errstate(invalid='ignore'):
+                frac = np.where(liquid, 1.0 - np.sqrt(np.clip((tSat - ti) / np.maximum(tSat - tMin, 1e-12), 0, 1)),
+                                np.sqrt(np.clip((ti - tSat) / (tMax - tSat), 0, 1)))
+            y = np.where(liquid, tables[prop + 'L'].ev(x, frac), tables[prop + 'V'].ev(x, frac))
+            out[inside] = np.exp(y) if prop == 'v' else y
+        if not inside.all():
+            rest = ~inside
+            out[rest] = super()._forward(prop, p[rest], t[rest])
+        return float(out[0]) if scalar else out
+
+    def tsat_p(self, p):
+        return self._saturated('tsat', p)
+
+    def _saturated(self, key, p):
+        tables = self._ready()
+        p = np.asarray(p, float)
+        lnp = np.log(np.atleast_1d(p))
+        inside = (lnp >= tables['lnp'][0]) & (lnp <= tables['lnp'][1])
+        out = np.full(len(lnp), np.nan)
+        y = tables['sat'][key](lnp[inside])
+        out[inside] = np.exp(y) if key[0] == 'v' else y
+        if not inside.all():
+            rest = np.atleast_1d(p)[~inside]
+            out[~inside] = kernelBackend.tsat_p(self, rest) if key == 'tsat' else super()._saturated(key, rest)
+        return out if p.ndim else float(out[0])
+#endregion
+
+#region function definitions
+backends = {'xsteam': xsteamBackend, 'kernel': kernelBackend, 'tabulated': tabulatedBackend}
+_instances = {}
+_instancesLock = threading.Lock()
+_default = [os.environ.get('THERMO_BACKEND', 'xsteam')]
+
+def getBackend(SI=True, name=None):
+    """
+    The shared backend of a kind for a unit system, made on first use
+    :param SI: boolean True=SI units, False = English units
+    :param name: one of backends, the process default if None
+    :return: the backend
+    """
+    name = _default[0] if name is None else name
+    key = (name, bool(SI))
+    backend = _instances.get(key)
+    if backend is None:
+        if name not in backends:
+            raise ValueError("Unknown property backend {:}, expected one of {:}".format(name, list(backends)))
+        with _instancesLock:
+            backend = _instances.setdefault(key, backends[name](bool(SI)))
+    return backend
+
+def setBackend(name):
+    """
+    Make a backend the default for the process
+    :param name: one of backends
+    :return: nothing
+    """
+    if name not in backends:
+        raise ValueError("Unknown property backend {:}, expected one of {:}".format(name, list(backends)))
+    _default[0] = name
+
+def benchmarkBackends(target=1e-6, n=20000, SI=True, seed=0, use='scalar'):
+    """
+    Time every backend's forward, saturation and backward functions, one call at a time and (where the backend
+    takes them) on arrays, and measure its largest relative difference from the IF97 equations on regions 1,
+    2 and the saturation line below 623.15 K.
+    :param target: the largest relative difference allowed
+    :param n: points per test
+    :param use: 'scalar' to rank by the time of single calls, 'array' by the time per point on arrays
+    :return: (name of the fastest backend within target, {name: dict of timings and errors})
+    """
+    import time
+    rng = np.random.default_rng(seed)
+    P = 10 ** rng.uniform(np.log10(0.001), np.log10(_pSat623), n)
+    T = rng.uniform(275.0, 1070.0, n)
+    p, t = fromMPa(P, SI), fromKelvin(T, SI)
+    ref = IF97Array.propertiesPT(p, t, SI)
+    keep = (ref['region'] > 0) & (np.abs(T - IF97Array.tsatP(P)) > 0.01)
+    p, t = p[keep], t[keep]
+    ref = {k: v[keep] for k, v in ref.items()}
+    pS = fromMPa(10 ** rng.uniform(np.log10(0.001), np.log10(_pSat623), n), SI)
+    refSat = IF97Array.saturationP(pS, SI)
+    m = min(2000, len(p))
+    results = {}
+    for name in backends:
+        b = getBackend(SI, name)
+        b.h_pt(p[0], t[0])  # builds tables
+        b.hL_p(pS[0])
+        row = {}
+        t0 = time.perf_counter()
+        values = {k: np.array([getattr(b, k + '_pt')(x, y) for x, y in zip(p[:m], t[:m])]) for k in 'vuhs'}
+        row['forward scalar us'] = 1e6 * (time.perf_counter() - t0) / (4 * m)
+        t0 = time.perf_counter()
+        if name == 'xsteam':  # pyXSteam takes scalars only, so its array time is a loop
+            arrays = {k: np.array([getattr(b, k + '_pt')(x, y) for x, y in zip(p, t)]) for k in 'vuhs'}
+        else:
+            arrays = {k: getattr(b, k + '_pt')(p, t) for k in 'vuhs'}
+        row['forward array us'] = 1e6 * (time.perf_counter() - t0) / (4 * len(p))
+        t0 = time.perf_counter()
+        sat = {k: np.array([getattr(b, k + '_p')(x) for x in pS[:m]]) for k in ('vL', 'vV', 'hL', 'hV', 'sL', 'sV')}
+        row['saturation scalar us'] = 1e6 * (time.perf_counter() - t0) / (6 * m)
+        t0 = time.perf_counter()
+        back = np.array([b.t_ph(x, y) for x, y in zip(p[:m // 4], ref['h'][:m // 4])])
+        row['backward scalar us'] = 1e6 * (time.perf_counter() - t0) / (m // 4)
+        err = max(float(np.max(np.abs(values[k] / ref[k][:m] - 1.0))) for k in 'vuhs')
+        err = max(err, max(float(np.max(np.abs(arrays[k] / ref[k] - 1.0))) for k in 'vuhs'))
+        err = max(err, max(float(np.max(np.abs(sat[k] / refSat[k][:m] - 1.0))) for k in sat))
+        row['largest relative error'] = err
+        row['backward error K'] = float(np.max(np.abs(toKelvin(back, SI) - toKelvin(t[:m // 4], SI))))
+        results[name] = row
+    within = [name for name in results if results[name]['largest relative error'] <= target]
+    if use == 'array':
+        cost = lambda name: results[name]['forward array us']
+    else:
+        cost = lambda name: results[name]['forward scalar us'] + results[name]['saturation scalar us']
+    best = min(within, key=cost, default=None)
+    return best, results
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Time the property backends and pick the fastest within target")
+    parser.add_argument('--target', type=float, default=1e-6, help="largest relative error allowed")
+    parser.add_argument('--n', type=int, default=20000, help="points per test")
+    parser.add_argument('--english', action='store_true', help="use English units")
+    parser.add_argument('--use', choices=('scalar', 'array'), default='scalar',
+                        help="rank by single calls (the GUIs, solveState) or by arrays (StateProcess, batches)")
+    args = parser.parse_args()
+    best, results = benchmarkBackends(args.target, args.n, not args.english, use=args.use)
+    columns = list(next(iter(results.values())))
+    print("{:10}".format("backend") + "".join("{:>24}".format(c) for c in columns))
+    for name, row in results.items():
+        print("{:10}".format(name) + "".join("{:>24.3g}".format(row[c]) for c in columns))
+    print("fastest within {:g}: {:}".format(args.target, best))
+#endregion
@@ -0,0 +1,230 @@
+"""
+The Rankine cycle, four states around a loop:
+    1  condenser exit, saturated liquid at the condenser pressure
+    2  pump exit at the boiler pressure
+    3  turbine inlet, superheated to the boiler temperature at the boiler pressure
+    4  turbine exit at the condenser pressure
+rankineCycle works one cycle out with thermoState and the differences between its states, the way the
+two-state calculator is used by hand.  cycleArrays works out many cycles at once with the StateProcess array
+processes, and sweep spreads a grid of them over a process pool:
+    python RankineCycle.py [--workers 4] [--serial]
+sweeps 100,000 cycles and checks a sample of them against rankineCycle.
+"""
+#region imports
+import os
+import numpy as np
+from IF97 import T_C, toMPa, toKelvin
+from IF97Array import saturationP, tsatP
+from StateBatch import stateColumns, regionNames
+from StateProcess import statesPT, statesPY
+#endregion
+
+#region class definitions
+class rankineCycle:
+    def __init__(self, pBoiler, tBoiler, pCondenser, turbineEfficiency=1.0, pumpEfficiency=1.0, SI=True):
+        '''
+        One cycle, solved on construction.  Works and heats are per unit mass of steam (kJ/kg or BTU/lb), the
+        heat rate is the heat added per kWh of net work (kJ/kWh or BTU/kWh).
+        :param pBoiler: boiler pressure in bar (SI) or psi
+        :param tBoiler: turbine inlet temperature in C (SI) or F
+        :param pCondenser: condenser pressure
+        :param turbineEfficiency: isentropic efficiency of the turbine
+        :param pumpEfficiency: isentropic efficiency of the pump
+        :param SI: boolean True=SI units, False = English units
+        '''
+        from ThermoStateCalc_app import thermoState
+        self.SI = SI
+        self.state1 = thermoState()
+        self.state1.setState('p', 'x', pCondenser, 0.0, SI)
+        ideal2 = thermoState()
+        ideal2.setState('p', 's', pBoiler, self.state1.s, SI)
+        self.state2 = thermoState()
+        self.state2.setState('p', 'h', pBoiler, self.state1.h + (ideal2 - self.state1).h / pumpEfficiency, SI)
+        self.state3 = thermoState()
+        self.state3.setState('p', 't', pBoiler, tBoiler, SI)
+        ideal4 = thermoState()
+        ideal4.setState('p', 's', pCondenser, self.state3.s, SI)
+        self.state4 = thermoState()
+        self.state4.setState('p', 'h', pCondenser, self.state3.h - turbineEfficiency * (self.state3 - ideal4).h, SI)
+        self.turbineWork = (self.state3 - self.state4).h
+        self.pumpWork = (self.state2 - self.state1).h
+        self.heatAdded = (self.state3 - self.state2).h
+        self.heatRejected = (self.state4 - self.state1).h
+        self.netWork = self.turbineWork - self.pumpWork
+        self.efficiency = self.netWork / self.heatAdded
+        self.heatRate = _kWh[SI] / self.efficiency
+#endregion
+
+#region function definitions
+_kWh = {True: 3600.0, False: 3412.1416}  # kJ or BTU in a kWh
+_pCritical = 22.064  # MPa
+outputs = ('efficiency', 'netWork', 'heatRate', 'turbineWork', 'pumpWork', 'heatAdded', 'x4')
+
+def _saturatedLiquid(p, sat):
+    """
+    stateColumns of saturated liquid from saturationP data
+    """
+    cols = stateColumns(len(p))
+    cols.p[:], cols.t[:], cols.x[:] = p, sat['tsat'], 0.0
+    for k in 'vuhs':
+        getattr(cols, k)[:] = sat[k + 'L']
+    cols.region.codes[:] = regionNames.index("two-phase")  # as solveState gives x = 0
+    return cols
+
+def _superheated(pB, tB, SI):
+    """
+    Whether each turbine inlet is superheated vapor, as solveState finds it:  above the saturation temperature
+    below the critical pressure, above the critical temperature at or over it.  tsat is taken from the saturation
+    equation itself, which holds up to the critical point, not from saturationP, which is nan above 623.15 K.
+    """
+    P, T = toMPa(pB, SI), toKelvin(tB, SI)
+    with np.errstate(invalid='ignore'):
+        tSat = tsatP(np.minimum(P, _pCritical))
+        return np.where(P >= _pCritical, T > T_C, T > tSat)
+
+def cycleArrays(pBoiler, tBoiler, pCondenser, turbineEfficiency=1.0, pumpEfficiency=1.0, SI=True, satBoiler=None,
+                satCondenser=None):
+    """
+    Many cycles at once.  Cycles whose turbine inlet is not superheated vapor, or that a state could not be found
+    for, are nan.
+    :param pBoiler: boiler pressures, an array or a scalar broadcast with the others
+    :param tBoiler: turbine inlet temperatures
+    :param pCondenser: condenser pressures
+    :param turbineEfficiency: isentropic efficiencies of the turbine
+    :param pumpEfficiency: isentropic efficiencies of the pump
+    :param SI: boolean True=SI units, False = English units
+    :param satBoiler: saturationP(pBoiler) if already known
+    :param satCondenser: saturationP(pCondenser) if already known
+    :return: dict of arrays keyed by outputs
+    """
+    pB, tB, pC, etaT, etaP = (a.ravel() for a in np.broadcast_arrays(
+        *(np.asarray(x, float) for x in (pBoiler, tBoiler, pCondenser, turbineEfficiency, pumpEfficiency))))
+    satC = saturationP(pC, SI) if satCondenser is None else satCondenser
+    satB = saturationP(pB, SI) if satBoiler is None else satBoiler
+    state1 = _saturatedLiquid(pC, satC)
+    ideal2 = statesPY(pB, 's', state1.s, SI, seedT=state1.t, sat=satB)
+    h2 = state1.h + (ideal2.h - state1.h) / etaP
+    state3 = statesPT(pB, tB, SI)
+    ideal4 = statesPY(pC, 's', state3.s, SI, seedT=satC['tsat'], sat=satC)
+    h4 = state3.h - etaT * (state3.h - ideal4.h)
+    state4 = statesPY(pC, 'h', h4, SI, seedT=ideal4.t, sat=satC)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        superheated = _superheated(pB, tB, SI)
+        turbine = np.where(superheated, state3.h - state4.h, np.nan)
+        pump = h2 - state1.h
+        added = state3.h - h2
+        net = turbine - pump
+        efficiency = net / added
+        return {'efficiency': efficiency, 'netWork': net, 'heatRate': _kWh[SI] / efficiency,
+                'turbineWork': turbine, 'pumpWork': pump, 'heatAdded': added, 'x4': np.where(superheated, state4.x, np.nan)}
+
+# the grid and its saturation data, set in every worker by _shareGrid so a task is just a range of grid points
+_grid = {}
+
+def _shareGrid(axes, satBoiler, satCondenser, SI):
+    _grid.update(axes=axes, satBoiler=satBoiler, satCondenser=satCondenser, SI=SI)
+
+def _sweepChunk(start, stop):
+    """
+    Cycles start to stop of the grid, in C order
+    :return: (start, dict of arrays keyed by outputs)
+    """
+    axes = _grid['axes']
+    i, j, k, m = np.unravel_index(np.arange(start, stop), tuple(len(a) for a in axes[:4]))
+    satB = {key: value[i] for key, value in _grid['satBoiler'].items()}
+    satC = {key: value[k] for key, value in _grid['satCondenser'].items()}
+    return start, cycleArrays(axes[0][i], axes[1][j], axes[2][k], axes[3][m], axes[4], _grid['SI'], satB, satC)
+
+def sweep(pBoiler, tBoiler, pCondenser, turbineEfficiency, pumpEfficiency=1.0, SI=True, maxWorkers=None,
+          chunk=5000, processes=True):
+    """
+    Every combination of the four axes.  The saturation line at every boiler and condenser pressure is worked
+    out once, here, and handed to each worker as it starts along with the axes, so a task carries only the range
+    of grid points it is to do.
+    :param pBoiler: boiler pressures
+    :param tBoiler: turbine inlet temperatures
+    :param pCondenser: condenser pressures
+    :param turbineEfficiency: turbine isentropic efficiencies
+    :param pumpEfficiency: the pump's isentropic efficiency, one for the whole grid
+    :param SI: boolean True=SI units, False = English units
+    :param maxWorkers: size of the pool, the number of CPUs if None
+    :param chunk: cycles per task
+    :param processes: use a process pool; False works the chunks out one after another in this process
+    :return: dict of arrays keyed by outputs, each of shape (len(pBoiler), len(tBoiler), len(pCondenser),
+             len(turbineEfficiency))
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    axes = tuple(np.atleast_1d(np.asarray(a, float)) for a in (pBoiler, tBoiler, pCondenser, turbineEfficiency))
+    shape = tuple(len(a) for a in axes)
+    n = int(np.prod(shape))
+    shared = (axes + (float(pumpEfficiency),), saturationP(axes[0], SI), saturationP(axes[2], SI), SI)
+    out = {k: np.empty(n) for k in outputs}
+    ranges = [(i, min(i + chunk, n)) for i in range(0, n, chunk)]
+    if processes:
+        with ProcessPoolExecutor(max_workers=maxWorkers or os.cpu_count(), initializer=_shareGrid,
+                                 initargs=shared) as pool:
+            results = pool.map(_sweepChunk, *zip(*ranges))
+            for start, values in results:
+                for k in outputs:
+                    out[k][start:start + len(values[k])] = values[k]
+    else:
+        _shareGrid(*shared)
+        for start, stop in ranges:
+            values = _sweepChunk(start, stop)[1]
+            for k in outputs:
+                out[k][start:stop] = values[k]
+    return {k: v.reshape(shape) for k, v in out.items()}
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import time
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Sweep Rankine cycles over a grid of design choices")
+    parser.add_argument('--workers', type=int, default=None, help="processes, the number of CPUs if not given")
+    parser.add_argument('--serial', action='store_true', help="work the chunks out in this process instead")
+    args = parser.parse_args()
+    pB = np.linspace(40.0, 160.0, 25)  # bar
+    tB = np.linspace(400.0, 600.0, 20)  # C
+    pC = np.geomspace(0.04, 0.5, 20)  # bar
+    eta = np.linspace(0.75, 0.95, 10)
+    t0 = time.perf_counter()
+    grid = sweep(pB, tB, pC, eta, 0.8, maxWorkers=args.workers, processes=not args.serial)
+    dt = time.perf_counter() - t0
+    n = grid['efficiency'].size
+    bad = int(np.isnan(grid['efficiency']).sum())
+    print("{:} cycles in {:0.2f} s ({:0.0f}/s) on {:} processes, {:} without a result".format(
+        n, dt, n / dt, 1 if args.serial else args.workers or os.cpu_count(), bad))
+    best = np.unravel_index(np.nanargmax(grid['efficiency']), grid['efficiency'].shape)
+    print("most efficient:  {:0.1f} bar, {:0.0f} C, {:0.3f} bar, turbine {:0.2f}:  efficiency {:0.2%}, net work "
+          "{:0.1f} kJ/kg, heat rate {:0.0f} kJ/kWh, turbine exit quality {:0.3f}".format(
+            pB[best[0]], tB[best[1]], pC[best[2]], eta[best[3]], grid['efficiency'][best], grid['netWork'][best],
+            grid['heatRate'][best], grid['x4'][best]))
+    # a sample of the grid, one cycle at a time through thermoState
+    rng = np.random.default_rng(0)
+    m = 100
+    worst = 0.0
+    t0 = time.perf_counter()
+    for idx in zip(*(rng.integers(0, len(a), m) for a in (pB, tB, pC, eta))):
+        cycle = rankineCycle(pB[idx[0]], tB[idx[1]], pC[idx[2]], eta[idx[3]], 0.8)
+        worst = max(worst, abs(cycle.efficiency - grid['efficiency'][idx]),
+                    abs(cycle.heatRate / grid['heatRate'][idx] - 1.0))
+    scalar = (time.perf_counter() - t0) / m
+    print("one cycle at a time through thermoState:  {:0.1f} ms a cycle, {:0.0f} s for the grid; largest "
+          "difference from the sweep {:0.1e}".format(1e3 * scalar, scalar * n, worst))
+    # turbine inlets at and around the top of the saturation line, where saturationP has no tsat:  a cycle is
+    # worked out only where solveState finds superheated vapor
+    from StateSolver import solveState
+    highP = [(200.0, 350.0), (200.0, 370.0), (180.0, 358.0), (215.0, 372.0), (250.0, 370.0), (250.0, 400.0)]
+    high = cycleArrays([p for p, t in highP], [t for p, t in highP], 0.1)
+    agree = all(np.isnan(e) == (solveState('p', 't', p, t).region != "super-heated vapor")
+                for (p, t), e in zip(highP, high['efficiency']))
+    print("inlets from 180 to 250 bar near the critical point:  superheated where solveState says so: {:}".format(
+        agree))
+    # a textbook check:  80 bar, 480 C, 0.08 bar, ideal turbine and pump
+    cycle = rankineCycle(80.0, 480.0, 0.08)
+    print("80 bar, 480 C, 0.08 bar, ideal:  efficiency {:0.2%}, net work {:0.1f} kJ/kg, turbine exit quality "
+          "{:0.4f}".format(cycle.efficiency, cycle.netWork, cycle.state4.x))
+#endregion
@@ -0,0 +1,252 @@
+#region imports
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from IF97 import toMPa, toKelvin, regionNumber
+from StateValidator import stateDomainError
+from SeedTable import loadSeedTable
+#endregion
+
+#region class definitions
+# what is known about a specified pair before any solver runs
+# region: "sub-cooled liquid", "two-phase" or "super-heated vapor" (the names thermoState uses)
+# if97: IF97 region number 1-5 (4 = two-phase), as far as it can be told without solving
+# sat: (pSat, tSat, af, ag) for pairs containing p or t, af/ag being the saturated values of the other property
+# bracket: (pLow, pHigh) holding the saturation pressure of a two-phase pair without p or t
+# seed: (p, t) to start an iterative single-phase solve from
+regionInfo = namedtuple('regionInfo', ['region', 'if97', 'sat', 'bracket', 'seed'])
+_tSatTolerance = 5e-4
+# seed single-phase pairs without p or t from SeedTable.npz rather than from the nearest saturated state
+seedFromTable = True
+
+class saturationTable:
+    def __init__(self, steamTable, n=240):
+        '''
+        The saturation curve from the triple point to just below the critical point, tabulated once so that
+        pairs without p or t can be placed relative to the vapor dome without calling a solver.
+        :param steamTable: the XSteam object for the unit system in use
+        :param n: number of pressures in the table
+        '''
+        st = steamTable
+        self.pc = st.criticalPressure()
+        self.tc = st.criticalTemperatur()
+        pTriple = st.triplePointPressure() * 1.0001  # XSteam rejects the triple point pressure itself
+        # log spaced, with the spacing shrinking towards the critical point where the dome closes
+        pLow = np.geomspace(pTriple, 0.9 * self.pc, n - n // 4)
+        pHigh = self.pc - np.geomspace(0.1 * self.pc, 1e-5 * self.pc, n // 4 + 1)[1:]
+        self.p = np.concatenate([pLow, pHigh])
+        self.t = np.array([st.tsat_p(p) for p in self.p])
+        # saturated liquid (f) and saturated vapor (g) values of each property
+        self.f = {}
+        self.g = {}
+        for prop in 'vuhs':
+            self.f[prop] = np.array([getattr(st, prop + 'L_p')(p) for p in self.p])
+            self.g[prop] = np.array([getattr(st, prop + 'V_p')(p) for p in self.p])
+        # scale of each property over the dome, used to compare distances between different properties
+        self.scale = {prop: np.ptp(np.concatenate([self.f[prop], self.g[prop]])) for prop in 'vuhs'}
+        self.scale['v'] = np.ptp(np.log(np.concatenate([self.f['v'], self.g['v']])))
+#endregion
+
+#region function definitions
+@lru_cache(maxsize=None)
+def getSaturationTable(steamTable):
+    """
+    The saturation table for a steam table, built on first use and then shared.
+    :param steamTable: one of the shared XSteam objects
+    :return: a saturationTable
+    """
+    return saturationTable(steamTable)
+
+def _sideOfDome(a, af, ag):
+    return "sub-cooled liquid" if a < af else "super-heated vapor"
+
+def _classifyP(st, SI, p, other, b):
+    """
+    Pairs containing the pressure
+    """
+    if p <= 0.0:
+        raise stateDomainError("Pressure must be positive, got {:}".format(p))
+    tc = st.criticalTemperatur()
+    if p >= st.criticalPressure():
+        # no vapor dome above the critical pressure, the fluid is liquid-like below tc and vapor-like above
+        if other == 'x':
+            raise stateDomainError("No two-phase state exists above the critical pressure")
+        if other == 't':
+            region = "sub-cooled liquid" if b < tc else "super-heated vapor"
+            return regionInfo(region, regionNumber(toMPa(p, SI), toKelvin(b, SI)), None, None, None)
+        bc = getattr(st, other + '_pt')(p, tc)
+        region = "sub-cooled liquid" if b < bc else "super-heated vapor"
+        return regionInfo(region, None, (None, tc, bc, bc), None, (p, tc - 1.0 if b < bc else tc + 1.0))
+    tSat = st.tsat_p(p)
+    if other == 'x':
+        return regionInfo("two-phase", 4, (p, tSat, None, None), None, None)
+    if other == 't':
+        # t within half the GUI's last decimal of tsat is taken as saturation.  Rounding tsat and the saturated
+        # values instead put states on the wrong side of the dome near the critical point, where vf and vg
+        # (and uf and ug) agree to the rounded digits.
+        if abs(b - tSat) > _tSatTolerance:
+            return regionInfo(_sideOfDome(b, tSat, tSat), regionNumber(toMPa(p, SI), toKelvin(b, SI)),
+                              (p, tSat, None, None), None, None)
+        return regionInfo("two-phase", 4, (p, tSat, None, None), None, None)
+    bf = getattr(st, other + 'L_p')(p)
+    bg = getattr(st, other + 'V_p')(p)
+    if b < bf or b > bg:
+        liquid = b < bf
+        region = _sideOfDome(b, bf, bg)
+        return regionInfo(region, 1 if liquid else 2, (p, tSat, bf, bg), None,
+                          (p, tSat - 1.0 if liquid else tSat + 1.0))
+    return regionInfo("two-phase", 4, (p, tSat, bf, bg), None, None)
+
+def _classifyT(st, SI, t, other, b):
+    """
+    Pairs containing the temperature (but not the pressure)
+    """
+    if toKelvin(t, SI) <= 0.0:
+        raise stateDomainError("Temperature must be above absolute zero, got {:}".format(t))
+    if t >= st.criticalTemperatur():
+        if other == 'x':
+            raise stateDomainError("No two-phase state exists above the critical temperature")
+        pc = st.criticalPressure()
+        # no vapor dome above the critical temperature
+        bc = getattr(st, other + '_pt')(pc, t)
+        return regionInfo("super-heated vapor", None, (pc, None, bc, bc), None, (pc, t))
+    pSat = st.psat_t(t)
+    if other == 'x':
+        return regionInfo("two-phase", 4, (pSat, t, None, None), None, None)
+    bf = getattr(st, other + 'L_p')(pSat)
+    bg = getattr(st, other + 'V_p')(pSat)
+    if b < bf or b > bg:
+        liquid = b < bf
+        return regionInfo(_sideOfDome(b, bf, bg), 1 if liquid else 2, (pSat, t, bf, bg), None,
+                          (pSat * 1.01 if liquid else pSat * 0.99, t))
+    return regionInfo("two-phase", 4, (pSat, t, bf, bg), None, None)
+
+def _firstBracket(table, g, valid):
+    """
+    First pair of neighbouring table pressures where g changes sign, both inside the valid mask.
+    :return: (pLow, pHigh) or None
+    """
+    ok = valid[:-1] & valid[1:] & (np.sign(g[:-1]) != np.sign(g[1:]))
+    idx = np.flatnonzero(ok)
+    if len(idx) == 0:
+        return None
+    i = idx[0]
+    return table.p[i], table.p[i + 1]
+
+def _classifyQuality(st, prop, a, x):
+    """
+    Pairs of a quality with v, u, h or s: the saturation pressure must lie on the table.
+    """
+    table = getSaturationTable(st)
+    g = a - (table.f[prop] + x * (table.g[prop] - table.f[prop]))
+    bracket = _firstBracket(table, g, np.ones(len(table.p), dtype=bool))
+    if bracket is None:
+        raise stateDomainError("No saturated state has {:} = {:} at quality {:}".format(prop, a, x))
+    return regionInfo("two-phase", 4, None, bracket, None)
+
+def _classifyPair(st, SI, aName, a, bName, b):
+    """
+    Pairs of two of v, u, h and s.  The state is two-phase if some saturation pressure gives both
+    properties the same quality, otherwise it is single phase and the nearest point on the saturated
+    liquid or vapor line tells the side of the dome.  The solver starts from the seed table's (p, t) for the
+    pair, or 1 degree into the phase from that saturated state if there is no table or it does not cover the
+    pair on that side.
+    """
+    if (aName == 'v' and a <= 0.0) or (bName == 'v' and b <= 0.0):
+        raise stateDomainError("Specific volume must be positive")
+    table = getSaturationTable(st)
+    af, ag = table.f[aName], table.g[aName]
+    bf, bg = table.f[bName], table.g[bName]
+    xa = (a - af) / (ag - af)
+    g = b - (bf + xa * (bg - bf))
+    bracket = _firstBracket(table, g, (xa >= 0.0) & (xa <= 1.0))
+    if bracket is not None:
+        return regionInfo("two-phase", 4, None, bracket, None)
+
+    def distance(aLine, bLine):
+        da = (np.log(a) - np.log(aLine)) if aName == 'v' else (a - aLine)
+        db = (np.log(b) - np.log(bLine)) if bName == 'v' else (b - bLine)
+        return (da / table.scale[aName]) ** 2 + (db / table.scale[bName]) ** 2
+
+    dLiquid = distance(af, bf)
+    dVapor = distance(ag, bg)
+    liquid = dLiquid.min() < dVapor.min()
+    i = int(np.argmin(dLiquid if liquid else dVapor))
+    p, t = float(table.p[i]), float(table.t[i])
+    if toKelvin(t, SI) >= 623.15:
+        if97 = 3
+    else:
+        if97 = 1 if liquid else 2
+    seeds = loadSeedTable() if seedFromTable else None
+    if seeds is not None and seeds.covers(aName, bName, liquid):
+        seed = seeds.seed(aName, a, bName, b, SI, liquid)
+    else:
+        seed = (p, t - 1.0 if liquid else t + 1.0)
+    return regionInfo("sub-cooled liquid" if liquid else "super-heated vapor", if97, None, None, seed)
+
+def classifyPairArray(st, SI, aName, a, bName, b, chunk=2048):
+    """
+    _classifyPair for arrays of points with the same pair of properties, compared against the saturation table
+    chunk points at a time.
+    :param a: array of values of aName
+    :param b: array of values of bName
+    :return: (twoPhase, bracketLow, bracketHigh, liquid, seedP, seedT) arrays; the brackets are nan for single
+             phase points and the seeds (from the seed table, or the nearest saturated state 1 degree into the
+             phase) nan for two-phase
+    """
+    table = getSaturationTable(st)
+    a, b = np.asarray(a, float), np.asarray(b, float)
+    n = len(a)
+    twoPhase = np.zeros(n, dtype=bool)
+    liquid = np.zeros(n, dtype=bool)
+    lo, hi, seedP, seedT = (np.full(n, np.nan) for i in range(4))
+    af, ag = table.f[aName], table.g[aName]
+    bf, bg = table.f[bName], table.g[bName]
+    for start in range(0, n, chunk):
+        sl = slice(start, min(start + chunk, n))
+        A, B = a[sl, None], b[sl, None]
+        xa = (A - af) / (ag - af)
+        g = B - (bf + xa * (bg - bf))
+        valid = (xa >= 0.0) & (xa <= 1.0)
+        ok = valid[:, :-1] & valid[:, 1:] & (np.sign(g[:, :-1]) != np.sign(g[:, 1:]))
+        has = ok.any(1)
+        i = np.argmax(ok, 1)
+        twoPhase[sl] = has
+        lo[sl] = np.where(has, table.p[i], np.nan)
+        hi[sl] = np.where(has, table.p[i + 1], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            da = lambda line: (np.log(A) - np.log(line)) if aName == 'v' else (A - line)
+            db = lambda line: (np.log(B) - np.log(line)) if bName == 'v' else (B - line)
+            dL = (da(af) / table.scale[aName]) ** 2 + (db(bf) / table.scale[bName]) ** 2
+            dV = (da(ag) / table.scale[aName]) ** 2 + (db(bg) / table.scale[bName]) ** 2
+        liq = dL.min(1) < dV.min(1)
+        j = np.where(liq, np.argmin(dL, 1), np.argmin(dV, 1))
+        liquid[sl] = liq & ~has
+        seedP[sl] = np.where(has, np.nan, table.p[j])
+        seedT[sl] = np.where(has, np.nan, table.t[j] + np.where(liq, -1.0, 1.0))
+    seeds = loadSeedTable() if seedFromTable else None
+    if seeds is not None:
+        use = ~twoPhase & seeds.covers(aName, bName, liquid)
+        seedP[use], seedT[use] = seeds.seed(aName, a[use], bName, b[use], SI, liquid[use])
+    return twoPhase, lo, hi, liquid, seedP, seedT
+
+def classifyRegion(st, SI, lead, a, other, b):
+    """
+    Determine the region of a specified pair before solving, so that the solver for that region can be
+    dispatched straight away and impossible pairs are rejected without iterating.
+    :param st: the XSteam object for the unit system in use
+    :param SI: boolean True=SI units, False = English units
+    :param lead: the property that leads the case ('p','t','v','h','u' or 's')
+    :param a: value of lead
+    :param other: the other property
+    :param b: value of other
+    :return: a regionInfo
+    """
+    if lead == 'p':
+        return _classifyP(st, SI, a, other, b)
+    if lead == 't':
+        return _classifyT(st, SI, a, other, b)
+    if other == 'x':
+        return _classifyQuality(st, lead, a, b)
+    return _classifyPair(st, SI, lead, a, other, b)
+#endregion
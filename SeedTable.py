@@ -0,0 +1,222 @@
+"""
+Starting points for the iterative single-phase solvers of the pairs without p or t (v, u, h and s taken two at a
+time).  For every pair and side of the dome, the plane of the pair's two properties (ln v for v) over IF97
+region 1 (liquid) or region 2 (vapor) is cut into a grid of cells, and each cell holds the (ln p, T) of the
+state nearest its centre; cells no state falls in hold their nearest filled cell's.  A seed is interpolated
+between the four cell centres around the point, so it costs the same anywhere in the domain.
+The tables are in SI and live in SeedTable.npz beside this file, which loads in a few milliseconds;
+    python SeedTable.py --build [--cells 48]
+rebuilds it, and without --build the solvers are timed from the table's seeds against the saturation line's.
+"""
+#region imports
+import itertools
+import os
+import threading
+import numpy as np
+import IF97Array
+from IF97 import fromMPa, fromKelvin, _vToSI, _eToSI, _sToSI
+#endregion
+
+#region class definitions
+seedFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SeedTable.npz')
+seedPairs = tuple(a + b for a, b in itertools.combinations('vuhs', 2))
+_toSI = {'v': _vToSI, 'u': _eToSI, 'h': _eToSI, 's': _sToSI}
+# grids whose pair hardly fixes p, so a seed from them converges to another state with the same two values:
+# u and h of a near-ideal vapor only fix T and p*v, and h - u = p*v of a liquid is tiny.  These are better
+# started from the saturation line, which leaves them failing rather than silently at another state.
+# u and s of a liquid are seeded from the table although they too hardly change with p (by 1e-7 of their value
+# per bar near 1 bar):  t comes out within 0.02 K, but p only as closely as the pair fixes it, several bar off
+# at low pressure when u and s come from another backend or are rounded.
+illPosed = ('Luh', 'Vuh')
+
+class seedTable:
+    def __init__(self, lo, hi, lnp, T):
+        '''
+        The seed grids of every pair on both sides of the dome, as buildSeedTable makes them or loadSeedTable
+        reads them.  Keys are the side ('L' or 'V') followed by a property or a pair, e.g. 'Lv' or 'Vhs'.
+        :param lo: {side + property: lowest value of its axis (ln v for v), SI}
+        :param hi: {side + property: highest value of its axis}
+        :param lnp: {side + pair: cells x cells array of ln(p / MPa) at the cell centres}
+        :param T: {side + pair: cells x cells array of T in K at the cell centres}
+        '''
+        self.lo = lo
+        self.hi = hi
+        self.lnp = lnp
+        self.T = T
+        self.cells = next(iter(lnp.values())).shape[0]
+
+    def _position(self, key, value, SI):
+        """
+        Index of the cell centre at or below each value along an axis and the fraction of the way to the next
+        """
+        x = np.asarray(value, float) * _toSI[key[1]][SI]
+        if key[1] == 'v':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                x = np.log(x)
+        f = np.nan_to_num((x - self.lo[key]) / (self.hi[key] - self.lo[key]) * self.cells - 0.5, nan=0.0)
+        i = np.clip(np.floor(f), 0, self.cells - 2).astype(np.intp)
+        return i, np.clip(f - i, 0.0, 1.0)
+
+    def covers(self, aName, bName, liquid=False):
+        """
+        :param liquid: which side of the dome, a boolean or an array of them
+        :return: True (or an array of them) where the table's seeds are to be used, see illPosed
+        """
+        pair = aName + bName if aName + bName in seedPairs else bName + aName
+        return np.where(np.asarray(liquid, bool), 'L' + pair not in illPosed, 'V' + pair not in illPosed)
+
+    def seed(self, aName, a, bName, b, SI=True, liquid=False):
+        """
+        Where to start solving for a single-phase state with aName = a and bName = b
+        :param aName: one of 'v', 'u', 'h', 's'
+        :param a: value or array of values of aName
+        :param bName: another of them
+        :param b: value or array of values of bName, broadcastable with a
+        :param SI: boolean True=SI units, False = English units
+        :param liquid: which side of the dome, a boolean or an array of them
+        :return: (p, t) in the caller's units, floats or arrays like a and b
+        """
+        if aName + bName not in seedPairs:
+            aName, bName, a, b = bName, aName, b, a
+        a, b, liquid = np.broadcast_arrays(np.asarray(a, float), np.asarray(b, float), np.asarray(liquid, bool))
+        lnp, T = np.empty(a.shape), np.empty(a.shape)
+        for side, mask in (('L', liquid), ('V', ~liquid)):
+            if not mask.any():
+                continue
+            i, wa = self._position(side + aName, a[mask], SI)
+            j, wb = self._position(side + bName, b[mask], SI)
+            for grid, out in ((self.lnp[side + aName + bName], lnp), (self.T[side + aName + bName], T)):
+                out[mask] = (1 - wa) * ((1 - wb) * grid[i, j] + wb * grid[i, j + 1]) + \
+                            wa * ((1 - wb) * grid[i + 1, j] + wb * grid[i + 1, j + 1])
+        p, t = fromMPa(np.exp(lnp), SI), fromKelvin(T, SI)
+        if p.ndim == 0:
+            return float(p), float(t)
+        return p, t
+#endregion
+
+#region function definitions
+def buildSeedTable(cells=48, nP=700, nT=700):
+    """
+    Tabulate the seeds from a grid of states over regions 1 and 2
+    :param cells: cells along each property's axis
+    :param nP: pressures sampled, log spaced from the triple point to 100 MPa
+    :param nT: temperatures sampled from 273.16 to 1073.15 K
+    :return: a seedTable
+    """
+    from scipy.ndimage import distance_transform_edt
+    P, T = np.meshgrid(np.geomspace(611.657e-6, 100.0, nP), np.linspace(273.16, 1073.15, nT), indexing='ij')
+    P, T = P.ravel(), T.ravel()
+    values = IF97Array.propertiesPT(fromMPa(P, True), fromKelvin(T, True), True)
+    lo, hi, lnp, tab = {}, {}, {}, {}
+    for side, region in (('L', 1), ('V', 2)):
+        keep = values['region'] == region
+        Ps, Ts = P[keep], T[keep]
+        axes = {k: np.log(values[k][keep]) if k == 'v' else values[k][keep] for k in 'vuhs'}
+        for k in 'vuhs':
+            lo[side + k] = float(axes[k].min())
+            hi[side + k] = float(axes[k].max()) + 1e-9 * (float(axes[k].max()) - lo[side + k])
+        for pair in seedPairs:
+            a, b = pair
+            fa = (axes[a] - lo[side + a]) / (hi[side + a] - lo[side + a]) * cells
+            fb = (axes[b] - lo[side + b]) / (hi[side + b] - lo[side + b]) * cells
+            i, j = fa.astype(np.intp), fb.astype(np.intp)
+            # the state nearest each cell's centre wins it:  assigned farthest first, so the nearest is written last
+            order = np.argsort(-((fa - i - 0.5) ** 2 + (fb - j - 0.5) ** 2), kind='stable')
+            best = np.full((cells, cells), -1, dtype=np.intp)
+            best[i[order], j[order]] = order
+            fill = distance_transform_edt(best < 0, return_distances=False, return_indices=True)
+            best = best[fill[0], fill[1]]
+            lnp[side + pair] = np.log(Ps[best]).astype(np.float32)
+            tab[side + pair] = Ts[best].astype(np.float32)
+    return seedTable(lo, hi, lnp, tab)
+
+def saveSeedTable(table, path=seedFile):
+    """
+    Write a seedTable for loadSeedTable
+    :return: nothing
+    """
+    keys = sorted(table.lo)
+    arrays = {'axes': np.array(keys), 'lo': np.array([table.lo[k] for k in keys]),
+              'hi': np.array([table.hi[k] for k in keys])}
+    for key in table.lnp:
+        arrays['lnp_' + key] = table.lnp[key]
+        arrays['T_' + key] = table.T[key]
+    np.savez_compressed(path, **arrays)
+
+_loaded = {}
+_loadLock = threading.Lock()
+
+def loadSeedTable(path=seedFile):
+    """
+    The seed table, read from path on first use and then shared
+    :return: a seedTable, or None if the file is missing
+    """
+    table = _loaded.get(path)
+    if table is None:
+        with _loadLock:
+            table = _loaded.get(path)
+            if table is None:
+                if not os.path.exists(path):
+                    return None
+                with np.load(path) as data:
+                    keys = data['axes'].tolist()
+                    grids = [side + pair for side in 'LV' for pair in seedPairs]
+                    table = seedTable(dict(zip(keys, data['lo'].tolist())), dict(zip(keys, data['hi'].tolist())),
+                                      {k: data['lnp_' + k] for k in grids}, {k: data['T_' + k] for k in grids})
+                _loaded[path] = table
+    return table
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import time
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Build or time the solver seed table")
+    parser.add_argument('--build', action='store_true', help="rebuild SeedTable.npz")
+    parser.add_argument('--cells', type=int, default=48)
+    parser.add_argument('--n', type=int, default=400, help="states per pair to time")
+    args = parser.parse_args()
+    if args.build:
+        t0 = time.perf_counter()
+        saveSeedTable(buildSeedTable(args.cells))
+        print("built {:} in {:0.2f} s, {:} bytes".format(seedFile, time.perf_counter() - t0, os.path.getsize(seedFile)))
+    t0 = time.perf_counter()
+    table = loadSeedTable()
+    print("loaded in {:0.1f} ms".format(1e3 * (time.perf_counter() - t0)))
+    # single-phase states made from (p, t), solved back from each pair seeded from the table and from the
+    # saturation line
+    import RegionClassifier
+    from StateSolver import solveState
+    from StateValidator import solveBudget
+    from WorkloadGenerator import makeWorkload
+    work = makeWorkload(args.n, {'vh': 1.0}, {'sub-cooled liquid': 1.0, 'super-heated vapor': 1.0}, seed=9)
+    for SI in (True, False):
+        if not SI:
+            work = makeWorkload(args.n, {'vh': 1.0}, {'sub-cooled liquid': 1.0, 'super-heated vapor': 1.0}, False, 9)
+        print("{:} units, {:} single-phase states per pair:".format('SI' if SI else 'English', len(work)))
+        for pair in seedPairs:
+            line = "  {:}:".format(pair)
+            for fromTable in (False, True):
+                RegionClassifier.seedFromTable = fromTable
+                evaluations = []
+                failed = wrong = 0
+                t0 = time.perf_counter()
+                for i in range(len(work)):
+                    budget = solveBudget(5000, 5.0)
+                    try:
+                        s = solveState(pair[0], pair[1], work.ref[pair[0]][i], work.ref[pair[1]][i], SI, budget)
+                    except Exception:
+                        failed += 1
+                        continue
+                    evaluations.append(budget.spent())
+                    if abs(s.p / work.ref['p'][i] - 1.0) > 1e-4 or abs(s.t - work.ref['t'][i]) > (0.01 if SI else 0.018):
+                        wrong += 1
+                dt = time.perf_counter() - t0
+                line += "  {:} mean {:5.1f} max {:4} evaluations, {:2} failed, {:2} wrong, {:0.2f} ms;".format(
+                    "table" if fromTable else "saturation", float(np.mean(evaluations)), max(evaluations), failed,
+                    wrong, 1e3 * dt / len(work))
+            print(line)
+    RegionClassifier.seedFromTable = True
+#endregion
@@ -0,0 +1,227 @@
+"""
+A process-pool batch whose workers write their results straight into shared memory.  solveBatchStream with
+processes=True sends every row to a worker and pickles every stateResult back (a pool of thermoStates would pickle
+each one's XSteam with it), which the parent then unpickles and copies into its columns.  Here the rows and the
+result columns are one multiprocessing.shared_memory block:  each worker attaches to it as it starts, a task is
+just a range of row indices, the worker writes rows start to stop in place and sends back only the error messages
+of rows it could not solve.  When the pool is done the parent's sharedColumns already holds the batch.
+    python SharedBatch.py [--rows 4000] [--workers 2]
+solves a workload both ways and measures what each sends between the processes.
+"""
+#region imports
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from StateBatch import stateColumns, regionColumn, _solveRow, _tierName, _properties
+#endregion
+
+#region class definitions
+class sharedColumns(stateColumns):
+    def __init__(self, n=0, name=None):
+        """
+        stateColumns (float64) whose columns, and the rows to be solved, are views of one shared memory block, so
+        every process attached to it reads and writes the same arrays.  The rows are kept as stProp1 and stProp2,
+        the index of each property in 'ptvuhsx', and stPropVal1 and stPropVal2.
+        The block is the owner's until close(); use astype(np.float64) for a copy that outlives it.
+        :param n: number of rows
+        :param name: name of a block made by another sharedColumns to attach to, None to make a new one
+        """
+        self.dtype = np.dtype(np.float64)
+        self.errors = {}
+        self.owner = name is None
+        size = max(_blockSize(n), 1)  # a block cannot be empty
+        self.block = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.block.name
+        offset = 0
+        self.region = regionColumn(0)
+        for k, dtype in _layout:
+            view = np.ndarray((n,), dtype, self.block.buf, offset)
+            offset += view.nbytes
+            if k == 'region':
+                self.region.codes = view
+            else:
+                setattr(self, k, view)
+        if self.owner:
+            self.region.codes[:] = 0
+            for k in _properties:
+                getattr(self, k)[:] = np.nan
+
+    def setRows(self, rows):
+        """
+        Store the state definitions to be solved
+        :param rows: sequence of (stProp1, stProp2, stPropVal1, stPropVal2), as long as the columns
+        :return: nothing
+        """
+        for i, (p1, p2, a, b) in enumerate(rows):
+            self.stProp1[i], self.stProp2[i] = _properties.index(p1), _properties.index(p2)
+            self.stPropVal1[i], self.stPropVal2[i] = a, b
+
+    def getRow(self, i):
+        """
+        :param i: row index
+        :return: the state definition of row i as (stProp1, stProp2, stPropVal1, stPropVal2)
+        """
+        return (_properties[self.stProp1[i]], _properties[self.stProp2[i]], float(self.stPropVal1[i]),
+                float(self.stPropVal2[i]))
+
+    def close(self):
+        """
+        Let go of the block, and as its owner remove it.  The columns are empty afterwards.
+        :return: nothing
+        """
+        if self.block is None:
+            return
+        for k, dtype in _layout:
+            if k == 'region':
+                self.region.codes = np.zeros(0, dtype)
+            else:
+                setattr(self, k, np.zeros(0, dtype))
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+        self.block = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except (BufferError, OSError):  # a view is still held elsewhere, or the block is already gone
+            pass
+#endregion
+
+#region function definitions
+# the arrays of a sharedColumns block in the order they are laid out, the 8 byte ones first to keep them aligned
+_layout = tuple((k, np.float64) for k in _properties) + (('stPropVal1', np.float64), ('stPropVal2', np.float64),
+                                                        ('stProp1', np.int8), ('stProp2', np.int8),
+                                                        ('region', np.int8))
+
+def _blockSize(n):
+    return sum(n * np.dtype(dtype).itemsize for k, dtype in _layout)
+
+# the batch a worker is attached to, set by _attach as the worker starts
+_batch = {}
+
+def _attach(name, n, SI, maxEvaluations, maxSeconds, accuracy):
+    _batch.update(cols=sharedColumns(n, name), SI=SI, maxEvaluations=maxEvaluations, maxSeconds=maxSeconds,
+                  accuracy=accuracy)
+
+def _solveRange(start, stop):
+    """
+    Solve rows start to stop of the attached batch, writing each into the shared columns
+    :return: dict of the error messages of the rows that could not be solved, by row index
+    """
+    cols = _batch['cols']
+    errors = {}
+    for i in range(start, stop):
+        result = _solveRow(cols.getRow(i), _batch['SI'], _batch['maxEvaluations'], _batch['maxSeconds'], None,
+                           _batch['accuracy'])
+        if isinstance(result, Exception):
+            errors[i] = str(result)
+        else:
+            cols.setRow(i, result)
+    return errors
+
+def solveBatchShared(rows, SI=True, maxWorkers=None, maxEvaluations=500, maxSeconds=1.0, chunk=64, cancel=None,
+                     accuracy=None):
+    """
+    Solves many state definitions on a process pool that writes the results into shared memory.  A task costs
+    two integers out and a dict of error messages back, however many rows it holds, so the chunks can be small
+    enough to keep every worker busy to the end.
+    :param rows: sequence of (stProp1, stProp2, stPropVal1, stPropVal2)
+    :param SI: boolean True=SI units, False = English units
+    :param maxWorkers: size of the pool, the number of CPUs if None
+    :param maxEvaluations: most property evaluations allowed for one row
+    :param maxSeconds: most seconds allowed for one row
+    :param chunk: rows per task
+    :param cancel: a threading.Event; once set, chunks not yet started are dropped and their rows stay nan
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a sharedColumns holding the results in the order of rows; close() it when done with it
+    """
+    rows = list(rows)
+    n = len(rows)
+    cols = sharedColumns(n)
+    try:
+        cols.setRows(rows)
+        with ProcessPoolExecutor(max_workers=maxWorkers or os.cpu_count(), initializer=_attach,
+                                 initargs=(cols.name, n, SI, maxEvaluations, maxSeconds,
+                                           _tierName(accuracy))) as pool:
+            futures = [pool.submit(_solveRange, i, min(i + chunk, n)) for i in range(0, n, chunk)]
+            for future in futures:
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    break
+                cols.errors.update(future.result())
+    except BaseException:
+        cols.close()
+        raise
+    return cols
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import pickle
+    import time
+    from StateBatch import solveBatchStream
+    from WorkloadGenerator import makeWorkload
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Compare the shared memory batch with the pickling one")
+    parser.add_argument('--rows', type=int, default=4000, help="rows in the workload")
+    parser.add_argument('--workers', type=int, default=None, help="processes, the number of CPUs if not given")
+    parser.add_argument('--chunk', type=int, default=64, help="rows per task")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count()
+    rows = makeWorkload(args.rows, 'process', 'plant', seed=11).rows()
+
+    # the pickling baseline:  every stateResult comes back through the pool and is copied into columns
+    t0 = time.perf_counter()
+    baseline = stateColumns(len(rows))
+    payloads = []
+    for start, results in solveBatchStream(rows, maxWorkers=workers, chunk=args.chunk):
+        payloads.append((start, results))
+        for k, result in enumerate(results):
+            if isinstance(result, Exception):
+                baseline.errors[start + k] = str(result)
+            else:
+                baseline.setRow(start + k, result)
+    pickledTime = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    shared = solveBatchShared(rows, maxWorkers=workers, chunk=args.chunk)
+    sharedTime = time.perf_counter() - t0
+
+    same = all(np.array_equal(getattr(shared, k), getattr(baseline, k), equal_nan=True) for k in _properties) and \
+        np.array_equal(shared.region.codes, baseline.region.codes) and shared.errors == baseline.errors
+    print("{:} rows on {:} processes, {:} rows a task:  pickled results {:0.2f} s, shared memory {:0.2f} s; "
+          "the same batch: {:}".format(len(rows), workers, args.chunk, pickledTime, sharedTime, same))
+
+    # what crosses between the processes for the results, and what it costs to serialize it at both ends
+    def roundTrip(objects):
+        data = [pickle.dumps(o, pickle.HIGHEST_PROTOCOL) for o in objects]
+        t0 = time.perf_counter()
+        for o in objects:
+            pickle.loads(pickle.dumps(o, pickle.HIGHEST_PROTOCOL))
+        return sum(len(d) for d in data), time.perf_counter() - t0
+
+    shareBytes, shareSeconds = roundTrip([{i: shared.errors[i] for i in range(s, min(s + args.chunk, len(rows)))
+                                           if i in shared.errors} for s in range(0, len(rows), args.chunk)])
+    pickleBytes, pickleSeconds = roundTrip(payloads)
+    from ThermoStateCalc_app import thermoState
+    states = []
+    for row in rows[:500]:
+        state = thermoState()
+        try:
+            state.setState(*row, True)
+        except Exception:
+            continue
+        states.append(state)
+    stateBytes, stateSeconds = roundTrip([states])
+    n = len(rows)
+    print("results sent back:  stateResults {:0.0f} bytes and {:0.1f} us a row, shared memory {:0.1f} bytes and "
+          "{:0.2f} us a row (the error messages only); thermoStates would be {:0.0f} bytes and {:0.1f} us a row".format(
+            pickleBytes / n, 1e6 * pickleSeconds / n, shareBytes / n, 1e6 * shareSeconds / n,
+            stateBytes / len(states), 1e6 * stateSeconds / len(states)))
+    print("columns in shared memory: {:0.0f} kB, written in place by the workers".format(_blockSize(n) / 1e3))
+    shared.close()
+#endregion
@@ -0,0 +1,362 @@
+#region imports
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import numpy as np
+from StateSolver import solveState
+from StateValidator import solveBudget
+from AccuracyTier import getAccuracy
+#endregion
+
+#region class definitions
+# the properties the delta operations difference, in the order makeDeltaLabel shows them
+deltaProperties = ('t', 'p', 'h', 'u', 's', 'v')
+_properties = ('p', 't', 'v', 'u', 'h', 's', 'x')
+# the regions a solve can return, by their code in a regionColumn (0 for a row without a state)
+regionNames = (None, 'sub-cooled liquid', 'two-phase', 'super-heated vapor')
+_regionCodes = {name: code for code, name in enumerate(regionNames)}
+# storage modes of stateColumns.  float32 holds every value to within half a unit in its last place, a relative
+# error of at most 2**-24 (6e-8) against the float64 solve:  0.02 mK at 300 C, 0.2 J/kg at 3000 kJ/kg.
+storageTypes = (np.float64, np.float32)
+# the first line of the CSV file stateColumns.save writes
+csvHeader = "region,p,t,v,u,h,s,x,error\n"
+
+class regionColumn:
+    def __init__(self, n=0):
+        '''
+        The region of every row as a one byte code (see regionNames), read and written by name like a list
+        :param n: number of rows
+        '''
+        self.codes = np.zeros(n, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        """
+        :param i: a row index, or anything numpy indexes the codes with (a slice, an index array, a boolean mask)
+        :return: the region name of row i, or a list of them
+        """
+        codes = self.codes[i]
+        if isinstance(codes, np.ndarray):
+            return [regionNames[c] for c in codes.tolist()]
+        return regionNames[codes]
+
+    def __setitem__(self, i, name):
+        if name not in _regionCodes:
+            raise ValueError("Unknown region {:}, expected one of {:}".format(name, regionNames[1:]))
+        self.codes[i] = _regionCodes[name]
+
+    def __iter__(self):
+        return iter(self[:])
+
+class stateColumns:
+    def __init__(self, n=0, dtype=np.float64):
+        """
+        A batch of thermodynamic states stored column by column rather than as one thermoState per row.
+        Rows that could not be solved hold nan and their error message is kept in errors.
+        :param n: number of rows
+        :param dtype: np.float64, or np.float32 to store the values in half the memory and file size (see
+                      storageTypes for the error)
+        """
+        if np.dtype(dtype) not in [np.dtype(d) for d in storageTypes]:
+            raise ValueError("stateColumns stores float64 or float32, got {:}".format(np.dtype(dtype)))
+        self.dtype = np.dtype(dtype)
+        self.region = regionColumn(n)
+        self.p = np.full(n, np.nan, self.dtype)
+        self.t = np.full(n, np.nan, self.dtype)
+        self.v = np.full(n, np.nan, self.dtype)
+        self.u = np.full(n, np.nan, self.dtype)
+        self.h = np.full(n, np.nan, self.dtype)
+        self.s = np.full(n, np.nan, self.dtype)
+        self.x = np.full(n, np.nan, self.dtype)
+        self.errors = {}
+
+    def __len__(self):
+        return len(self.region)
+
+    def setRow(self, i, result):
+        """
+        Store a stateResult in row i
+        :param i: row index
+        :param result: a stateResult
+        :return: nothing
+        """
+        self.region[i] = result.region
+        self.p[i], self.t[i], self.v[i], self.u[i], self.h[i], self.s[i], self.x[i] = result[1:]
+
+    def row(self, i):
+        """
+        Returns row i as a dictionary of property values
+        :param i: row index
+        :return: dict
+        """
+        return {'region': self.region[i], 'p': self.p[i], 't': self.t[i], 'v': self.v[i], 'u': self.u[i],
+                'h': self.h[i], 's': self.s[i], 'x': self.x[i]}
+
+    def astype(self, dtype):
+        """
+        A copy in another storage mode, e.g. cols.astype(np.float32) to keep float64 results compactly
+        :param dtype: np.float64 or np.float32
+        :return: a stateColumns
+        """
+        out = stateColumns(0, dtype)
+        out.region.codes = self.region.codes.copy()
+        for k in _properties:
+            setattr(out, k, getattr(self, k).astype(out.dtype))
+        out.errors = dict(self.errors)
+        return out
+
+    def nbytes(self):
+        """
+        :return: bytes held by the columns (not counting error messages)
+        """
+        return self.region.codes.nbytes + sum(getattr(self, k).nbytes for k in _properties)
+
+    def consecutiveDeltas(self, props=deltaProperties):
+        """
+        Change in each property from every row to the next, as state2 - state1 in makeDeltaLabel.
+        :param props: properties to difference
+        :return: dict of arrays of length n-1, element i being row i+1 minus row i
+        """
+        return {k: np.diff(getattr(self, k)) for k in props}
+
+    def pairwiseDeltas(self, props=deltaProperties):
+        """
+        Change in each property between every pair of rows.  Each matrix takes n*n floats, so for big batches
+        pass only the properties needed.
+        :param props: properties to difference
+        :return: dict of n x n arrays, element [i, j] being row j minus row i
+        """
+        out = {}
+        for k in props:
+            col = getattr(self, k)
+            out[k] = col[None, :] - col[:, None]
+        return out
+
+    def deltasFrom(self, reference, props=deltaProperties):
+        """
+        Change in each property of every row from a reference state.
+        :param reference: a row index, or anything with the properties as attributes (a stateResult or a
+                          thermoState) or as keys (the dict row() returns)
+        :param props: properties to difference
+        :return: dict of arrays of length n, element i being row i minus the reference
+        """
+        if isinstance(reference, (int, np.integer)):
+            reference = self.row(reference)
+        if isinstance(reference, dict):
+            return {k: getattr(self, k) - reference[k] for k in props}
+        return {k: getattr(self, k) - getattr(reference, k) for k in props}
+
+    def save(self, path):
+        """
+        Write the columns to a file, a whole column at a time:  .npz keeps every column as an array in the
+        storage mode's type and the region codes (read it back with loadColumns), anything else is written as
+        CSV with an error column and as many digits as the storage mode holds.
+        :param path: file name
+        :return: nothing
+        """
+        if str(path).endswith('.npz'):
+            rows = np.array(sorted(self.errors), dtype=np.int64)
+            np.savez(path, regionCode=self.region.codes, p=self.p, t=self.t, v=self.v, u=self.u,
+                     h=self.h, s=self.s, x=self.x, errorRows=rows,
+                     errorMessages=np.array([self.errors[i] for i in rows], dtype=str))
+            return
+        with open(path, 'w', newline='') as f:
+            f.write(csvHeader)
+            f.writelines(self.csvLines())
+
+    def csvLines(self):
+        """
+        The rows as the lines of the CSV file save writes, without its header (csvHeader), for writers that
+        append a batch at a time
+        :return: list of str, each ending in a newline
+        """
+        digits = '%.10g' if self.dtype == np.float64 else '%.9g'
+        columns = [np.char.mod(digits, getattr(self, k)) for k in 'ptvuhsx']
+        errors = [self.errors.get(i, '').replace('"', "'") for i in range(len(self))]
+        return ['{:},{:},{:},{:},{:},{:},{:},{:},"{:}"\n'.format(r or '', *vals, e)
+                for r, e, *vals in zip(self.region, errors, *columns)]
+#endregion
+
+#region function definitions
+def loadColumns(path):
+    """
+    Read a stateColumns written by stateColumns.save to a .npz file, in the storage mode it was saved in
+    :param path: file name
+    :return: a stateColumns
+    """
+    with np.load(path) as data:
+        cols = stateColumns(len(data['p']), data['p'].dtype)
+        for k in 'ptvuhsx':
+            getattr(cols, k)[:] = data[k]
+        if 'regionCode' in data:
+            cols.region.codes[:] = data['regionCode']
+        else:  # saved before the regions were coded
+            for i, r in enumerate(data['region'].tolist()):
+                cols.region[i] = r if r else None
+        cols.errors = dict(zip(data['errorRows'].tolist(), data['errorMessages'].tolist()))
+    return cols
+
+def parseRow(line):
+    """
+    One line of the text parseRows reads
+    :param line: property, property, value, value separated by commas, semicolons, tabs or spaces
+    :return: (stProp1, stProp2, stPropVal1, stPropVal2), or None for a blank line or one starting with #
+    :raises ValueError: the line is not a state definition
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.replace(',', ' ').replace(';', ' ').split()
+    if len(fields) != 4 or fields[0].lower() not in _properties or fields[1].lower() not in _properties:
+        raise ValueError("cannot read {:} as property, property, value, value".format(line))
+    return fields[0].lower(), fields[1].lower(), float(fields[2]), float(fields[3])
+
+def parseRows(text):
+    """
+    State definitions from text, one per line as property, property, value, value separated by commas,
+    semicolons, tabs or spaces (e.g. "p, t, 10, 250").  Blank lines, lines starting with # and a header line
+    that does not parse are skipped.
+    :param text: the pasted or loaded text
+    :return: list of (stProp1, stProp2, stPropVal1, stPropVal2)
+    """
+    rows = []
+    bad = []
+    for n, line in enumerate(text.splitlines(), 1):
+        try:
+            row = parseRow(line)
+        except ValueError:
+            if rows or bad:
+                bad.append(n)
+            continue
+        if row is not None:
+            rows.append(row)
+    if bad:
+        raise ValueError("cannot read line(s) {:} as property, property, value, value".format(
+            ", ".join(str(n) for n in bad[:10]) + (" ..." if len(bad) > 10 else "")))
+    return rows
+
+def _tierName(accuracy):
+    """
+    The tier a batch is solved to, resolved here so that worker processes, which may not share this process'
+    default, are handed it by name
+    :return: the tier's name, or None
+    """
+    tier = getAccuracy(accuracy)
+    return None if tier is None else tier.name
+
+def _solveRow(row, SI, maxEvaluations, maxSeconds, metrics, accuracy=None):
+    """
+    Solve one row, returning the exception instead of raising it so one bad row does not end the batch.
+    Each row gets its own budget, so a row that cannot be solved gives up instead of holding a worker.  With an
+    accuracy tier the budget is the smaller of the batch's allowance and the tier's, at the tier's tolerance.
+    :param row: (stProp1, stProp2, stPropVal1, stPropVal2)
+    :param SI: boolean True=SI units, False = English units
+    :param metrics: a StateMetrics.stateMetrics to record the call in, or None
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a stateResult or the exception raised
+    """
+    solve = solveState if metrics is None else metrics.solveState
+    tier = getAccuracy(accuracy)
+    if tier is None:
+        budget = solveBudget(maxEvaluations, maxSeconds)
+    else:
+        budget = solveBudget(min(maxEvaluations, tier.maxEvaluations), min(maxSeconds, tier.maxSeconds), tier.rtol)
+    try:
+        return solve(row[0], row[1], row[2], row[3], SI, budget, accuracy=accuracy)
+    except Exception as e:
+        return e
+
+def solveBatch(rows, SI=True, maxWorkers=None, maxEvaluations=500, maxSeconds=1.0, metrics=None, dtype=np.float64,
+               accuracy=None):
+    """
+    Solves many state definitions on a thread pool.  solveState shares nothing mutable between calls, so
+    the rows can run concurrently; the speedup depends on the interpreter (free-threaded builds) and on
+    how much of the property backend runs without holding the GIL.
+    :param rows: sequence of (stProp1, stProp2, stPropVal1, stPropVal2)
+    :param SI: boolean True=SI units, False = English units
+    :param maxWorkers: size of the thread pool, None lets concurrent.futures choose
+    :param maxEvaluations: most property evaluations allowed for one row
+    :param maxSeconds: most seconds allowed for one row
+    :param metrics: a StateMetrics.stateMetrics to record every row in, or None
+    :param dtype: storage mode of the result, np.float64 or np.float32
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a stateColumns holding the results in the order of rows
+    """
+    rows = list(rows)
+    cols = stateColumns(len(rows), dtype)
+    accuracy = _tierName(accuracy)
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        for i, result in enumerate(pool.map(lambda row: _solveRow(row, SI, maxEvaluations, maxSeconds, metrics,
+                                                                  accuracy), rows)):
+            if isinstance(result, Exception):
+                cols.errors[i] = str(result)
+            else:
+                cols.setRow(i, result)
+    return cols
+
+def _solveChunk(start, rows, SI, maxEvaluations, maxSeconds, accuracy=None):
+    """
+    Solve consecutive rows in one task, so a process pool pays its pickling once per chunk
+    :return: (start, list of stateResult or exception)
+    """
+    return start, [_solveRow(row, SI, maxEvaluations, maxSeconds, None, accuracy) for row in rows]
+
+def solveBatchStream(rows, SI=True, maxWorkers=None, maxEvaluations=500, maxSeconds=1.0, processes=True, chunk=16,
+                     cancel=None, accuracy=None):
+    """
+    Solves many state definitions on a worker pool and yields the results as they finish, for callers that
+    show progress.  Rows go to the workers in chunks; with processes=True the pool is one of processes, which
+    runs the rows in parallel whatever the interpreter.
+    :param rows: sequence of (stProp1, stProp2, stPropVal1, stPropVal2)
+    :param SI: boolean True=SI units, False = English units
+    :param maxWorkers: size of the pool, None lets concurrent.futures choose
+    :param maxEvaluations: most property evaluations allowed for one row
+    :param maxSeconds: most seconds allowed for one row
+    :param processes: use a process pool rather than a thread pool
+    :param chunk: rows per task
+    :param cancel: a threading.Event; once set, chunks not yet started are dropped and the stream ends
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: generator of (start, results) with results[k] the stateResult or exception of row start + k,
+             in the order the chunks finish
+    """
+    rows = list(rows)
+    accuracy = _tierName(accuracy)
+    pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=maxWorkers)
+    try:
+        futures = [pool.submit(_solveChunk, i, rows[i:i + chunk], SI, maxEvaluations, maxSeconds, accuracy)
+                   for i in range(0, len(rows), chunk)]
+        for future in as_completed(futures):
+            if cancel is not None and cancel.is_set():
+                break
+            yield future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # a workload solved once, stored at both precisions:  size in memory and on disk, and the float32 error
+    import logging
+    import os
+    import tempfile
+    from WorkloadGenerator import makeWorkload
+    logging.disable(logging.CRITICAL)
+    work = makeWorkload(3000, 'process', 'plant', seed=5)
+    full = solveBatch(work.rows(), maxWorkers=1)
+    half = full.astype(np.float32)
+    folder = tempfile.mkdtemp()
+    for name, cols in (('float64', full), ('float32', half)):
+        path = os.path.join(folder, name + '.npz')
+        cols.save(path)
+        back = loadColumns(path)
+        same = all(np.array_equal(getattr(back, k), getattr(cols, k), equal_nan=True) for k in _properties)
+        print("{:}: {:0.1f} bytes/row in memory, {:0.1f} bytes/row in .npz, reloads {:}".format(
+            name, cols.nbytes() / len(cols), os.path.getsize(path) / len(cols), "exactly" if same else "CHANGED"))
+    ok = np.flatnonzero(~np.isnan(full.p))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        worst = {k: float(np.max(np.abs(getattr(half, k)[ok] / getattr(full, k)[ok] - 1.0),
+                                 where=getattr(full, k)[ok] != 0.0, initial=0.0)) for k in _properties}
+    print("largest relative error of float32 against the float64 solve ({:} rows): ".format(len(ok)) +
+          ", ".join("{:} {:0.1e}".format(k, e) for k, e in worst.items()))
+    print("regions kept: {:}".format(list(half.region) == list(full.region)))
+#endregion
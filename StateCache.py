@@ -0,0 +1,311 @@
+#region imports
+import math
+import threading
+from collections import deque
+from IF97 import propertiesPT
+from StateSolver import solveState, stateResult, getSteamTable, getPairSolver
+from RegionClassifier import classifyRegion
+from StateMetrics import pairName
+#endregion
+
+#region class definitions
+# how far an input may be from a stored one and still be served from the cache.  p and v are compared relative to
+# their value, the others absolutely in the caller's units.
+defaultTolerance = {'p': 1e-4, 'v': 1e-4, 't': 0.01, 'h': 0.1, 'u': 0.1, 's': 1e-4, 'x': 1e-4}
+_relative = ('p', 'v')
+# how far, relative to its value, any property of a cached answer may be from the stored one (t, u, h, s and x,
+# which pass through zero, relative to at least 1 in the caller's units)
+defaultMaxError = 1e-4
+
+class toleranceCache:
+    def __init__(self, tolerance=None, correct=True, maxEntries=100000, maxError=defaultMaxError):
+        '''
+        A cache of solveState results that also answers for inputs close to a stored one, as instrument
+        readings are (10.0012 bar is never seen twice).  Inputs are scaled by their tolerance so that a neighbour
+        is one within distance 1 (in every coordinate), and stored on a grid of unit cells so that a lookup only
+        looks at the 9 cells around the input.
+        Closeness of the inputs alone is not enough:  a neighbour is only used if the input is in the same region
+        (so never across the saturation line, where h jumps by the latent heat), and if the first order change of
+        every property from the stored state to the input, worked out from the derivatives at the stored state
+        (IF97 in regions 1 and 2, the saturated values for two-phase states), is within maxError.  That change is
+        the error of the stored answer, and bounds the second order error of a corrected one.  A state without
+        derivatives only answers for its own input.  Anything else is solved.
+        With correct=True a neighbour is moved to the input by the first order change of every property.
+        :param tolerance: dict of allowed differences per property, merged over defaultTolerance
+        :param correct: apply the first order correction
+        :param maxEntries: most states kept; the oldest are dropped first
+        :param maxError: largest relative change of any property a cached answer may hide (see defaultMaxError)
+        '''
+        self.tolerance = dict(defaultTolerance)
+        if tolerance is not None:
+            self.tolerance.update(tolerance)
+        self.correct = correct
+        self.maxError = maxError
+        self.maxEntries = maxEntries
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Forget every stored state and the hit counts
+        :return: nothing
+        """
+        with self.lock:
+            self.cells = {}
+            self.order = deque()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def hitRate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
+
+    def _coordinate(self, name, value):
+        if name in _relative:
+            return math.log(value) / self.tolerance[name] if value > 0.0 else float('nan')
+        return value / self.tolerance[name]
+
+    def _key(self, stProp1, stProp2, stPropVal1, stPropVal2):
+        """
+        :return: (pair, names in pair order, values in pair order, scaled coordinates)
+        """
+        a, b = stProp1.lower(), stProp2.lower()
+        pair = pairName(a, b)
+        if pair[0] != a:
+            a, b, stPropVal1, stPropVal2 = b, a, stPropVal2, stPropVal1
+        values = (float(stPropVal1), float(stPropVal2))
+        return pair, (a, b), values, (self._coordinate(a, values[0]), self._coordinate(b, values[1]))
+
+    def _region(self, names, values, SI):
+        """
+        :return: the region the input lies in, without solving, or None if it cannot be told
+        """
+        solver = getPairSolver(*names)
+        a, b = values if solver.lead == names[0] else values[::-1]
+        try:
+            return classifyRegion(getSteamTable(SI), SI, solver.lead, a, solver.other, b).region
+        except Exception:
+            return None
+
+    def _withinError(self, result, change):
+        """
+        :param change: {prop: estimated error of the answer}
+        :return: True if every error is within maxError of the property's value
+        """
+        for k, e in change.items():
+            value = getattr(result, k)
+            scale = abs(value) if k in _relative else max(abs(value), 1.0)
+            if not abs(e) <= self.maxError * scale:
+                return False
+        return True
+
+    def get(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True):
+        """
+        The stored state nearest the input, if one is within tolerance, in the input's region and within maxError
+        :return: a stateResult, or None
+        """
+        pair, names, values, X = self._key(stProp1, stProp2, stPropVal1, stPropVal2)
+        if math.isnan(X[0]) or math.isnan(X[1]):
+            return None
+        i, j = math.floor(X[0]), math.floor(X[1])
+        best = None
+        bestD = 1.0
+        with self.lock:
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    for entry in self.cells.get((pair, SI, i + di, j + dj), ()):
+                        d = max(abs(entry[0][0] - X[0]), abs(entry[0][1] - X[1]))
+                        if d <= bestD:
+                            best, bestD = entry, d
+        answer = None
+        if best is not None:
+            coords, stored, result, slopes, curvature = best
+            da, db = values[0] - stored[0], values[1] - stored[1]
+            answer = self._answer(result, slopes, curvature, da, db)
+            if answer is not None and bestD > 0.0 and self._region(names, values, SI) != result.region:
+                answer = None
+        with self.lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return answer
+
+    def _answer(self, result, slopes, curvature, da, db):
+        """
+        The stored state as the answer for an input (da, db) away from its own, if its error can be bounded.
+        Stored as it is, the error is the first order change of each property; moved by that change, it is the
+        second order remainder of the expansion, from the stored second derivatives (or, without them, the first
+        order change again, which bounds it).
+        :return: a stateResult, or None if the error is over maxError or cannot be estimated
+        """
+        if da == 0.0 and db == 0.0:
+            return result
+        if slopes is None:
+            return None
+        change = {k: d1 * da + d2 * db for k, (d1, d2) in slopes.items()}
+        if not self.correct:
+            return result if self._withinError(result, change) else None
+        if curvature is None:
+            error = change
+        else:
+            error = {k: 0.5 * (H[0] * da * da + (H[1] + H[2]) * da * db + H[3] * db * db)
+                     for k, H in curvature.items()}
+        moved = [result.region] + [getattr(result, k) + change[k] if k in change else getattr(result, k)
+                                   for k in stateResult._fields[1:]]
+        moved[-1] = min(max(moved[-1], 0.0), 1.0)  # x
+        moved = stateResult(*moved)
+        return moved if self._withinError(moved, error) else None
+
+    def put(self, stProp1, stProp2, stPropVal1, stPropVal2, result, SI=True):
+        """
+        Store a solved state
+        :param result: the stateResult solveState gave for the input
+        :return: nothing
+        """
+        pair, names, values, X = self._key(stProp1, stProp2, stPropVal1, stPropVal2)
+        if math.isnan(X[0]) or math.isnan(X[1]):
+            return
+        slopes = _slopes(names, result, SI)
+        curvature = _curvature(names, values, result, slopes, self.tolerance, SI) if self.correct else None
+        entry = (X, values, result, slopes, curvature)
+        cell = (pair, SI, math.floor(X[0]), math.floor(X[1]))
+        with self.lock:
+            self.cells.setdefault(cell, []).append(entry)
+            self.order.append((cell, entry))
+            while len(self.order) > self.maxEntries:
+                oldCell, oldEntry = self.order.popleft()
+                entries = self.cells[oldCell]
+                entries.remove(oldEntry)
+                if not entries:
+                    del self.cells[oldCell]
+
+    def solveState(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True, budget=None):
+        """
+        StateSolver.solveState, answered from the cache when a stored state is within tolerance
+        :return: a stateResult
+        """
+        result = self.get(stProp1, stProp2, stPropVal1, stPropVal2, SI)
+        if result is None:
+            result = solveState(stProp1, stProp2, stPropVal1, stPropVal2, SI, budget)
+            self.put(stProp1, stProp2, stPropVal1, stPropVal2, result, SI)
+        return result
+#endregion
+
+#region function definitions
+def _baseDerivatives(result, SI):
+    """
+    Derivatives of every property with respect to the two variables that fix the state:  (p, t) for a
+    single-phase state, from the IF97 equations, and (p, x) for a two-phase one, from the saturated values
+    (differenced in p).
+    :return: {prop: (d prop / d first, d prop / d second)} or None outside what can be differenced
+    """
+    if result.region != "two-phase":
+        props = propertiesPT(result.p, result.t, SI)
+        if props is None:
+            return None
+        values, dp, dT = props
+        D = {k: (dp[k], dT[k]) for k in 'vuhs'}
+        D.update(p=(1.0, 0.0), t=(0.0, 1.0), x=(0.0, 0.0))
+        return D
+    st = getSteamTable(SI)
+    p, x = result.p, result.x
+    if p >= st.criticalPressure() * 0.999:
+        return None
+    step = 1e-6 * p
+    D = {'p': (1.0, 0.0), 'x': (0.0, 1.0), 't': ((st.tsat_p(p + step) - st.tsat_p(p - step)) / (2 * step), 0.0)}
+    for k in 'vuhs':
+        fL, fV = getattr(st, k + 'L_p'), getattr(st, k + 'V_p')
+        mix = lambda P: fL(P) + x * (fV(P) - fL(P))
+        D[k] = ((mix(p + step) - mix(p - step)) / (2 * step), fV(p) - fL(p))
+    return D
+
+def _slopes(names, result, SI):
+    """
+    First order change of every property per unit change of each specified property, by turning the
+    derivatives with respect to the state's own variables around to derivatives with respect to the pair.
+    :param names: the two specified properties
+    :return: {prop: (d prop / d first, d prop / d second)} or None where the pair does not fix the state to
+             first order (p and t of a two-phase state) or the derivatives are not available
+    """
+    D = _baseDerivatives(result, SI)
+    if D is None:
+        return None
+    a, b = names
+    det = D[a][0] * D[b][1] - D[a][1] * D[b][0]
+    if det == 0.0 or math.isnan(det):
+        return None
+    # inverse of d(a, b)/d(first, second)
+    d1a, d1b = D[b][1] / det, -D[a][1] / det
+    d2a, d2b = -D[b][0] / det, D[a][0] / det
+    return {k: (D[k][0] * d1a + D[k][1] * d2a, D[k][0] * d1b + D[k][1] * d2b) for k in D}
+
+def _curvature(names, values, result, slopes, tolerance, SI):
+    """
+    Second derivatives of every property with respect to the pair, by differencing the slopes at the stored
+    state and at states one tolerance away along each of the pair (moved there to first order)
+    :param names: the two specified properties
+    :param values: their values at the stored state
+    :return: {prop: (d2/da2, d2/da db, d2/db da, d2/db2)} or None where the slopes cannot be had on either side
+    """
+    if slopes is None:
+        return None
+    there = []
+    for name, value, which in zip(names, values, (0, 1)):
+        step = tolerance[name] * abs(value) if name in _relative else tolerance[name]
+        if name == 'x' and value + step > 1.0:
+            step = -step
+        moved = [result.region] + [getattr(result, k) + slopes[k][which] * step if k in slopes else getattr(result, k)
+                                   for k in stateResult._fields[1:]]
+        other = _slopes(names, stateResult(*moved), SI)
+        if other is None:
+            return None
+        there.append((other, step))
+    (A, stepA), (B, stepB) = there
+    return {k: ((A[k][0] - d1) / stepA, (A[k][1] - d2) / stepA, (B[k][0] - d1) / stepB, (B[k][1] - d2) / stepB)
+            for k, (d1, d2) in slopes.items()}
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # noisy readings around a few operating points:  hit rate and the worst error of a cached answer against
+    # solving every reading
+    import logging
+    import random
+    import time
+    logging.disable(logging.CRITICAL)
+    random.seed(3)
+    setpoints = [('p', 't', 10.0, 250.0), ('p', 't', 80.0, 480.0), ('p', 'h', 1.0, 2500.0), ('t', 'v', 150.0, 0.3),
+                 ('h', 's', 3200.0, 7.0), ('p', 't', 50.0, 150.0)]
+    readings = []
+    for i in range(3000):
+        a, b, va, vb = random.choice(setpoints)
+        noise = lambda value, rel: value * (1.0 + random.gauss(0.0, rel))
+        readings.append((a, b, noise(va, 2e-4), noise(vb, 2e-4)))
+    exact = []
+    t0 = time.perf_counter()
+    for r in readings:
+        exact.append(solveState(*r))
+    tExact = time.perf_counter() - t0
+    for correct in (False, True):
+        cache = toleranceCache(tolerance={'p': 1e-3, 't': 0.2, 'h': 1.0, 's': 1e-3, 'v': 1e-3}, correct=correct)
+        t0 = time.perf_counter()
+        cached = [cache.solveState(*r) for r in readings]
+        dt = time.perf_counter() - t0
+        worst = {k: max(abs(getattr(c, k) - getattr(e, k)) / max(abs(getattr(e, k)), 1e-12)
+                        for c, e in zip(cached, exact)) for k in ('p', 't', 'v', 'u', 'h', 's')}
+        print("correct={:}: hit rate {:0.1%}, {:} states stored, {:0.3f} s against {:0.3f} s solving every reading".format(
+            correct, cache.hitRate(), len(cache), dt, tExact))
+        print("  worst relative error: " + ", ".join("{:} {:0.1e}".format(k, e) for k, e in worst.items()))
+    # either side of the saturation line, inside the input tolerance of each other:  the liquid state must not
+    # answer for the vapor one
+    cache = toleranceCache()
+    tSat = getSteamTable(True).tsat_p(10.0)
+    liquid = cache.solveState('p', 't', 10.0, tSat - 0.004)
+    vapor = cache.solveState('p', 't', 10.0, tSat + 0.004)
+    print("10 bar, tsat -/+ 0.004 C:  h {:0.1f} and {:0.1f} kJ/kg (solved: {:0.1f}), {:} hits".format(
+        liquid.h, vapor.h, solveState('p', 't', 10.0, tSat + 0.004).h, cache.hits))
+#endregion
@@ -0,0 +1,249 @@
+#region imports
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from StateSolver import solveState
+#endregion
+
+#region class definitions
+# upper edges of the latency buckets in seconds, 20 us to 5 s in steps of about 2x
+latencyBuckets = (2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+class latencyHistogram:
+    def __init__(self, buckets=latencyBuckets):
+        '''
+        Counts of calls by latency, in the cumulative form Prometheus expects on export.
+        :param buckets: increasing upper edges in seconds, an overflow bucket is added
+        '''
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """
+        :return: list of (upper edge, calls at or below it), ending with ('+Inf', count)
+        """
+        total = 0
+        out = []
+        for le, n in zip(self.buckets + ('+Inf',), self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+    def quantile(self, q):
+        """
+        Estimate of a latency quantile, as the upper edge of the bucket it falls in.
+        :param q: 0 to 1
+        :return: seconds, inf if it falls in the overflow bucket, nan with no calls
+        """
+        if self.count == 0:
+            return float('nan')
+        rank = q * self.count
+        for le, total in self.cumulative():
+            if total >= rank:
+                return float('inf') if le == '+Inf' else le
+        return float('inf')
+
+class stateMetrics:
+    def __init__(self, slowCalls=50, slowThreshold=0.0):
+        '''
+        Latency histograms per property pair and a log of the slowest calls with their inputs.  Safe to share
+        between threads; the time spent recording is itself measured so the overhead can be checked.
+        :param slowCalls: how many of the slowest calls to keep
+        :param slowThreshold: calls faster than this (s) are never logged as slow
+        '''
+        self.slowCalls = slowCalls
+        self.slowThreshold = slowThreshold
+        self.lock = threading.Lock()
+        self.recorder = None  # a StateRecorder.requestRecorder logging every call, while recording
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        :return: nothing
+        """
+        with self.lock:
+            self.histograms = {}
+            self.errors = {}
+            self.slowest = []  # min-heap of (seconds, sequence, call), so the fastest of the slow is first out
+            self.recent = deque(maxlen=self.slowCalls)  # the latest slow calls in the order they happened
+            self.sequence = 0
+            self.overhead = 0.0
+
+    def observe(self, stProp1, stProp2, stPropVal1, stPropVal2, SI, seconds, error=None):
+        """
+        Record one call
+        :param seconds: how long the call took
+        :param error: the exception it raised, if any
+        :return: nothing
+        """
+        t0 = time.perf_counter()
+        pair = pairName(stProp1, stProp2)
+        with self.lock:
+            self.sequence += 1
+            hist = self.histograms.get(pair)
+            if hist is None:
+                hist = self.histograms[pair] = latencyHistogram()
+            hist.add(seconds)
+            if error is not None:
+                key = (pair, type(error).__name__)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            if seconds >= self.slowThreshold and (len(self.slowest) < self.slowCalls or seconds > self.slowest[0][0]):
+                call = {'time': time.time(), 'pair': pair, 'props': [stProp1, stProp2],
+                        'values': [stPropVal1, stPropVal2], 'SI': SI, 'seconds': seconds,
+                        'error': None if error is None else "{:}: {:}".format(type(error).__name__, error)}
+                if len(self.slowest) < self.slowCalls:
+                    heapq.heappush(self.slowest, (seconds, self.sequence, call))
+                else:
+                    heapq.heapreplace(self.slowest, (seconds, self.sequence, call))
+                self.recent.append(call)
+            self.overhead += time.perf_counter() - t0
+
+    def solveState(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True, budget=None, accuracy=None):
+        """
+        StateSolver.solveState, timed and recorded (and logged to the recorder, if one is set)
+        :return: a stateResult
+        """
+        if self.recorder is not None:
+            self.recorder.record(stProp1, stProp2, stPropVal1, stPropVal2, SI)
+        t0 = time.perf_counter()
+        try:
+            result = solveState(stProp1, stProp2, stPropVal1, stPropVal2, SI, budget, accuracy=accuracy)
+        except Exception as e:
+            self.observe(stProp1, stProp2, stPropVal1, stPropVal2, SI, time.perf_counter() - t0, e)
+            raise
+        self.observe(stProp1, stProp2, stPropVal1, stPropVal2, SI, time.perf_counter() - t0)
+        return result
+
+    def slowestCalls(self):
+        """
+        :return: the slowest calls recorded, slowest first
+        """
+        with self.lock:
+            return [call for seconds, n, call in sorted(self.slowest, key=lambda c: (-c[0], c[1]))]
+
+    def toDict(self):
+        """
+        Everything recorded, in a form json can write
+        :return: dict
+        """
+        slowest = self.slowestCalls()
+        with self.lock:
+            pairs = {}
+            for pair, hist in sorted(self.histograms.items()):
+                pairs[pair] = {'count': hist.count, 'sum': hist.sum,
+                               'p50': hist.quantile(0.5), 'p99': hist.quantile(0.99), 'p999': hist.quantile(0.999),
+                               'buckets': [[str(le), n] for le, n in hist.cumulative()]}
+            errors = [{'pair': pair, 'error': name, 'count': n} for (pair, name), n in sorted(self.errors.items())]
+            calls = sum(h.count for h in self.histograms.values())
+            return {'pairs': pairs, 'errors': errors, 'slowest': slowest, 'recent': list(self.recent),
+                    'overhead': {'seconds': self.overhead, 'perCall': self.overhead / calls if calls else 0.0}}
+
+    def toPrometheus(self):
+        """
+        Everything recorded in the Prometheus text exposition format
+        :return: string
+        """
+        with self.lock:
+            lines = ["# HELP steam_solve_seconds Time taken by solveState, by pair of specified properties",
+                     "# TYPE steam_solve_seconds histogram"]
+            for pair, hist in sorted(self.histograms.items()):
+                for le, n in hist.cumulative():
+                    lines.append('steam_solve_seconds_bucket{{pair="{:}",le="{:}"}} {:}'.format(pair, le, n))
+                lines.append('steam_solve_seconds_sum{{pair="{:}"}} {:.9g}'.format(pair, hist.sum))
+                lines.append('steam_solve_seconds_count{{pair="{:}"}} {:}'.format(pair, hist.count))
+            lines += ["# HELP steam_solve_errors_total Failed solveState calls, by pair and error type",
+                      "# TYPE steam_solve_errors_total counter"]
+            for (pair, name), n in sorted(self.errors.items()):
+                lines.append('steam_solve_errors_total{{pair="{:}",error="{:}"}} {:}'.format(pair, name, n))
+            lines += ["# HELP steam_metrics_overhead_seconds_total Time spent recording these metrics",
+                      "# TYPE steam_metrics_overhead_seconds_total counter",
+                      "steam_metrics_overhead_seconds_total {:.9g}".format(self.overhead)]
+            return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path):
+        """
+        Write toPrometheus() to a file for a collector to scrape.  The file is replaced in one step so a
+        scrape never sees half of it.
+        :return: nothing
+        """
+        _replaceFile(path, self.toPrometheus())
+
+    def writeJSON(self, path):
+        """
+        Write toDict() as JSON, replacing the file in one step
+        :return: nothing
+        """
+        _replaceFile(path, json.dumps(self.toDict(), indent=1))
+#endregion
+
+#region function definitions
+def pairName(stProp1, stProp2):
+    """
+    The pair in the order of the 21 cases, so that 'tp' and 'pt' are counted together
+    :return: e.g. 'pt'
+    """
+    order = 'ptvhusx'
+    a, b = stProp1.lower(), stProp2.lower()
+    return a + b if order.find(a) <= order.find(b) else b + a
+
+def _replaceFile(path, text):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+# the metrics thermoState records into
+defaultMetrics = stateMetrics()
+if os.environ.get('THERMO_RECORD'):
+    from StateRecorder import startRecording
+    startRecording(os.environ['THERMO_RECORD'], defaultMetrics)
+
+def measureOverhead(rows, SI=True, repeat=3):
+    """
+    Compare the time to solve rows with and without recording metrics.
+    :param rows: sequence of (stProp1, stProp2, stPropVal1, stPropVal2)
+    :return: (seconds without, seconds with, seconds spent inside observe)
+    """
+    metrics = stateMetrics()
+    plain = timed = float('inf')
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for row in rows:
+            try:
+                solveState(*row, SI)
+            except Exception:
+                pass
+        plain = min(plain, time.perf_counter() - t0)
+        metrics.reset()
+        t0 = time.perf_counter()
+        for row in rows:
+            try:
+                metrics.solveState(*row, SI)
+            except Exception:
+                pass
+        timed = min(timed, time.perf_counter() - t0)
+    return plain, timed, metrics.overhead
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.CRITICAL)
+    rows = [('p', 't', 10, 200), ('p', 'x', 5, 0.4), ('t', 'v', 150, 0.5), ('h', 's', 3000, 7),
+            ('v', 'u', 0.2, 2600), ('p', 'x', 5, 1.5)] * 50
+    plain, timed, overhead = measureOverhead(rows)
+    print("{:} solves: {:0.4f} s plain, {:0.4f} s recorded, {:0.4f} s inside observe ({:0.2f} us/call, {:0.2f}%)".format(
+        len(rows), plain, timed, overhead, 1e6 * overhead / len(rows), 100 * overhead / plain))
+#endregion
@@ -0,0 +1,238 @@
+#region imports
+import numpy as np
+from IF97Array import propertiesPT, saturationP
+from IF97 import fromKelvin
+from StateSolver import getSteamTable, solveState
+from StateBatch import stateColumns
+from AccuracyTier import getAccuracy
+#endregion
+
+#region function definitions
+def _label(cols, idx, p, t, SI):
+    """
+    Region names and x of single-phase rows, as completeState gives them
+    """
+    st = getSteamTable(SI)
+    pc, tc = st.criticalPressure(), st.criticalTemperatur()
+    sat = saturationP(np.minimum(p, pc), SI)
+    with np.errstate(invalid='ignore'):
+        tSat = np.where(p < pc, sat['tsat'], tc)
+        liquid = t < tSat
+    cols.x[idx] = np.where(liquid, 0.0, 1.0)
+    for i, isLiquid in zip(idx, liquid):
+        cols.region[i] = "sub-cooled liquid" if isLiquid else "super-heated vapor"
+
+def statesPT(p, t, SI=True, accuracy=None):
+    """
+    Single-phase states at arrays of (p, t), straight from the IF97Array kernel.  Points outside regions 1 and
+    2 are left to StateSolver.
+    :param p: pressure in bar (SI) or psi
+    :param t: temperature in C (SI) or F
+    :param SI: boolean True=SI units, False = English units
+    :param accuracy: name of the AccuracyTier tier the points left to StateSolver are solved to
+    :return: a stateColumns
+    """
+    p, t = (a.ravel() for a in np.broadcast_arrays(np.asarray(p, float), np.asarray(t, float)))
+    cols = stateColumns(len(p))
+    vals = propertiesPT(p, t, SI)
+    ok = np.flatnonzero(vals['region'] > 0)
+    cols.p[ok], cols.t[ok] = p[ok], t[ok]
+    for k in 'vuhs':
+        getattr(cols, k)[ok] = vals[k][ok]
+    _label(cols, ok, p[ok], t[ok], SI)
+    _fallback(cols, np.flatnonzero(vals['region'] == 0), 't', p, t, SI, accuracy)
+    return cols
+
+def _fallback(cols, idx, prop, p, b, SI, accuracy=None):
+    """
+    Solve the rows the kernel could not, one at a time with StateSolver
+    """
+    for i in idx:
+        try:
+            cols.setRow(i, solveState('p', prop, p[i], b[i], SI, accuracy=accuracy))
+        except Exception as e:
+            cols.errors[int(i)] = str(e)
+
+def statesPY(p, prop, b, SI=True, seedT=None, sat=None, maxIter=60, accuracy=None):
+    """
+    States at arrays of p and one of h, s, u or v, all points at once.  Points between the saturated values are
+    two-phase.  The others are single phase and t is found by Newton on the IF97Array kernel, kept inside the
+    bracket from the table limit to saturation on the point's side of the dome (and cut back to bisection
+    whenever a step leaves it).  Points the kernel cannot evaluate (region 3, above 623.15 K on the dome) go to
+    StateSolver.solveState.
+    :param p: pressure in bar (SI) or psi
+    :param prop: 'h', 's', 'u' or 'v'; properties along an isobar rise with t, v only above 4 C in water
+    :param b: values of prop
+    :param SI: boolean True=SI units, False = English units
+    :param seedT: starting temperatures, e.g. the inlet's for a small change of state; saturation +/- 10 if None
+    :param sat: saturationP(p) if already known (as for a process at the inlet's pressure)
+    :param maxIter: most Newton steps
+    :param accuracy: name of the AccuracyTier tier to solve to:  Newton stops at its rtol rather than 1e-10, and
+                     the points left to StateSolver are solved to it.  The process default if None.
+    :return: a stateColumns
+    """
+    tier = getAccuracy(accuracy)
+    rtol = 1e-10 if tier is None else tier.rtol
+    p, b = (a.ravel() for a in np.broadcast_arrays(np.asarray(p, float), np.asarray(b, float)))
+    n = len(p)
+    st = getSteamTable(SI)
+    cols = stateColumns(n)
+    sat = saturationP(p, SI) if sat is None else sat
+    pc = st.criticalPressure()
+    bL, bV = sat[prop + 'L'], sat[prop + 'V']
+    with np.errstate(invalid='ignore'):
+        two = (p < pc) & (b >= bL) & (b <= bV)
+        liquid = (p < pc) & (b < bL)
+        vapor = (p < pc) & (b > bV)
+    # two-phase rows from the saturated values
+    idx = np.flatnonzero(two)
+    x = (b[idx] - bL[idx]) / (bV[idx] - bL[idx])
+    for k in 'vuhs':
+        getattr(cols, k)[idx] = sat[k + 'L'][idx] + x * (sat[k + 'V'][idx] - sat[k + 'L'][idx])
+    cols.p[idx], cols.t[idx], cols.x[idx] = p[idx], sat['tsat'][idx], x
+    for i in idx:
+        cols.region[i] = "two-phase"
+
+    # single phase:  safeguarded Newton on t inside [lo, hi]
+    tMin, tMax = fromKelvin(273.16, SI), fromKelvin(1073.15, SI)
+    if prop == 'v':
+        tMin = fromKelvin(277.13, SI)  # v of water falls until 4 C
+    single = np.flatnonzero(liquid | vapor | (p >= pc))
+    ps, bs = p[single], b[single]
+    tSat = sat['tsat'][single]
+    lo = np.where(vapor[single], tSat, tMin)
+    hi = np.where(liquid[single], tSat, tMax)
+    if seedT is None:
+        t = np.where(liquid[single], tSat - 10.0, np.where(vapor[single], tSat + 10.0, 0.5 * (tMin + tMax)))
+    else:
+        t = np.broadcast_to(np.asarray(seedT, float), (n,))[single].copy()
+    with np.errstate(invalid='ignore'):
+        t = np.where((t > lo) & (t < hi), t, 0.5 * (lo + hi))
+    active = np.ones(len(single), dtype=bool)
+    tol = rtol * np.maximum(np.abs(bs), 1e-3 if prop == 'v' else 1.0)
+    for it in range(maxIter):
+        a = np.flatnonzero(active)
+        if len(a) == 0:
+            break
+        vals, dp, dT = propertiesPT(ps[a], t[a], SI, derivatives=True)
+        f = vals[prop] - bs[a]
+        bad = np.isnan(f)
+        active[a[bad]] = False
+        conv = np.abs(f) <= tol[a]
+        active[a[conv]] = False
+        keep = ~bad & ~conv
+        a, f, slope = a[keep], f[keep], dT[prop][keep]
+        # the property rises with t, so the root is below t where f > 0
+        hi[a] = np.where(f > 0, t[a], hi[a])
+        lo[a] = np.where(f < 0, t[a], lo[a])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = t[a] - f / slope
+        inside = (step > lo[a]) & (step < hi[a])
+        t[a] = np.where(inside, step, 0.5 * (lo[a] + hi[a]))
+    vals = propertiesPT(ps, t, SI)
+    res = np.abs(vals[prop] - bs)
+    ok = ~np.isnan(res) & (res <= 100.0 * tol)
+    idx = single[ok]
+    cols.p[idx], cols.t[idx] = ps[ok], t[ok]
+    for k in 'vuhs':
+        getattr(cols, k)[idx] = vals[k][ok]
+    _label(cols, idx, ps[ok], t[ok], SI)
+    _fallback(cols, single[~ok], prop, p, b, SI, accuracy)
+    # rows neither two-phase nor single phase (nan inputs, or tsat where the kernel has no saturation data)
+    rest = np.flatnonzero(~two & ~liquid & ~vapor & (p < pc))
+    _fallback(cols, rest, prop, p, b, SI, accuracy)
+    return cols
+
+def isentropic(inlet, p2, efficiency=1.0, SI=True, accuracy=None):
+    """
+    Outlet of an adiabatic expansion (turbine, p2 < p1) or compression (pump or compressor, p2 > p1) with an
+    isentropic efficiency.  The ideal outlet is at (p2, s1); the actual one at (p2, h2) with
+    h2 = h1 - efficiency * (h1 - h2s) for expansion and h2 = h1 + (h2s - h1) / efficiency for compression.
+    :param inlet: stateColumns of inlet states
+    :param p2: outlet pressure, scalar or one per inlet
+    :param efficiency: isentropic efficiency, scalar or one per inlet
+    :param SI: boolean True=SI units, False = English units
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: stateColumns of outlet states
+    """
+    p2 = np.broadcast_to(np.asarray(p2, float), inlet.p.shape)
+    eta = np.broadcast_to(np.asarray(efficiency, float), inlet.p.shape)
+    ideal = statesPY(p2, 's', inlet.s, SI, seedT=inlet.t, accuracy=accuracy)
+    with np.errstate(invalid='ignore'):
+        h2 = np.where(p2 <= inlet.p, inlet.h - eta * (inlet.h - ideal.h), inlet.h + (ideal.h - inlet.h) / eta)
+    if np.all(eta == 1.0):
+        return ideal
+    return statesPY(p2, 'h', h2, SI, seedT=ideal.t, accuracy=accuracy)
+
+def isenthalpic(inlet, p2, SI=True, accuracy=None):
+    """
+    Outlet of a throttle:  h2 = h1 at p2
+    :param inlet: stateColumns of inlet states
+    :param p2: outlet pressure, scalar or one per inlet
+    :param SI: boolean True=SI units, False = English units
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: stateColumns of outlet states
+    """
+    p2 = np.broadcast_to(np.asarray(p2, float), inlet.p.shape)
+    return statesPY(p2, 'h', inlet.h, SI, seedT=inlet.t, accuracy=accuracy)
+
+def isobaric(inlet, t2=None, h2=None, q=None, SI=True, accuracy=None):
+    """
+    Outlet of heating or cooling at the inlet pressure, to a temperature t2, an enthalpy h2 or by a heat q per
+    unit mass (h2 = h1 + q).  The saturation data at the inlet pressure is computed once for all of them.
+    :param inlet: stateColumns of inlet states
+    :param t2: outlet temperature, scalar or one per inlet
+    :param h2: outlet enthalpy, scalar or one per inlet
+    :param q: heat added per unit mass, scalar or one per inlet
+    :param SI: boolean True=SI units, False = English units
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: stateColumns of outlet states
+    """
+    if t2 is not None:
+        return statesPT(inlet.p, np.broadcast_to(np.asarray(t2, float), inlet.p.shape), SI, accuracy)
+    if h2 is None:
+        if q is None:
+            raise ValueError("isobaric needs one of t2, h2 or q")
+        h2 = inlet.h + np.asarray(q, float)
+    sat = saturationP(inlet.p, SI)
+    return statesPY(inlet.p, 'h', np.broadcast_to(np.asarray(h2, float), inlet.p.shape), SI, seedT=inlet.t,
+                    sat=sat, accuracy=accuracy)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    # turbine expansion, throttling and heating of a batch of superheated inlets, against setState one by one
+    import logging
+    import time
+    logging.disable(logging.CRITICAL)
+    rng = np.random.default_rng(4)
+    n = 2000
+    p1 = rng.uniform(20.0, 150.0, n)
+    t1 = rng.uniform(400.0, 600.0, n)
+    p2 = rng.uniform(0.05, 10.0, n)
+    inlet = statesPT(p1, t1)
+    cases = [('isentropic, efficiency 0.85', lambda: isentropic(inlet, p2, 0.85)),
+             ('isenthalpic', lambda: isenthalpic(inlet, p2)),
+             ('isobaric, q = 300', lambda: isobaric(inlet, q=300.0))]
+    for name, fn in cases:
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        m = 200
+        t0 = time.perf_counter()
+        ref = []
+        for i in range(m):
+            if name.startswith('isentropic'):
+                s2 = solveState('p', 's', p2[i], inlet.s[i])
+                h2 = inlet.h[i] - 0.85 * (inlet.h[i] - s2.h)
+                ref.append(solveState('p', 'h', p2[i], h2))
+            elif name == 'isenthalpic':
+                ref.append(solveState('p', 'h', p2[i], inlet.h[i]))
+            else:
+                ref.append(solveState('p', 'h', inlet.p[i], inlet.h[i] + 300.0))
+        dtRef = (time.perf_counter() - t0) * n / m
+        worst = max(max(abs(out.t[i] - r.t), abs(out.s[i] - r.s) * 100.0) for i, r in enumerate(ref))
+        print("{:}: {:} outlets in {:0.3f} s ({:0.0f}/s), solveState would take {:0.2f} s; {:} failed; "
+              "largest difference from solveState {:0.1e} (C, or kJ/kg*K x 100)".format(
+                name, n, dt, n / dt, dtRef, len(out.errors), worst))
+#endregion
@@ -0,0 +1,277 @@
+"""
+Records the state requests a process makes and plays them back as a load test.
+A recorder appends every call of StateMetrics.stateMetrics.solveState (and so every thermoState.setState) to a
+binary log, one 27 byte record per call:  the time it arrived, the pair, the unit system and the two values.
+Recording starts with startRecording, or for the whole process by setting the THERMO_RECORD environment
+variable to the log's path.
+    python StateRecorder.py replay calls.rec [--fast] [--speed 2] [--threads 4] [--backend kernel] [--cache]
+plays a log back at its original pace (or as fast as it can) against an engine configuration and reports the
+throughput and the latency distribution, overall and per pair.
+    python StateRecorder.py demo
+records a short synthetic session through thermoState and replays it against each backend.
+"""
+#region imports
+import atexit
+import os
+import struct
+import threading
+import time
+import numpy as np
+#endregion
+
+#region class definitions
+_magic = b'STATEREC1\n'
+# time the call arrived (s since the epoch), the two properties, flags (bit 0: SI), the two values
+_record = struct.Struct('<d2sBdd')
+recordType = np.dtype([('time', '<f8'), ('props', 'S2'), ('flags', 'u1'), ('a', '<f8'), ('b', '<f8')])
+
+class requestRecorder:
+    def __init__(self, path, bufferSize=1 << 16):
+        '''
+        Appends requests to a log file.  Safe to share between threads.  Records are buffered and written
+        bufferSize bytes at a time, and when the recorder is flushed or closed (at exit at the latest); a record
+        cut short by a crash is dropped when the log is read.
+        :param path: the log; a new one is started if it does not exist, otherwise records are added to it
+        :param bufferSize: bytes buffered before writing
+        '''
+        self.path = path
+        self.lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, 'rb') as f:
+                if f.read(len(_magic)) != _magic:
+                    raise ValueError("{:} is not a state request log".format(path))
+        self.file = open(path, 'ab', buffering=bufferSize)
+        if new:
+            self.file.write(_magic)
+        self.count = 0
+        atexit.register(self.close)
+
+    def record(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True):
+        """
+        Log one request
+        :return: nothing
+        """
+        data = _record.pack(time.time(), (stProp1 + stProp2).lower().encode('ascii'), 1 if SI else 0,
+                            float(stPropVal1), float(stPropVal2))
+        with self.lock:
+            if self.file is not None:
+                self.file.write(data)
+                self.count += 1
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+#endregion
+
+#region function definitions
+def startRecording(path, metrics=None):
+    """
+    Record every solve made through a stateMetrics
+    :param path: the log file
+    :param metrics: the stateMetrics to record, StateMetrics.defaultMetrics (what thermoState uses) if None
+    :return: the requestRecorder
+    """
+    if metrics is None:
+        from StateMetrics import defaultMetrics as metrics
+    stopRecording(metrics)
+    metrics.recorder = requestRecorder(path)
+    return metrics.recorder
+
+def stopRecording(metrics=None):
+    """
+    Stop recording a stateMetrics and close its log
+    :return: nothing
+    """
+    if metrics is None:
+        from StateMetrics import defaultMetrics as metrics
+    recorder, metrics.recorder = metrics.recorder, None
+    if recorder is not None:
+        recorder.close()
+
+def readRecording(path):
+    """
+    :param path: a log written by requestRecorder
+    :return: numpy structured array of recordType, in the order the calls arrived
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_magic)) != _magic:
+            raise ValueError("{:} is not a state request log".format(path))
+        data = f.read()
+    n = len(data) // recordType.itemsize
+    return np.frombuffer(data[:n * recordType.itemsize], dtype=recordType)
+
+def writeRecording(path, records):
+    """
+    Write records as a new log, e.g. a synthetic one from WorkloadGenerator
+    :param path: the log file, replaced if it exists
+    :param records: numpy structured array of recordType
+    :return: nothing
+    """
+    with open(path, 'wb') as f:
+        f.write(_magic)
+        np.asarray(records, dtype=recordType).tofile(f)
+
+def makeEngine(backend=None, nearCritical=True, cache=False):
+    """
+    A solve function for one engine configuration
+    :param backend: PropertyBackend backend name, the process default if None
+    :param nearCritical: solve region 3 states with NearCritical
+    :param cache: answer through a StateCache.toleranceCache (True for the default one, or a toleranceCache)
+    :return: function(stProp1, stProp2, stPropVal1, stPropVal2, SI) returning a stateResult
+    """
+    from StateSolver import solveState
+
+    def solve(stProp1, stProp2, stPropVal1, stPropVal2, SI=True, budget=None):
+        return solveState(stProp1, stProp2, stPropVal1, stPropVal2, SI, budget, nearCritical, backend)
+    if not cache:
+        return solve
+    from StateCache import toleranceCache
+    store = toleranceCache() if cache is True else cache
+
+    def cached(stProp1, stProp2, stPropVal1, stPropVal2, SI=True):
+        hit = store.get(stProp1, stProp2, stPropVal1, stPropVal2, SI)
+        if hit is not None:
+            return hit
+        result = solve(stProp1, stProp2, stPropVal1, stPropVal2, SI)
+        store.put(stProp1, stProp2, stPropVal1, stPropVal2, result, SI)
+        return result
+    return cached
+
+def replay(records, solve=None, fast=False, speed=1.0, threads=1):
+    """
+    Play requests back.  At the original pace each request is issued when it arrived in the log (divided by
+    speed), so its latency is counted from then and includes any time it waited behind earlier ones; played
+    fast, the requests are issued back to back and latency is counted from the issue (with threads, that
+    includes the wait for a free thread).
+    :param records: from readRecording
+    :param solve: engine from makeEngine, the default configuration if None
+    :param fast: ignore the recorded times
+    :param speed: how many times faster than recorded to play at the original pace
+    :param threads: requests solved at once
+    :return: dict with wall seconds, count, errors, latencies (s, per record) and lateness (s the issue of each
+             request was behind its schedule)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    solve = makeEngine() if solve is None else solve
+    n = len(records)
+    latency = np.full(n, np.nan)
+    late = np.zeros(n)
+    failed = np.zeros(n, dtype=bool)
+    offsets = (records['time'] - records['time'][0]) / speed if n else np.zeros(0)
+    rows = [(r['props'].decode()[0], r['props'].decode()[1], float(r['a']), float(r['b']), bool(r['flags'] & 1))
+            for r in records]
+
+    def run(i, due):
+        try:
+            solve(*rows[i])
+        except Exception:
+            failed[i] = True
+        latency[i] = time.perf_counter() - due
+
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(threads) if threads > 1 else None
+    for i in range(n):
+        due = time.perf_counter() if fast else t0 + offsets[i]
+        if not fast:
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            late[i] = max(time.perf_counter() - due, 0.0)
+        if pool is None:
+            run(i, due)
+        else:
+            pool.submit(run, i, due)
+    if pool is not None:
+        pool.shutdown(wait=True)
+    return {'seconds': time.perf_counter() - t0, 'count': n, 'errors': int(failed.sum()), 'latency': latency,
+            'lateness': late, 'pairs': [r[0] + r[1] for r in rows]}
+
+def replayReport(result):
+    """
+    Throughput and latency percentiles of a replay, overall and per pair
+    :return: string
+    """
+    from StateMetrics import pairName
+    lines = []
+    n, seconds = result['count'], result['seconds']
+    lat = result['latency']
+    lines.append("{:} requests in {:0.3f} s, {:0.1f} requests/s, {:} failed, issued up to {:0.1f} ms behind "
+                 "schedule".format(n, seconds, n / seconds if seconds else float('nan'), result['errors'],
+                                   1e3 * float(np.max(result['lateness'], initial=0.0))))
+    q = (50, 90, 99, 99.9)
+    lines.append("{:8}{:>8}".format("pair", "count") + "".join("{:>10}".format("p{:g} ms".format(x)) for x in q) +
+                 "{:>10}".format("max ms"))
+
+    def row(name, values):
+        pct = np.percentile(values, q + (100,)) if len(values) else [float('nan')] * (len(q) + 1)
+        return "{:8}{:>8}".format(name, len(values)) + "".join("{:>10.3f}".format(1e3 * x) for x in pct)
+    lines.append(row("all", lat))
+    pairs = np.array([pairName(p[0], p[1]) for p in result['pairs']])
+    for pair in sorted(set(pairs), key=lambda p: ('ptvhusx'.find(p[0]), 'ptvhusx'.find(p[1]))):
+        lines.append(row(pair, lat[pairs == pair]))
+    return "\n".join(lines)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import tempfile
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Replay recorded state requests as a load test")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rp = sub.add_parser('replay', help="play a log back")
+    rp.add_argument('log')
+    rp.add_argument('--fast', action='store_true', help="as fast as possible rather than at the recorded pace")
+    rp.add_argument('--speed', type=float, default=1.0, help="times faster than recorded, at the recorded pace")
+    rp.add_argument('--threads', type=int, default=1)
+    rp.add_argument('--backend', default=None, help="property backend, the process default if not given")
+    rp.add_argument('--no-near-critical', action='store_true', help="leave region 3 to the regular solvers")
+    rp.add_argument('--cache', action='store_true', help="answer through a StateCache.toleranceCache")
+    sub.add_parser('demo', help="record a synthetic session and replay it against each backend")
+    args = parser.parse_args()
+    if args.command == 'replay':
+        records = readRecording(args.log)
+        engine = makeEngine(args.backend, not args.no_near_critical, args.cache)
+        print(replayReport(replay(records, engine, args.fast, args.speed, args.threads)))
+    else:
+        from ThermoStateCalc_app import thermoState
+        path = os.path.join(tempfile.mkdtemp(), 'demo.rec')
+        recorder = startRecording(path)
+        rng = np.random.default_rng(2)
+        state = thermoState()
+        t0 = time.perf_counter()
+        for i in range(400):
+            p = float(10 ** rng.uniform(-1, 2.2))
+            kind = rng.integers(4)
+            try:
+                if kind == 0:
+                    state.setState('p', 't', p, float(rng.uniform(20, 600)))
+                elif kind == 1:
+                    state.setState('p', 'x', p, float(rng.uniform(0, 1)))
+                elif kind == 2:
+                    state.setState('p', 'h', p, float(rng.uniform(200, 3500)))
+                else:
+                    state.setState('h', 's', float(rng.uniform(2800, 3400)), float(rng.uniform(6.5, 7.5)))
+            except Exception:
+                pass
+            time.sleep(float(rng.exponential(0.002)))
+        recorded = time.perf_counter() - t0
+        stopRecording()
+        records = readRecording(path)
+        print("recorded {:} requests over {:0.2f} s into {:} ({:} bytes, {:} per request)\n".format(
+            len(records), recorded, path, os.path.getsize(path), recordType.itemsize))
+        print("original pace, default engine:")
+        print(replayReport(replay(records)))
+        for backend in ('xsteam', 'kernel', 'tabulated'):
+            print("\nas fast as possible, {:} backend:".format(backend))
+            print(replayReport(replay(records, makeEngine(backend), fast=True)))
+#endregion
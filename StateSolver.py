@@ -0,0 +1,650 @@
+#region imports
+from collections import namedtuple
+from contextlib import contextmanager
+from scipy.optimize import fsolve, brentq
+from IF97 import propertiesPT, fromKelvin
+import math
+import threading
+import time
+from RegionClassifier import classifyRegion
+from NearCritical import solveNearCritical
+from PropertyBackend import getBackend
+from AccuracyTier import getAccuracy, tierBudget
+from StateValidator import stateDomainError, convergenceError, solveBudget, tableLimits, validateState
+#endregion
+
+#region class definitions
+# the complete result of a solve.  Being a tuple, it can be handed between threads without copying or locking.
+stateResult = namedtuple('stateResult', ['region', 'p', 't', 'v', 'u', 'h', 's', 'x'])
+
+class pairSolver:
+    def __init__(self, lead, other, strategy, tolerance=None):
+        '''
+        One of the 21 cases:  how a state is solved from a pair of properties, and how that has gone so far.
+        Built once when the module loads and shared by every call; only the statistics change, under a lock.
+        :param lead: the property whose value the strategy takes first
+        :param other: the other property of the pair
+        :param strategy: function(steamTable, a, b, info, budget) returning (region, p, t, x), a being the
+                         value of lead, b of other and info the RegionClassifier.regionInfo of the pair
+        :param tolerance: largest difference between a solved state's values of the pair and the specified
+                          ones (relative, absolute for x) before the state is rejected; None to only reject nan
+        '''
+        self.lead = lead
+        self.other = other
+        self.pair = lead + other
+        self.strategy = strategy
+        self.tolerance = tolerance
+        self.lock = threading.Lock()
+        self.overrides = threading.local()  # the strategy and tolerance override() set, per thread
+        self.resetStatistics()
+
+    def resetStatistics(self):
+        """
+        Forget the calls counted so far
+        :return: nothing
+        """
+        with self.lock:
+            self.calls = 0
+            self.seconds = 0.0
+            self.failures = {}
+            self.worstDifference = 0.0
+
+    def statistics(self):
+        """
+        :return: dict of calls, failures by exception type, seconds in total and the largest difference of a
+                 returned state from its specified pair
+        """
+        with self.lock:
+            return {'pair': self.pair, 'calls': self.calls, 'failures': dict(self.failures),
+                    'seconds': self.seconds, 'worstDifference': self.worstDifference}
+
+    def difference(self, result, a, b):
+        """
+        How far a state is from the specified values, relative to them (absolutely for x)
+        """
+        out = 0.0
+        for name, value in ((self.lead, a), (self.other, b)):
+            got = getattr(result, name)
+            out = max(out, abs(got - value) / (1.0 if name == 'x' else _residualScale(name, value)))
+        return out
+
+    def solve(self, st, SI, a, b, budget, nearCritical=True):
+        """
+        Solve the state with lead = a and other = b, counting the call
+        :return: a stateResult
+        """
+        t0 = time.perf_counter()
+        try:
+            result, difference = self._solve(st, SI, a, b, budget, nearCritical)
+        except Exception as e:
+            with self.lock:
+                self.calls += 1
+                self.seconds += time.perf_counter() - t0
+                self.failures[type(e).__name__] = self.failures.get(type(e).__name__, 0) + 1
+            raise
+        with self.lock:
+            self.calls += 1
+            self.seconds += time.perf_counter() - t0
+            self.worstDifference = max(self.worstDifference, difference)
+        return result
+
+    def _solve(self, st, SI, a, b, budget, nearCritical):
+        lead, other = self.lead, self.other
+        validateState(st, SI, lead, a, other, b)
+        # find the region first so the case goes straight to the right solver
+        info = classifyRegion(st, SI, lead, a, other, b)
+        result = solveNearCritical(st, SI, lead, a, other, b, info, budget.stage()) if nearCritical else None
+        if result is not None:
+            result = stateResult(*result)
+        else:
+            region, p, t, x = self._current()[0](st, a, b, info, budget)
+            result = completeState(st, region, p, t, x)
+        if any(math.isnan(y) for y in result[1:]):
+            raise convergenceError("No state found with {:} = {:} and {:} = {:}".format(lead, a, other, b))
+        difference = self.difference(result, a, b)
+        tolerance = self._current()[1]
+        if tolerance is not None and budget.rtol is not None:
+            # a looser tier stops its solvers further from the specified values
+            tolerance = max(tolerance, 10.0 * budget.rtol)
+        if tolerance is not None and not difference <= tolerance:
+            raise convergenceError("The state found with {:} = {:} and {:} = {:} is {:0.1e} from them".format(
+                lead, a, other, b, difference))
+        return result, difference
+
+    def _current(self):
+        """
+        :return: (strategy, tolerance) in force in the calling thread
+        """
+        return getattr(self.overrides, 'current', None) or (self.strategy, self.tolerance)
+
+    @contextmanager
+    def override(self, strategy=None, tolerance=False):
+        """
+        Swap in another strategy and/or tolerance for the duration of a with block, e.g. to benchmark an
+        alternative:  with getPairSolver('h', 's').override(myStrategy): ...
+        The override holds in the calling thread only; solves running in other threads at the same time (a
+        StateBatch thread pool, say) keep the registered strategy and tolerance.
+        :param strategy: the strategy to use instead, the current one if None
+        :param tolerance: the tolerance to use instead, the current one if False
+        :return: context manager yielding the pairSolver
+        """
+        saved = getattr(self.overrides, 'current', None)
+        current = self._current()
+        self.overrides.current = (current[0] if strategy is None else strategy,
+                                  current[1] if tolerance is False else tolerance)
+        try:
+            yield self
+        finally:
+            self.overrides.current = saved
+#endregion
+
+#region function definitions
+# the property backends keep no per-call state (the tabulated one builds its tables once, under a lock), so one
+# instance per kind and unit system is shared by every solve
+def getSteamTable(SI=True, backend=None):
+    """
+    Returns the shared steam table for a unit system.
+    :param SI: boolean True=SI units, False = English units
+    :param backend: name of a PropertyBackend backend, the process default if None
+    :return: an XSteam object
+    """
+    return getBackend(SI, backend)
+
+def _isSI(st):
+    """
+    :param st: one of the shared steam tables
+    :return: True if st works in SI units
+    """
+    return st.SI
+
+def clamp(x, low, high):
+    """
+    This clamps a float x between a high and low limit inclusive
+    :param x:
+    :param low:
+    :param high:
+    :return:
+    """
+    if x < low:
+        return low
+    if x > high:
+        return high
+    return x
+
+def completeState(steamTable, region, p, t, x=None):
+    """
+    Given p, t and the region (and x if two-phase), find the other properties.
+    :param steamTable: the XSteam object for the unit system in use
+    :param region: region string
+    :param p: pressure
+    :param t: temperature
+    :param x: quality, only used if two-phase
+    :return: a stateResult
+    """
+    if region == "two-phase":
+        # since two-phase, use quality to interpolate overall properties
+        uf, ug = steamTable.uL_p(p), steamTable.uV_p(p)
+        hf, hg = steamTable.hL_p(p), steamTable.hV_p(p)
+        sf, sg = steamTable.sL_p(p), steamTable.sV_p(p)
+        vf, vg = steamTable.vL_p(p), steamTable.vV_p(p)
+        return stateResult(region, p, t, vf + x * (vg - vf), uf + x * (ug - uf), hf + x * (hg - hf),
+                           sf + x * (sg - sf), x)
+    x = 1.0 if region == "super-heated vapor" else 0.0
+    return stateResult(region, p, t, steamTable.v_pt(p, t), steamTable.u_pt(p, t), steamTable.h_pt(p, t),
+                       steamTable.s_pt(p, t), x)
+
+#region single-phase helpers
+def _bracketedRoot(fn, lo, hi, what, budget):
+    """
+    Root of fn between lo and hi, where a single-phase property is monotonic.
+    :param what: description of the input for the error message
+    :param budget: the solveBudget charged for every evaluation of fn
+    :return: the root
+    """
+    fn = budget.wrap(fn)
+    if fn(lo) * fn(hi) > 0.0:
+        raise stateDomainError("{:} is outside the range of the steam tables".format(what))
+    return _brentq(fn, lo, hi, budget)
+
+def _brentq(fn, lo, hi, budget):
+    """
+    brentq to the budget's relative tolerance, or to brentq's own if it has none
+    """
+    if budget.rtol is None:
+        return brentq(fn, lo, hi)
+    rtol = max(budget.rtol, 4.0 * 2.220446049250313e-16)
+    return brentq(fn, lo, hi, xtol=rtol * min(abs(lo), abs(hi)) + 1e-300, rtol=rtol)
+
+def _valueOrSat(st, prop, p, t, bSat):
+    """
+    prop at (p, t), or its saturated value where XSteam puts (p, t) on the saturation line and returns nan.
+    """
+    b = getattr(st, prop + '_pt')(p, t)
+    return bSat if math.isnan(b) else b
+
+def _singlePhaseT(st, p, prop, b, info, budget):
+    """
+    Find T at pressure p where property prop has the value b, on the side of the saturation line the
+    classifier found.
+    :return: temperature
+    """
+    if prop == 'h':
+        return st.t_ph(p, b)
+    if prop == 's':
+        return st.t_ps(p, b)
+    # since I can't find properties using v or u, I will search between saturation and the table limit
+    pMin, pMax, tMin, tMax = tableLimits(st, _isSI(st))
+    liquid = info.region == "sub-cooled liquid"
+    tSat = info.sat[1]
+    if liquid and prop == 'v':
+        # v of water falls until 4 C and then rises, so search above the density maximum
+        tMin = fromKelvin(277.13, _isSI(st))
+    lo, hi = (tMin, tSat) if liquid else (tSat, tMax)
+    bSat = info.sat[2] if liquid else info.sat[3]
+    return _bracketedRoot(lambda T: b - _valueOrSat(st, prop, p, T, bSat), lo, hi,
+                          "{:} = {:} at p = {:}".format(prop, b, p), budget)
+
+def _singlePhaseP(st, t, prop, b, info, budget):
+    """
+    Find p at temperature t where property prop has the value b, on the side of the saturation line the
+    classifier found.
+    :return: pressure
+    """
+    pMin, pMax, tMin, tMax = tableLimits(st, _isSI(st))
+    liquid = info.region == "sub-cooled liquid"
+    pSat = info.sat[0]
+    if info.sat[1] is None:  # above the critical temperature
+        lo, hi = pMin, pMax
+    else:
+        lo, hi = (pSat, pMax) if liquid else (pMin, pSat)
+    bSat = info.sat[2] if liquid else info.sat[3]
+    return _bracketedRoot(lambda P: b - _valueOrSat(st, prop, P, t, bSat), lo, hi,
+                          "{:} = {:} at t = {:}".format(prop, b, t), budget)
+#endregion
+
+#region pressure cases
+def _solvePY(st, p, prop, b, info, budget):
+    """
+    p and one of v, u, h or s.  The classifier has already compared b with its saturated values.
+    :return: (region, p, t, x)
+    """
+    pSat, tSat, bf, bg = info.sat
+    if info.region == "two-phase":
+        return "two-phase", p, tSat, (b - bf) / (bg - bf)
+    return info.region, p, _singlePhaseT(st, p, prop, b, info, budget), None
+
+def _solvePT(st, p, t, info, budget):
+    # case 1:  pt or tp.  two-phase is ambiguous since at saturated temperature, so I assume x=0.5
+    return info.region, p, t, 0.5 if info.region == "two-phase" else None
+
+def _solvePV(st, p, v, info, budget):
+    # case 2: pv or vp
+    return _solvePY(st, p, 'v', v, info, budget)
+
+def _solvePU(st, p, u, info, budget):
+    # case 3 pu or up
+    return _solvePY(st, p, 'u', u, info, budget)
+
+def _solvePH(st, p, h, info, budget):
+    # case 4 ph or hp
+    return _solvePY(st, p, 'h', h, info, budget)
+
+def _solvePS(st, p, s, info, budget):
+    # case 5 ps or sp
+    return _solvePY(st, p, 's', s, info, budget)
+
+def _solvePX(st, p, x, info, budget):
+    # case 6 px or xp
+    return "two-phase", p, info.sat[1], x
+#endregion
+
+#region temperature cases
+def _solveTY(st, t, prop, b, info, budget):
+    """
+    t and one of v, u, h or s.  The classifier has already compared b with its saturated values.
+    :return: (region, p, t, x)
+    """
+    pSat, tSat, bf, bg = info.sat
+    if info.region == "two-phase":
+        return "two-phase", pSat, t, (b - bf) / (bg - bf)
+    return info.region, _singlePhaseP(st, t, prop, b, info, budget), t, None
+
+def _solveTV(st, t, v, info, budget):
+    # case 7:  tv or vt
+    return _solveTY(st, t, 'v', v, info, budget)
+
+def _solveTU(st, t, u, info, budget):
+    # case 8:  tu or ut
+    return _solveTY(st, t, 'u', u, info, budget)
+
+def _solveTH(st, t, h, info, budget):
+    # case 9:  th or ht
+    return _solveTY(st, t, 'h', h, info, budget)
+
+def _solveTS(st, t, s, info, budget):
+    # case 10:  ts or st
+    return _solveTY(st, t, 's', s, info, budget)
+
+def _solveTX(st, t, x, info, budget):
+    # case 11:  tx or xt
+    return "two-phase", info.sat[0], t, x
+#endregion
+
+#region two-property cases without p or t
+def _twoPhaseResidual(p, a, aL, aV, b, bL, bV):
+    """
+    Residual of matching property b once property a fixes the quality at pressure p.
+    :return: (residual, x)
+    """
+    af, ag = aL(p), aV(p)
+    bf, bg = bL(p), bV(p)
+    x = (a - af) / (ag - af)
+    return b - (bf + x * (bg - bf)), x
+
+def _fdJacobian(fn, X, f0, step=1e-6):
+    """
+    Forward difference Jacobian, reusing the residual already computed at X.
+    :param fn: residual function
+    :param X: point [p, t]
+    :param f0: fn(X)
+    :return: 2x2 list of partial derivatives
+    """
+    J = [[0.0, 0.0], [0.0, 0.0]]
+    for j in range(2):
+        Xj = list(X)
+        dx = step * max(abs(Xj[j]), 1.0)
+        Xj[j] += dx
+        fj = fn(Xj)
+        for i in range(2):
+            J[i][j] = (fj[i] - f0[i]) / dx
+    return J
+
+def _solveTwoPhasePair(st, aName, a, bName, b, bracket, budget):
+    """
+    Find the saturation pressure inside the classifier's bracket where both properties give the same quality.
+    :return: (region, p, t, x)
+    """
+    aL, aV = getattr(st, aName + 'L_p'), getattr(st, aName + 'V_p')
+    bL, bV = getattr(st, bName + 'L_p'), getattr(st, bName + 'V_p')
+    p = _brentq(budget.wrap(lambda P: _twoPhaseResidual(P, a, aL, aV, b, bL, bV)[0]), *bracket, budget)
+    af, ag = aL(p), aV(p)
+    return "two-phase", p, st.tsat_p(p), (a - af) / (ag - af)
+
+def _solvePairPT(st, aName, a, bName, b, guess, budget):
+    """
+    Find p and t for a single-phase state given two properties neither of which is p or t.
+    In regions 1 and 2 the residual and the Jacobian come from one IF97 evaluation at (p, t), so fsolve
+    never has to estimate the Jacobian by finite differences there.
+    :param aName: first property, one of 'v','u','h','s'
+    :param a: value of property aName
+    :param bName: the second property
+    :param b: value of property bName
+    :param guess: initial [p, t]
+    :param budget: the solveBudget charged for every new point evaluated
+    :return: (region, p, t, x)
+    """
+    SI = _isSI(st)
+    aPT, bPT = getattr(st, aName + '_pt'), getattr(st, bName + '_pt')
+    last = {}  # the most recent evaluation, shared by fn and jac since fsolve asks for both at the same point
+    pMin, pMax, tMin, tMax = tableLimits(st, SI)
+    lnpMin, lnpMax = math.log(pMin), math.log(pMax)
+    # residuals relative to the specified values, so v (~0.001) counts as much as h (~1000)
+    sA, sB = _residualScale(aName, a), _residualScale(bName, b)
+
+    def evaluate(X):
+        p, t = math.exp(clamp(float(X[0]), lnpMin, lnpMax)), float(X[1])
+        if last.get('PT') != (p, t):
+            budget.charge()
+            last['PT'] = (p, t)
+            last['props'] = propertiesPT(p, t, SI)
+            if last['props'] is not None:
+                values = last['props'][0]
+                last['f'] = [(a - values[aName]) / sA, (b - values[bName]) / sB]
+            else:
+                last['f'] = [(a - aPT(p, t)) / sA, (b - bPT(p, t)) / sB]
+        return last
+
+    def fn(X):
+        return evaluate(X)['f']
+
+    def jac(X):
+        ev = evaluate(X)
+        if ev['props'] is not None:
+            values, dp, dT = ev['props']
+            p = ev['PT'][0]
+            return [[-dp[aName] * p / sA, -dT[aName] / sA], [-dp[bName] * p / sB, -dT[bName] / sB]]
+        return _fdJacobian(fn, [float(X[0]), float(X[1])], ev['f'])
+
+    # iterate on ln(p), since p spans decades and vapor properties go with ln(p) more than with p.  fsolve stops
+    # within what is left of the budget (its own limit is 300), so an ill-conditioned pair that fsolve cannot
+    # close is judged on its residual below rather than given up on by the budget
+    maxfev = max(1, min(300, budget.maxEvaluations - budget.evaluations - 2))
+    X, infodict, ier, msg = fsolve(fn, [math.log(guess[0]), guess[1]], fprime=jac, full_output=True,
+                                   xtol=budget.tolerance(1.49012e-08), maxfev=maxfev)
+    lnp, t = float(X[0]), float(X[1])
+    if ier != 1 and not _matches(fn(X), max(1e-6, budget.tolerance(1e-6))):
+        raise convergenceError("No state found with {:} = {:} and {:} = {:} ({:})".format(
+            aName, a, bName, b, " ".join(msg.split())))
+    p = math.exp(clamp(lnp, lnpMin, lnpMax))
+    liquid = t < (st.tsat_p(p) if p < st.criticalPressure() else st.criticalTemperatur())
+    return ("sub-cooled liquid" if liquid else "super-heated vapor"), p, t, None
+
+def _residualScale(name, value):
+    """
+    :return: the size a residual of property name is measured against
+    """
+    return abs(value) if name == 'v' else max(abs(value), 1.0)
+
+def _matches(f, rtol=1e-6):
+    """
+    :param f: scaled residuals of the two properties
+    :return: True if both residuals are small
+    """
+    return abs(f[0]) <= rtol and abs(f[1]) <= rtol
+
+def _solvePair(st, aName, a, bName, b, info, budget):
+    """
+    Dispatch a pair without p or t to the two-phase or the single-phase solver the classifier picked.
+    :return: (region, p, t, x)
+    """
+    if info.region == "two-phase":
+        return _solveTwoPhasePair(st, aName, a, bName, b, info.bracket, budget)
+    return _solvePairPT(st, aName, a, bName, b, info.seed, budget)
+
+def _solveVH(st, v, h, info, budget):
+    # case 12:  vh or hv
+    return _solvePair(st, 'h', h, 'v', v, info, budget)
+
+def _solveVU(st, v, u, info, budget):
+    # case 13:  vu or uv
+    return _solvePair(st, 'u', u, 'v', v, info, budget)
+
+def _solveVS(st, v, s, info, budget):
+    # case 14:  vs or sv
+    return _solvePair(st, 's', s, 'v', v, info, budget)
+
+def _solveSatX(st, x, prop, a, info, budget):
+    """
+    Find the saturation pressure, inside the classifier's bracket, where a saturated mixture of quality x
+    has property a.
+    :return: (region, p, t, x)
+    """
+    x = clamp(x, 0.0, 1.0)
+    aL, aV = getattr(st, prop + 'L_p'), getattr(st, prop + 'V_p')
+    p = _brentq(budget.wrap(lambda P: a - (aL(P) + x * (aV(P) - aL(P)))), *info.bracket, budget)
+    return "two-phase", p, st.tsat_p(p), x
+
+def _solveVX(st, v, x, info, budget):
+    # case 15:  vx or xv
+    return _solveSatX(st, x, 'v', v, info, budget)
+
+def _solveHU(st, h, u, info, budget):
+    # case 16:  hu or uh
+    return _solvePair(st, 'u', u, 'h', h, info, budget)
+
+def _solveHS(st, h, s, info, budget):
+    # case 17:  hs or sh
+    return _solvePair(st, 's', s, 'h', h, info, budget)
+
+def _solveHX(st, h, x, info, budget):
+    # case 18:  hx or xh
+    return _solveSatX(st, x, 'h', h, info, budget)
+
+def _solveUS(st, u, s, info, budget):
+    # case 19:  us or su
+    return _solvePair(st, 's', s, 'u', u, info, budget)
+
+def _solveUX(st, u, x, info, budget):
+    # case 20:  ux or xu
+    return _solveSatX(st, x, 'u', u, info, budget)
+
+def _solveSX(st, s, x, info, budget):
+    # case 21:  sx or xs
+    return _solveSatX(st, x, 's', s, info, budget)
+#endregion
+
+# the 21 cases, registered under both orders of their pair so dispatch is one dict lookup
+_pairSolvers = {}
+
+def registerPair(lead, other, strategy, tolerance=None):
+    """
+    Make the solver of a pair, replacing any earlier one
+    :param lead: the property whose value strategy takes first
+    :param other: the other property
+    :param strategy: function(steamTable, a, b, info, budget) returning (region, p, t, x)
+    :param tolerance: see pairSolver
+    :return: the pairSolver
+    """
+    solver = pairSolver(lead, other, strategy, tolerance)
+    _pairSolvers[lead + other] = _pairSolvers[other + lead] = solver
+    return solver
+
+def getPairSolver(stProp1, stProp2):
+    """
+    :return: the pairSolver of a pair of properties, in either order
+    """
+    solver = _pairSolvers.get(stProp1.lower() + stProp2.lower())
+    if solver is None:
+        raise ValueError("Invalid property combination: {:}".format([stProp1.lower(), stProp2.lower()]))
+    return solver
+
+def pairSolvers():
+    """
+    :return: the 21 pairSolvers in the order of the cases
+    """
+    return list({id(s): s for s in _pairSolvers.values()}.values())
+
+# tolerances:  p-h and p-s go through the steam tables' backward equations (about 1e-3 off in region 3),
+# the rest are solved to _matches' 1e-6 or are exact
+_backward = 5e-3
+_iterative = 1e-5
+for _lead, _other, _strategy, _tolerance in (
+        ('p', 't', _solvePT, _backward), ('p', 'v', _solvePV, _iterative), ('p', 'u', _solvePU, _iterative),
+        ('p', 'h', _solvePH, _backward), ('p', 's', _solvePS, _backward), ('p', 'x', _solvePX, _backward),
+        ('t', 'v', _solveTV, _iterative), ('t', 'u', _solveTU, _iterative), ('t', 'h', _solveTH, _iterative),
+        ('t', 's', _solveTS, _iterative), ('t', 'x', _solveTX, _backward),
+        ('v', 'h', _solveVH, _iterative), ('v', 'u', _solveVU, _iterative), ('v', 's', _solveVS, _iterative),
+        ('v', 'x', _solveVX, _iterative),
+        ('h', 'u', _solveHU, _iterative), ('h', 's', _solveHS, _iterative), ('h', 'x', _solveHX, _iterative),
+        ('u', 's', _solveUS, _iterative), ('u', 'x', _solveUX, _iterative),
+        ('s', 'x', _solveSX, _iterative)):
+    registerPair(_lead, _other, _strategy, _tolerance)
+
+def solveState(stProp1, stProp2, stPropVal1, stPropVal2, SI=True, budget=None, nearCritical=True, backend=None,
+               accuracy=None):
+    """
+    Calculates the thermodynamic state variables based on specified values.  Nothing shared is modified but
+    the pair's statistics (under a lock), so any number of threads can call this at once.
+    I have thermodynamic variables:  P, T, v, h, u, s and x (7 things) from which I am choosing two.
+    Possible number of permutations:  7!/5! =42.
+    But, order of the two things does not matter, so 42/2=21
+    PT, Pv, Ph, Pu, Ps, Px (6)
+    Tv, Th, Tu, Ts, Tx (5)
+    vh, vu, vs, vx (4)
+    hu, hs, hx (3)
+    us, ux (2)
+    sx (1)
+    Total of 21 cases to deal with, each a pairSolver registered in the order shown above
+    :param stProp1: first specified property ('p','t','v','u','h','s' or 'x')
+    :param stProp2: second specified property
+    :param stPropVal1: value of the first property
+    :param stPropVal2: value of the second property
+    :param SI: boolean True=SI units, False = English units
+    :param budget: solveBudget limiting the evaluations and time spent, the tier's or a default one if None
+    :param nearCritical: solve states in IF97 region 3 with NearCritical.solveNearCritical
+    :param backend: name of the PropertyBackend backend to use, the tier's or the process default if None
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a stateResult
+    :raises stateDomainError: values outside the steam tables or a pair no state can have
+    :raises solveBudgetError: the solve ran past its budget
+    :raises convergenceError: the solver stopped without matching the specified values
+    """
+    tier = getAccuracy(accuracy)
+    if tier is not None:
+        backend = tier.backend if backend is None else backend
+        budget = tierBudget(tier) if budget is None else budget
+    st = getSteamTable(SI, backend)
+    budget = solveBudget() if budget is None else budget
+    budget.start()
+    # select the proper case from the 21.  Note that PT is the same as TP etc.
+    solver = getPairSolver(stProp1, stProp2)
+    f1 = float(stPropVal1)
+    f2 = float(stPropVal2)
+    a, b = (f1, f2) if stProp1.lower() == solver.lead else (f2, f1)
+    return solver.solve(st, SI, a, b, budget, nearCritical)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import logging
+    import timeit
+    from WorkloadGenerator import makeWorkload
+    logging.disable(logging.CRITICAL)
+    # cost of finding the case, against the chain of tests it replaced
+    chain = {'p': 'tvuhsx', 't': 'vuhsx', 'v': 'huxs', 'h': 'usx', 'u': 'sx', 's': 'x'}
+
+    def chained(p1, p2):
+        SP = [p1, p2]
+        for lead, others in chain.items():
+            if lead in SP:
+                other = SP[1] if SP[0] == lead else SP[0]
+                if other in others:
+                    return lead + other
+    n = 200000
+    print("dispatch:  registry {:0.3f} us, if/elif chain {:0.3f} us".format(
+        1e6 * timeit.timeit(lambda: getPairSolver('x', 's'), number=n) / n,
+        1e6 * timeit.timeit(lambda: chained('x', 's'), number=n) / n))
+    work = makeWorkload(100, seed=4)
+    for pair, idx, A, B in work.byPair():
+        for a, b in zip(A, B):
+            try:
+                solveState(pair[0], pair[1], a, b)
+            except Exception:
+                pass
+    print("\n{:6}{:>7}{:>10}{:>12}  failures".format("pair", "calls", "ms/call", "worst diff"))
+    for solver in pairSolvers():
+        s = solver.statistics()
+        if s['calls']:
+            print("{:6}{:>7}{:>10.3f}{:>12.1e}  {:}".format(s['pair'], s['calls'], 1e3 * s['seconds'] / s['calls'],
+                                                        s['worstDifference'], s['failures'] or ''))
+    # an alternative strategy for one pair, benchmarked without touching the others:  h-s straight from the
+    # steam tables' backward equations rather than iterated on
+    hs = getPairSolver('h', 's')
+
+    def backward(st, h, s, info, budget):
+        p = st.p_hs(h, s)
+        return info.region, p, st.t_ph(p, h), st.x_ph(p, h)
+    for name, strategy in (("regular", None), ("backward", backward)):
+        hs.resetStatistics()
+        with hs.override(strategy):
+            for pair, idx, A, B in work.byPair():
+                if pair in ('hs', 'sh'):
+                    for a, b in zip(A, B):
+                        try:
+                            solveState(pair[0], pair[1], a, b)
+                        except Exception:
+                            pass
+        s = hs.statistics()
+        print("h-s {:12} {:} calls, {:0.3f} ms/call, worst difference {:0.1e}, failures {:}".format(
+            name, s['calls'], 1e3 * s['seconds'] / max(s['calls'], 1), s['worstDifference'], s['failures']))
+#endregion
@@ -0,0 +1,176 @@
+"""
+A headless filter for pipelines:  reads state requests as JSON lines on stdin and writes one result line per
+request to stdout, in the same order.
+    {"pair": "pt", "values": [10, 200], "units": "SI", "id": 7}
+    {"id": 7, "region": "super-heated vapor", "p": 10.0, "t": 200.0, "v": 0.206, ...}
+pair is two of p, t, v, u, h, s and x ("pt" or ["p", "t"]), units "SI" (the default) or "EN", and id, if given,
+is copied to the result.  A line that is not a request, or a state that cannot be found, gives
+    {"id": 7, "line": 12, "error": "..."}
+and the stream goes on.  Requests are read into a bounded queue (a producer writing faster than the states are
+solved is held up rather than buffered without end) and solved in batches with the array solvers, a batch going
+out when it is full or when its first request has waited the deadline, so a slow trickle of requests is still
+answered promptly.
+    python StateStream.py [--batch 2048] [--deadline 0.05] [--queue 4096] < requests.jsonl > states.jsonl
+"""
+#region imports
+import json
+import math
+import queue
+import sys
+import threading
+import time
+import numpy as np
+from StateSolver import solveState
+from Uncertainty import solveSamples
+#endregion
+
+#region function definitions
+_properties = 'ptvuhsx'
+
+def parseRequest(line):
+    """
+    :param line: one JSON line
+    :return: (stProp1, stProp2, stPropVal1, stPropVal2, SI, id)
+    :raises ValueError: the line is not a request
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError("not JSON: {:}".format(e))
+    if not isinstance(request, dict):
+        raise ValueError("expected an object, got {:}".format(type(request).__name__))
+    pair = request.get('pair')
+    if isinstance(pair, str):
+        pair = list(pair)
+    if not isinstance(pair, list) or len(pair) != 2 or not all(isinstance(k, str) and k.lower() in _properties
+                                                                for k in pair) or pair[0].lower() == pair[1].lower():
+        raise ValueError("pair must be two different properties of {:}, got {:}".format(_properties, pair))
+    values = request.get('values')
+    if not isinstance(values, list) or len(values) != 2 or \
+            not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        raise ValueError("values must be two numbers, got {:}".format(values))
+    units = request.get('units', 'SI')
+    if units not in ('SI', 'EN'):
+        raise ValueError("units must be SI or EN, got {:}".format(units))
+    return pair[0].lower(), pair[1].lower(), float(values[0]), float(values[1]), units == 'SI', request.get('id')
+
+def solveRequests(requests, minArray=64):
+    """
+    Solve parsed requests, grouped by pair and units so each group is one call of Uncertainty.solveSamples
+    :param requests: list of (stProp1, stProp2, stPropVal1, stPropVal2, SI, id)
+    :param minArray: smallest group worth the array solvers' set-up; smaller ones go to solveState one by one
+    :return: list of result dicts, in the order of requests
+    """
+    groups = {}
+    for i, (p1, p2, a, b, SI, rid) in enumerate(requests):
+        groups.setdefault((p1, p2, SI), []).append(i)
+    out = [None] * len(requests)
+    for (p1, p2, SI), idx in groups.items():
+        if len(idx) < minArray:
+            for i in idx:
+                try:
+                    out[i] = solveState(*requests[i][:5])._asdict()
+                except Exception as e:
+                    out[i] = {'error': str(e)}
+            continue
+        a = np.array([requests[i][2] for i in idx])
+        b = np.array([requests[i][3] for i in idx])
+        try:
+            cols = solveSamples(p1, p2, a, b, SI)
+        except Exception as e:
+            for i in idx:
+                out[i] = {'error': str(e)}
+            continue
+        for j, i in enumerate(idx):
+            if j in cols.errors or math.isnan(cols.p[j]):
+                out[i] = {'error': cols.errors.get(j, "no state found")}
+            else:
+                out[i] = {k: float(v) if k != 'region' else v for k, v in cols.row(j).items()}
+    return out
+
+def _reader(lines, requests):
+    """
+    Feed lines into the queue, blocking while it is full, then None at the end
+    """
+    for number, line in enumerate(lines, 1):
+        requests.put((number, line))
+    requests.put(None)
+
+def streamStates(lines, out, batch=2048, deadline=0.05, queueSize=4096):
+    """
+    Answer JSON-line requests until the input ends
+    :param lines: iterable of lines, e.g. sys.stdin
+    :param out: file the result lines are written to and flushed after each batch
+    :param batch: most requests solved together
+    :param deadline: most seconds a request waits for its batch to fill
+    :param queueSize: most lines read ahead of the solver
+    :return: dict with the counts of requests, errors and batches
+    """
+    requests = queue.Queue(maxsize=queueSize)
+    threading.Thread(target=_reader, args=(lines, requests), daemon=True).start()
+    counts = {'requests': 0, 'errors': 0, 'batches': 0}
+    pending = []
+    due = None
+
+    def flush():
+        parsed, results = [], []
+        for number, line in pending:
+            try:
+                parsed.append((number, parseRequest(line)))
+            except ValueError as e:
+                results.append((number, None, {'error': str(e)}))
+        solved = solveRequests([r for number, r in parsed])
+        results += [(number, r[5], result) for (number, r), result in zip(parsed, solved)]
+        for number, rid, result in sorted(results, key=lambda r: r[0]):
+            line = {} if rid is None else {'id': rid}
+            if 'error' in result:
+                line['line'] = number
+                counts['errors'] += 1
+            line.update(result)
+            out.write(json.dumps(line) + "\n")
+        out.flush()
+        counts['requests'] += len(pending)
+        counts['batches'] += 1
+        pending.clear()
+
+    while True:
+        try:
+            item = requests.get(timeout=None if due is None else max(due - time.perf_counter(), 0.0))
+        except queue.Empty:
+            flush()
+            due = None
+            continue
+        if item is None:
+            break
+        if not item[1].strip():
+            continue
+        pending.append(item)
+        if due is None:
+            due = time.perf_counter() + deadline
+        if len(pending) >= batch:
+            flush()
+            due = None
+    if pending:
+        flush()
+    return counts
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Solve JSON-line state requests from stdin to stdout")
+    parser.add_argument('--batch', type=int, default=2048, help="most requests solved together")
+    parser.add_argument('--deadline', type=float, default=0.05, help="most seconds a request waits for a batch")
+    parser.add_argument('--queue', type=int, default=4096, help="most lines read ahead")
+    parser.add_argument('--summary', action='store_true', help="write the counts and the rate to stderr")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    counts = streamStates(sys.stdin, sys.stdout, args.batch, args.deadline, args.queue)
+    if args.summary:
+        dt = time.perf_counter() - t0
+        sys.stderr.write("{:} requests in {:0.2f} s ({:0.0f}/s), {:} errors, {:} batches\n".format(
+            counts['requests'], dt, counts['requests'] / dt if dt else float('nan'), counts['errors'],
+            counts['batches']))
+#endregion
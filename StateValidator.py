@@ -0,0 +1,208 @@
+#region imports
+import math
+import time
+from functools import lru_cache
+from IF97 import fromMPa, fromKelvin
+#endregion
+
+#region class definitions
+class stateDomainError(ValueError):
+    '''
+    The specified values lie outside the range of the steam tables, or no state can have both of them.
+    '''
+    pass
+
+class solveBudgetError(RuntimeError):
+    '''
+    A solve used more property evaluations or more time than it was allowed.
+    '''
+    pass
+
+class convergenceError(RuntimeError):
+    '''
+    A solver stopped without reaching a state that matches the specified values.
+    '''
+    pass
+
+class solveBudget:
+    def __init__(self, maxEvaluations=500, maxSeconds=1.0, rtol=None):
+        '''
+        The evaluation and time allowance of one solveState call.  Every residual the solvers evaluate is
+        charged against it, so a solve that wanders raises a solveBudgetError instead of spinning.
+        One budget belongs to one solve at a time; it is not shared between threads.
+        :param maxEvaluations: most residual evaluations allowed
+        :param maxSeconds: most wall clock seconds allowed
+        :param rtol: relative tolerance the solvers stop at, None for each solver's own (see AccuracyTier)
+        '''
+        self.maxEvaluations = maxEvaluations
+        self.maxSeconds = maxSeconds
+        self.rtol = rtol
+        self.start()
+
+    def tolerance(self, default):
+        """
+        :param default: a solver's own relative tolerance
+        :return: the relative tolerance the solver is to stop at
+        """
+        return default if self.rtol is None else self.rtol
+
+    def start(self):
+        """
+        Reset the count and the clock at the start of a solve
+        :return: nothing
+        """
+        self.evaluations = 0
+        self.stages = []
+        self.t0 = time.perf_counter()
+
+    def stage(self):
+        """
+        A budget for a stage of the solve that may give up and leave the state to the solvers after it (the
+        near-critical solvers do), charged against an allowance of its own:  as many evaluations as this one,
+        on this one's clock, so what the stage spends does not come out of what the later solvers are allowed
+        :return: a solveBudget
+        """
+        part = solveBudget(self.maxEvaluations, self.maxSeconds, self.rtol)
+        part.t0 = self.t0
+        self.stages.append(part)
+        return part
+
+    def spent(self):
+        """
+        :return: evaluations charged to this budget and its stages together
+        """
+        return self.evaluations + sum(part.spent() for part in self.stages)
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def charge(self):
+        """
+        Count one residual evaluation, raising solveBudgetError once the allowance is used up
+        :return: nothing
+        """
+        self.evaluations += 1
+        if self.evaluations > self.maxEvaluations:
+            raise solveBudgetError("Gave up after {:} property evaluations".format(self.maxEvaluations))
+        if self.elapsed() > self.maxSeconds:
+            raise solveBudgetError("Gave up after {:0.3f} s and {:} property evaluations".format(
+                self.elapsed(), self.evaluations))
+
+    def wrap(self, fn):
+        """
+        :param fn: a residual function
+        :return: fn, charging this budget on every call
+        """
+        def charged(*args):
+            self.charge()
+            return fn(*args)
+        return charged
+#endregion
+
+#region function definitions
+#region range of the steam tables
+def tableLimits(st, SI):
+    """
+    The pressure and temperature range of IF97 regions 1-3 in the steam table's units.  Region 5 (above 800 C)
+    is not used by the solvers.
+    :param st: the XSteam object for the unit system in use
+    :param SI: boolean True=SI units, False = English units
+    :return: (pMin, pMax, tMin, tMax)
+    """
+    # XSteam rejects the triple point pressure itself
+    return st.triplePointPressure() * 1.0001, fromMPa(100.0, SI), fromKelvin(273.16, SI), fromKelvin(1073.15, SI)
+
+def _envelope(values, margin=0.01):
+    """
+    Range spanned by the finite values, widened by a fraction of its width.
+    :return: (low, high)
+    """
+    values = [y for y in values if not math.isnan(y)]
+    low, high = min(values), max(values)
+    pad = margin * (high - low)
+    return low - pad, high + pad
+
+@lru_cache(maxsize=None)
+def _propertyBounds(st, SI):
+    """
+    Range of each of v, u, h and s over the whole table, from its corners and the density maximum of water.
+    :return: {prop: (low, high)}
+    """
+    pMin, pMax, tMin, tMax = tableLimits(st, SI)
+    t4 = fromKelvin(277.13, SI)
+    corners = [(pMin, tMin), (pMin, tMax), (pMax, tMin), (pMax, t4), (pMax, tMax)]
+    # XSteam places (pMin, tMin) on the saturation line, so the saturated liquid there stands in for it
+    return {prop: _envelope([getattr(st, prop + '_pt')(p, t) for p, t in corners] +
+                            [getattr(st, prop + 'L_p')(pMin)]) for prop in 'vuhs'}
+
+def _boundsAtP(st, SI, p, prop):
+    """
+    Range of prop along the isobar p.  v, u, h and s all rise with t along an isobar, apart from v in water
+    below 4 C, so the ends of the isobar (and the density maximum) bound it.
+    :return: (low, high)
+    """
+    pMin, pMax, tMin, tMax = tableLimits(st, SI)
+    bPT = getattr(st, prop + '_pt')
+    values = [bPT(p, t) for t in (tMin, fromKelvin(277.13, SI), tMax)]
+    if p < st.criticalPressure():
+        values += [getattr(st, prop + 'L_p')(p), getattr(st, prop + 'V_p')(p)]
+    return _envelope(values)
+
+def _boundsAtT(st, SI, t, prop):
+    """
+    Range of prop along the isotherm t, from the ends of the isotherm and the saturated states on it.
+    :return: (low, high)
+    """
+    pMin, pMax, tMin, tMax = tableLimits(st, SI)
+    bPT = getattr(st, prop + '_pt')
+    values = [bPT(pMin, t), bPT(pMax, t)]
+    if t < st.criticalTemperatur():
+        pSat = st.psat_t(t)
+        values += [getattr(st, prop + 'L_p')(pSat), getattr(st, prop + 'V_p')(pSat)]
+    return _envelope(values)
+#endregion
+
+def _checkRange(name, value, low, high, units='', where=''):
+    if not (low <= value <= high):
+        raise stateDomainError("{:} = {:}{:} is outside the steam tables ({:0.6g} to {:0.6g}{:})".format(
+            name, value, where, low, high, units))
+
+def validateState(st, SI, lead, a, other, b):
+    """
+    Check a specified pair before any solver runs: each value must lie inside the steam tables and the
+    second must be reachable given the first (along the isobar or isotherm when p or t is specified).
+    Values that fail raise stateDomainError straight away instead of sending a solver looking for a state
+    that does not exist.
+    :param st: the XSteam object for the unit system in use
+    :param SI: boolean True=SI units, False = English units
+    :param lead: the property that leads the case ('p','t','v','h','u' or 's')
+    :param a: value of lead
+    :param other: the other property
+    :param b: value of other
+    :return: nothing
+    """
+    values = {lead: a, other: b}
+    for name, value in values.items():
+        if math.isnan(value) or math.isinf(value):
+            raise stateDomainError("{:} must be a finite number, got {:}".format(name, value))
+    pMin, pMax, tMin, tMax = tableLimits(st, SI)
+    if 'x' in values:
+        _checkRange('x', values['x'], 0.0, 1.0)
+    if 'p' in values:
+        _checkRange('p', values['p'], pMin, pMax, ' bar' if SI else ' psi')
+    if 't' in values:
+        _checkRange('t', values['t'], tMin, tMax, ' C' if SI else ' F')
+    bounds = _propertyBounds(st, SI)
+    for name in 'vuhs':
+        if name in values:
+            _checkRange(name, values[name], *bounds[name])
+    # feasibility of the second property given the first
+    if lead == 'p' and other in 'vuhs':
+        _checkRange(other, b, *_boundsAtP(st, SI, a, other), where=' at p = {:}'.format(a))
+    elif lead == 't' and other in 'vuhs':
+        _checkRange(other, b, *_boundsAtT(st, SI, a, other), where=' at t = {:}'.format(a))
+    elif lead == 't' and other == 'x' and a >= st.criticalTemperatur():
+        raise stateDomainError("No two-phase state exists above the critical temperature")
+    elif lead == 'p' and other == 'x' and a >= st.criticalPressure():
+        raise stateDomainError("No two-phase state exists above the critical pressure")
+#endregion
@@ -2,9 +2,11 @@
 import sys
 from ThermoStateCalc import Ui__frm_StateCalculator
 from pyXSteam.XSteam import XSteam
-from PyQt5.QtWidgets import QWidget, QApplication
+from PyQt5.QtWidgets import QWidget, QApplication, QTabWidget, QVBoxLayout
 from UnitConversion import UC
-from scipy.optimize import fsolve
+from StateSolver import getSteamTable
+from StateMetrics import defaultMetrics
+from BatchTab import batchTab
 #endregion
 
 #region class definitions
@@ -64,7 +66,7 @@ class thermoState:
         :param s:
         :param x:
         """
-        self.steamTable = XSteam(XSteam.UNIT_SYSTEM_MKS)
+        self.steamTable = getSteamTable()
         self.region = "saturated"
         self.p=p
         self.t=t
@@ -92,454 +94,22 @@ class thermoState:
             self.v = self.steamTable.v_pt(self.p, self.t)
             self.x = 1.0 if self.region == "super-heated vapor" else 0.0
 
-    def setState(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True):
+    def setState(self, stProp1, stProp2, stPropVal1, stPropVal2, SI=True, accuracy=None):
         """
-        Calculates the thermodynamic state variables based on specified values.
-        I have thermodynamic variables:  P, T, v, h, u, s and x (7 things) from which I am choosing two.
-        Possible number of permutations:  7!/5! =42.
-        But, order of the two things does not matter, so 42/2=21
-        PT, Pv, Ph, Pu, Ps, Px (6)
-        Tv, Th, Tu, Ts, Tx (5)
-        vh, vu, vs, vx (4)
-        hu, hs, hx (3)
-        us, ux (2)
-        sx (1)
-        Total of 21 cases to deal with.  I will attack them in the order shown above
+        Calculates the thermodynamic state variables based on specified values.  The solving itself is done
+        by StateSolver.solveState, which returns the whole state rather than filling it in piece by piece.
+        Every call is timed into StateMetrics.defaultMetrics.
+        :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
         :return: nothing
         """
-        self.steamTable = XSteam(XSteam.UNIT_SYSTEM_MKS if SI else XSteam.UNIT_SYSTEM_FLS)
-        # Step 1: read which properties are being specified from the combo boxes
-        SP = [stProp1, stProp2]
-        SP[0] = SP[0].lower()
-        SP[1] = SP[1].lower()
-        f1 = float(stPropVal1)
-        f2 = float(stPropVal2)
-        # Step 2: select the proper case from the 21.  Note that PT is the same as TP etc.
-        if SP[0] == 'p' or SP[1] == 'p':
-            oFlipped = SP[0] != 'p'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.p = f1 if not oFlipped else f2
-            tSat = self.steamTable.tsat_p(self.p)
-            # case 1:  pt or tp
-            if SP1 == 't':
-                self.t = f2 if not oFlipped else f1
-                tSat = round(tSat)  # I will compare at 3 three decimal places
-                # compare T to TSat
-                if self.t < tSat or self.t > tSat:
-                    self.region = "sub-cooled liquid" if self.t < tSat else "super-heated vapor"
-                else:  # this is ambiguous since at saturated temperature
-                    self.region = "two-phase"
-                    self.x = 0.5
-            # case 2: pv or vp
-            elif SP1 == 'v':
-                self.v = f2 if not oFlipped else f1
-                vf = round(self.steamTable.vL_p(self.p), 5)
-                vg = round(self.steamTable.vV_p(self.p), 3)
-                # compare v to vf and vg
-                if self.v < vf or self.v > vg:
-                    self.region = "sub-cooled liquid" if self.v < vf else "super-heated vapor"
-                    # since I can't find properties using v, I will use fsolve to find T
-                    dt = 1.0 if self.v > vg else -1.0
-                    fn1 = lambda T: self.v - self.steamTable.v_pt(self.p, T)
-                    self.t = fsolve(fn1, [tSat + dt])[0]
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.v - self.vf) / (self.vgf)
-                    self.t = tSat
-            # case 3 pu or up
-            elif SP1 == 'u':
-                self.u = f2 if not oFlipped else f1
-                uf = round(self.steamTable.uL_p(self.p), 5)
-                ug = round(self.steamTable.uV_p(self.p), 3)
-                ugf = ug-uf
-                # compare u to uf and ug
-                if self.u < uf or self.u > ug:
-                    self.region = "sub-cooled liquid" if self.u < uf else "super-heated vapor"
-                    # since I can't find properties using u, I will use fsolve to find T
-                    dt = 1.0 if self.u > ug else -1.0
-                    fn3 = lambda T: self.u - self.steamTable.u_pt(self.p, T)
-                    self.t = fsolve(fn3, [tSat + dt])[0]
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.u - uf) / (ugf)
-                    self.t = tSat
-            # case 4 ph or hp
-            elif SP1 == 'h':
-                self.h = f2 if not oFlipped else f1;
-                hf = self.steamTable.hL_p(self.p)
-                hg = self.steamTable.hL_p(self.p)
-                hgf=hg-hf
-                # compare h to hf and hg
-                if self.h < hf or self.h > hg:
-                    self.region = "sub-cooled liquid" if self.h < hf else "super-heated vapor"
-                    self.t = self.steamTable.t_ph(self.p, self.h)
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.h - hf) / (hgf)
-                    self.t = tSat
-            # case 5 ps or sp
-            elif SP1 == 's':
-                self.s = f2 if not oFlipped else f1
-                sf=self.steamTable.sL_p(self.p)
-                sg=self.steamTable.sV_p(self.p)
-                sgf=sg-sf
-                # compare s to sf and sg
-                if self.s < sf or self.s > sg:
-                    self.region = "sub-cooled liquid" if self.s < sf else "super-heated vapor"
-                    self.t = self.steamTable.t_ps(self.p, self.s)
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.s - sf) / (sgf)
-            # case 6 px or xp
-            elif SP1 == 'x':
-                self.region = "two-phase"
-                self.x = f2 if not oFlipped else f1
-                self.t = tSat
-        elif SP[0] == 't' or SP[1] == 't': # t and another property specified
-            oFlipped = SP[0] != 't'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.t=f1 if not oFlipped else f2
-            pSat = self.steamTable.psat_t(self.t)
-            # case 7:  tv or vt
-            if SP1 == 'v':
-                self.v = f2 if not oFlipped else f1
-                vf=self.steamTable.vL_p(pSat)
-                vg=self.steamTable.vV_p(pSat)
-                vgf=vg-vf
-                # compare v to vf and vg
-                if self.v < vf or self.v > vg:
-                    self.region = "sub-cooled liquid" if self.v < vf else "super-heated vapor"
-                    # since I can't find properties using v, I will use fsolve to find P
-                    dp = -0.1 if self.v > vg else 0.1
-                    fn3 = lambda P: [self.v - self.steamTable.v_pt(P, self.t)]
-                    self.p = fsolve(fn3, [pSat + dp])[0]
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.v - vf) / (vgf)
-                    self.p = self.pSat
-            # case 8:  tu or ut
-            elif SP1 == 'u':
-                self.u = f2 if not oFlipped else f1
-                uf=self.steamTable.uL_p(pSat)
-                ug=self.steamTable.uV_p(pSat)
-                ugf=ug-uf
-                # compare u to uf and ug
-                if self.u < uf or self.u > ug:
-                    self.region = "sub-cooled liquid" if self.u < uf else "super-heated vapor"
-                    # since I can't find properties using u, I will use fsolve to find P
-                    dp = 0.1 if self.u > ug else -0.1
-                    fn8 = lambda P: self.u - self.steamTable.u_pt(self.t, P)
-                    self.p = fsolve(fn8, [pSat + dp])[0]
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.u - uf) / (ugf)
-                    self.p = self.pSat
-            # case 9:  th or ht
-            elif SP1 == 'h':
-                self.h = f2 if not oFlipped else f1
-                hf=self.steamTable.hL_p(pSat)
-                hg=self.steamTable.hV_p(pSat)
-                hgf=hg-hf
-                # compare h to hf and hg
-                if self.h < hf or self.h > hg:
-                    self.region = "sub-cooled liquid" if self.h < hf else "super-heated vapor"
-                    self.p = self.steamTable.p_th(self.t, self.h)
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.p = pSat
-                    self.x = (self.h - hf) / (hgf)
-            # case 10:  ts or st
-            elif SP1 == 's':
-                self.s = f2 if not oFlipped else f1
-                sf=self.steamTable.sL_p(pSat)
-                sg=self.steamTable.sV_p(pSat)
-                sgf=sg-sf
-                # compare s to sf and sg
-                if self.s < self.sf or self.s > sg:
-                    self.region = "sub-cooled liquid" if self.s < sf else "super-heated vapor"
-                    self.p = self.steamTable.p_ts(self.t, self.s)
-                    # now use P and T
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.p = pSat
-                    self.x = (self.s - sf) / (sgf)
-            # case 11:  tx or xt
-            elif SP1 == 'x':
-                self.x = f2 if not oFlipped else f1
-                self.region = "two-phase"
-                self.p = pSat
-        elif SP[0] == 'v' or SP[1] == 'v':
-            oFlipped = SP[0] != 'v'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.v = f1 if not oFlipped else f2
-            # case 12:  vh or hv
-            if SP1 == 'h':
-                self.h = f2 if not oFlipped else f1
-                #find p where h and v match
-                def fn12(P):
-                    # could be single phase or two-phase, but both v&h have to match at same x
-                    hf=self.steamTable.hL_p(P)
-                    hg=self.steamTable.hV_p(P)
-                    hgf=hg-hf
-                    vf=self.steamTable.vL_p(P)
-                    vg=self.steamTable.vV_p(P)
-                    vgf=vg-vf
-                    if self.between(self.h, hf, hg):
-                        self.x = (self.h - hf) / hgf
-                        return self.v - (vf + self.x * vgf)
-                    # could be single phase
-                    return self.v - self.steamTable.v_ph(P, self.h)
-
-                self.p = fsolve(fn12, [1.0])[0]
-                vf=self.steamTable.vL_p(self.p)
-                vg=self.steamTable.vV_p(self.p)
-                tsat=self.steamTable.tsat_p(self.p)
-                # compare v to vf and vg
-                if self.v < vf or self.v > vg:
-                    self.region = "sub-cooled liquid" if self.v < vf else "super-heated vapor"
-                    dt = -1 if self.v<vf else 1
-                    findtgivenv=lambda t: self.v-self.steamTable.v_pt(self.p, t)
-                    self.t=fsolve(findtgivenv,[tsat+dt])[0]
-                else:  # two-phase
-                    self.region = "two-phase"
-                    self.t=tsat
-                    # first calculate quality
-                    self.x = (self.v - self.vf) / (self.vgf)
-            # case 13:  vu or uv
-            elif SP1 == 'u':
-                self.u = f2 if not oFlipped else f1
-
-                # use fsolve to find P&T at this v & u
-                def fn13(PT):
-                    p,t=PT
-                    uf=self.steamTable.uL_p(p)
-                    ug=self.steamTable.uV_p(p)
-                    ugf=ug-uf
-                    vf=self.steamTable.vL_p(p)
-                    vg=self.steamTable.vV_p(p)
-                    vgf=vg-vf
-                    if self.between(self.u, uf,ug):
-                        self.t = self.tSat
-                        self.x = (self.u - uf) / ugf
-                        return [self.v - (vf + self.x * vgf), 0]
-                    return [self.v - self.steamTable.v_pt(p, t), self.u - self.steamTable.u_pt(p, t)]
-
-                props = fsolve(fn13, [1, 100])
-                self.p = props[0]
-                self.t = props[1]
-                uf=self.steamTable.uL_p(self.p)
-                ug=self.steamTable.uV_p(self.p)
-                ugf=ug-uf
-                if self.u<uf or self.u>ug:
-                    self.region = "sub-cooled" if self.u<uf else "super-heated"
-                else:
-                    self.region = "two-phase"
-                    self.x = (self.u-uf)/ugf
-            # case 14:  vs os sv
-            elif SP1 == 's':
-                self.s = f2 if not oFlipped else f1
-                def fn14(PT):
-                    p, t = PT
-                    sf = self.steamTable.uL_p(p)
-                    sg = self.steamTable.uV_p(p)
-                    sgf = sg - sf
-                    vf = self.steamTable.vL_p(p)
-                    vg = self.steamTable.vV_p(p)
-                    vgf = vg - vf
-                    if self.between(self.s, sf, sg):
-                        self.x = (self.s - sf) / sgf
-                        return [self.v - vf - self.x * vgf, 0.0]
-                    return [self.v - self.steamTable.v_pt(p,t),
-                            self.s - self.steamTable.s_pt(p,t)]
-                props = fsolve(fn14, [1, self.steamTable.sV_p(1)])
-                self.p = props[0]
-                self.t = props[1]
-                sg=self.steamTable.sV_p(self.p)
-                sf=self.steamTable.sL_p(self.p)
-                sgf=sg-sf
-                # compare s to sf and sg
-                if self.s < sf or self.s > sg:
-                    self.region = "sub-cooled liquid" if self.s < self.sf else "super-heated vapor"
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.p = self.pSat
-                    self.t = self.tSat
-                    self.x = (self.s - sf) / (sgf)
-            # case 15:  vx or xv
-            elif SP1 == 'x':
-                self.x = f2 if not oFlipped else f1
-                self.x = self.clamp(self.x, 0.0, 1.0)
-                self.region = "two-phase"
-
-                def fn15(p):
-                    vf=self.steamTable.vL_p(p)
-                    vg=self.steamTable.vV_p(p)
-                    vgf=vg-vf
-                    return self.v - (vf + self.x * vgf)
-
-                props = fsolve(fn15, [1])
-                self.p = props[0]
-                self.t = self.steamTable.tsat_p(self.p)
-        elif SP[0] == 'h' or SP[1] == 'h':
-            oFlipped = SP[0] != 'h'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.h=f1 if not oFlipped else f2
-            # case 16:  hu or uh
-            if SP1 == 'u':
-                self.u = f2 if not oFlipped else f1
-                # use fsolve to find P&T at this h & u
-                def fn16(PT):
-                    p,t=PT
-                    uf=self.steamTable.uL_p(p)
-                    ug=self.steamTable.uV_p(p)
-                    ugf=ug-uf
-                    hf=self.steamTable.hL_p(p)
-                    hg=self.steamTable.hV_p(p)
-                    hgf=hg-hf
-                    if self.between(self.u, uf, ug):
-                        self.x = (self.u - self.uf) / self.ugf
-                        return [self.h - hf - self.x * hg, 0.0]
-                    return [self.h - self.steamTable.h_pt(p,t), self.u - self.steamTable.u_pt(p,t)]
-
-                props = fsolve(fn16, [1, 100])
-                self.p = props[0]
-                self.t = props[1]
-                uf = self.steamTable.uL_p(self.p)
-                ug = self.steamTable.uV_p(self.p)
-                ugf = ug - uf
-                # compare u to uf and ug
-                if self.u < uf or self.u > ug:
-                    self.region = "sub-cooled liquid" if self.u < uf else "super-heated vapor"
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.u - uf) / (ugf)
-            # case 17:  hs or sh
-            elif SP1 == 's':
-                self.s = f2 if not oFlipped else f1
-                def fn17(PT):
-                    p,t=PT
-                    sf=self.steamTable.sL_p(p)
-                    sg=self.steamTable.sV_p(p)
-                    sgf=sg-sf
-                    hf=self.steamTable.hL_p(p)
-                    hg=self.steamTable.hV_p(p)
-                    hgf=hg-hf
-                    if self.between(self.s, sf, sg):
-                        self.x = (self.s - self.sf) / self.sgf
-                        return [self.h - hf - self.x * hg, 0.0]
-                    return [self.h - self.steamTable.h_pt(p,t), self.s - self.steamTable.s_pt(p,t)]
-
-                props = fsolve(fn17, [1, 100])
-                self.p = props[0]
-                self.t = props[1]
-                sf = self.steamTable.sL_p(self.p)
-                sg = self.steamTable.sV_p(self.p)
-                sgf = sg - sf
-                # compare s to sf and sg
-                if self.s < sf or self.s > sg:
-                    self.region = "sub-cooled liquid" if self.s < sf else "super-heated vapor"
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.s - sf) / (sgf)
-            # case 18:  hx or xh
-            elif SP1 == 'x':
-                self.x = f2 if not oFlipped else f1
-                self.x = self.clamp(self.x, 0.0, 1.0)
-                self.region = "two-phase"
-
-                def fn18(p):
-                    hf = self.steamTable.hL_p(self.p)
-                    hg = self.steamTable.hV_p(self.p)
-                    hgf = hg - hf
-                    return self.h - (hf + self.x * hgf)
-
-                props = fsolve(fn18, [1])
-                self.p = props[0]
-                self.t = self.steamTable.tsat_p(self.p)
-        elif SP[0] == 'u' or SP[1] == 'u':
-            oFlipped = SP[0] != 'u'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.u = f1 if not oFlipped else f2
-
-            # case 19:  us or su
-            if SP1 == 's':
-                self.s = f2 if not oFlipped else f1
-                def fn19(PT):
-                    p,t=PT
-                    sf=self.steamTable.sL_p(p)
-                    sg=self.steamTable.sV_p(p)
-                    sgf=sg-sf
-                    uf=self.steamTable.uL_p(p)
-                    ug=self.steamTable.uV_p(p)
-                    ugf=ug-uf
-                    if self.between(self.s, sf, sg):
-                        self.x = (self.s - self.sf) / self.sgf
-                        return [0.0, self.s - sf - self.x * sg]
-                    return [self.u - self.steamTable.u_pt(p,t), self.s - self.steamTable.s_pt(p,t)]
-
-                props = fsolve(fn19, [1, 100])
-                self.p = props[0]
-                self.t = props[1]
-                sf = self.steamTable.sL_p(self.p)
-                sg = self.steamTable.sV_p(self.p)
-                sgf = sg - sf
-                # compare s to sf and sg
-                if self.s < sf or self.s > sg:
-                    self.region = "sub-cooled liquid" if self.s < sf else "super-heated vapor"
-                else:  # two-phase
-                    self.region = "two-phase"
-                    # first calculate quality
-                    self.x = (self.s - sf) / (sgf)
-            # case 20:  ux or xu
-            elif SP1 == 'x':
-                self.x = f2 if not oFlipped else f1
-                self.x=self.clamp(self.x,0,1)
-                self.region = "two-phase"
-                def fn20(p):
-                    hf=self.steamTable.hL_p(p)
-                    hg=self.steamTable.hV_p(p)
-                    hgf=hg-hf
-                    return self.h - (hf + self.x * hgf)
-
-                props = fsolve(fn20, [1])
-                self.p = props[0]
-                self.t = self.steamTable.tsat_p(self.p)
-        elif SP[0] == 's' or SP[1] == 's':
-            oFlipped = SP[0] != 's'
-            SP1 = SP[0] if oFlipped else SP[1]
-            self.s = f1 if not oFlipped else f2
-            # case 21:  sx or xs
-            if SP1 == 'x':
-                self.x = f2 if not oFlipped else f1
-                self.x=self.clamp(self.x,0,1)
-                self.region = "two-phase"
-
-                def fn21(p):
-                    sf=self.steamTable.sL_p(p)
-                    sg=self.steamTable.sV_p(p)
-                    sgf = sg - sf
-                    return self.s - (sf + self.x * sgf)
-
-                props = fsolve(fn21, [1])
-                self.p = props[0]
-                self.t = self.steamTable.tsat_p(self.p)
-        self.computeProperties()
+        self.steamTable = getSteamTable(SI)
+        self.region, self.p, self.t, self.v, self.u, self.h, self.s, self.x = \
+            defaultMetrics.solveState(stProp1, stProp2, stPropVal1, stPropVal2, SI, accuracy=accuracy)
 
     def __sub__(self, other):
         delta = thermoState()
         delta.p=self.p-other.p
-        delta.t=self.t-other.timeData
+        delta.t=self.t-other.t
         delta.h=self.h-other.h
         delta.u=self.u-other.u
         delta.s=self.s-other.s
@@ -549,11 +119,41 @@ class main_window(QWidget,Ui__frm_StateCalculator):
     def __init__(self):
         super().__init__()
         self.setupUi(self)
+        self.setupTabs()
         self.SetupSlotsAndSignals()
         self.steamTable=XSteam(XSteam.UNIT_SYSTEM_MKS)
         self.currentUnits='SI'
         self.setUnits()
         self.show()
+    def setupTabs(self):
+        """
+        Puts everything below the units box on a "Single state" tab and adds the batch tab beside it.  Done here
+        rather than in ThermoStateCalc.ui so the generated form stays as designed.
+        :return: nothing
+        """
+        self._tab_Modes = QTabWidget(self)
+        single = QWidget()
+        singleLayout = QVBoxLayout(single)
+        while self.verticalLayout.count() > 1:
+            item = self.verticalLayout.takeAt(1)
+            if item.widget() is not None:
+                singleLayout.addWidget(item.widget())
+            else:
+                singleLayout.addItem(item)
+        self._tab_Modes.addTab(single, "Single state")
+        self._tab_Batch = batchTab(self._rdo_SI.isChecked)
+        self._tab_Modes.addTab(self._tab_Batch, "Batch")
+        self.verticalLayout.addWidget(self._tab_Modes)
+
+    def closeEvent(self, event):
+        """
+        Stop a running batch before the window, and the batch tab's worker thread with it, goes away
+        :param event: the QCloseEvent
+        :return: nothing
+        """
+        self._tab_Batch.stopBatch()
+        super().closeEvent(event)
+
     def SetupSlotsAndSignals(self):
         """
         I've modified the original to include a state2.  Here I assign slots to GUI actions.
@@ -736,7 +336,7 @@ class main_window(QWidget,Ui__frm_StateCalculator):
         :return:
         """
         stDelta="Property change:"
-        stDelta+="\nT2-T1 = {:0.3f} {:}".format(state2.timeData - state1.timeData, self.t_Units)
+        stDelta+="\nT2-T1 = {:0.3f} {:}".format(state2.t - state1.t, self.t_Units)
         stDelta+="\nP2-P1 = {:0.3f} {:}".format(state2.p-state1.p, self.p_Units)
         stDelta+="\nh2-h1 = {:0.3f} {:}".format(state2.h-state1.h, self.h_Units)
         stDelta+="\nu2-u1 = {:0.3f} {:}".format(state2.u-state1.u, self.u_Units)
@@ -770,7 +370,13 @@ class main_window(QWidget,Ui__frm_StateCalculator):
 
         f=[float(self._le_Property1.text()),float(self._le_Property2.text())]
         SI=self._rdo_SI.isChecked()
-        self.state1.setState(SP[0],SP[1],f[0],f[1],SI)
+        try:
+            self.state1.setState(SP[0],SP[1],f[0],f[1],SI)
+        except (ValueError, RuntimeError) as e:
+            # bad input or a solve that ran past its budget:  say so instead of showing nonsense
+            self._lbl_Warning.setText("Warning:  {:}".format(e))
+            self._lbl_StateProperties.setText("")
+            return
         self._lbl_StateProperties.setText(self.makeLabel(self.state1))
 
 #endregion
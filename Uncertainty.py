@@ -0,0 +1,270 @@
+"""
+Propagates the uncertainty of the two specified values of a state to every property by Monte Carlo:  the
+inputs are sampled around their means all at once and the samples are solved as one batch, then summarised as
+means, standard deviations, percentiles and the probability of each region.
+Samples are solved by the array solvers, every one started from the state at the means:
+    p-t                     StateProcess.statesPT
+    p with v, u, h or s     StateProcess.statesPY, Newton on t
+    p-x, t-x                the IF97Array saturation line
+    two of v, u, h and s    ArraySolver.solvePairArray, Newton on (ln p, t)
+Every sample starts from the mean state moved to first order by the derivatives there, so each takes the one
+or two Newton steps its own small difference needs.  The pairs of t or x with v, u, h or s have no array solver and their samples go one at a time to
+StateSolver.solveState, as do the samples an array solver could not finish (region 3 and beyond the kernel).
+    python Uncertainty.py [--n 10000]
+propagates a few instrument uncertainties and times them against the same samples through thermoState.
+"""
+#region imports
+import numpy as np
+from IF97Array import propertiesPT, saturationP, saturationT
+from StateSolver import solveState
+from StateBatch import stateColumns, regionNames
+#endregion
+
+#region class definitions
+class inputDistribution:
+    def __init__(self, kind='normal', width=0.0, relative=False):
+        '''
+        How a specified value scatters about its mean
+        :param kind: 'normal' (width is the standard deviation), 'uniform' or 'triangular' (width is the half
+                     width, as an instrument's stated accuracy usually is)
+        :param width: spread, in the property's units or as a fraction of the mean if relative
+        :param relative: width is a fraction of the mean (e.g. 0.005 for 0.5 % of reading)
+        '''
+        if kind not in ('normal', 'uniform', 'triangular'):
+            raise ValueError("Unknown distribution {:}, expected normal, uniform or triangular".format(kind))
+        self.kind = kind
+        self.width = float(width)
+        self.relative = relative
+
+    def sample(self, rng, mean, n):
+        """
+        :param rng: numpy Generator
+        :param mean: the mean value
+        :param n: number of samples
+        :return: array of n samples
+        """
+        w = self.width * abs(mean) if self.relative else self.width
+        if w == 0.0:
+            return np.full(n, float(mean))
+        if self.kind == 'normal':
+            return rng.normal(mean, w, n)
+        if self.kind == 'uniform':
+            return rng.uniform(mean - w, mean + w, n)
+        return rng.triangular(mean - w, mean, mean + w, n)
+
+    def std(self, mean):
+        """
+        :return: the standard deviation of the samples
+        """
+        w = self.width * abs(mean) if self.relative else self.width
+        return w if self.kind == 'normal' else w / (3.0 ** 0.5 if self.kind == 'uniform' else 6.0 ** 0.5)
+
+class propagation:
+    def __init__(self, stProp1, stProp2, samples1, samples2, states, meanState, percentiles, SI):
+        '''
+        The result of propagate
+        :param samples1: the samples of stProp1
+        :param samples2: the samples of stProp2
+        :param states: stateColumns of the solved samples, nan where a sample has no state
+        :param meanState: stateResult at the means
+        :param percentiles: the percentiles summarised
+        '''
+        self.pair = (stProp1.lower(), stProp2.lower())
+        self.samples = (samples1, samples2)
+        self.states = states
+        self.meanState = meanState
+        self.percentiles = tuple(percentiles)
+        self.SI = SI
+        self.n = len(states)
+        solved = ~np.isnan(states.p)
+        self.failed = int(self.n - solved.sum())
+        self.mean, self.std, self.quantiles = {}, {}, {}
+        for k in 'ptvuhsx':
+            values = getattr(states, k)[solved]
+            self.mean[k] = float(np.mean(values)) if len(values) else float('nan')
+            self.std[k] = float(np.std(values, ddof=1)) if len(values) > 1 else float('nan')
+            self.quantiles[k] = dict(zip(self.percentiles, np.percentile(values, self.percentiles).tolist())) \
+                if len(values) else {q: float('nan') for q in self.percentiles}
+        # of all samples, so the probabilities and the failed fraction add up to one
+        counts = np.bincount(states.region.codes, minlength=len(regionNames))
+        self.regionProbability = {name: counts[code] / self.n for code, name in enumerate(regionNames)
+                                  if name is not None and counts[code]}
+
+    def report(self):
+        """
+        :return: the summary as a string
+        """
+        lines = ["{:}-{:}, {:} samples, {:} without a state".format(self.pair[0], self.pair[1], self.n, self.failed)]
+        lines.append("{:4}{:>14}{:>14}{:>12}".format("", "at the means", "mean", "std") +
+                     "".join("{:>12}".format("p{:g}".format(q)) for q in self.percentiles))
+        for k in 'ptvuhsx':
+            lines.append("{:4}{:>14.6g}{:>14.6g}{:>12.4g}".format(k, getattr(self.meanState, k), self.mean[k],
+                                                                 self.std[k]) +
+                         "".join("{:>12.6g}".format(self.quantiles[k][q]) for q in self.percentiles))
+        lines.append("regions:  " + ", ".join("{:} {:0.2%}".format(name, prob)
+                                             for name, prob in self.regionProbability.items()))
+        return "\n".join(lines)
+#endregion
+
+#region function definitions
+def _asDistribution(spread):
+    """
+    A number is taken as the standard deviation of a normal distribution
+    """
+    if spread is None:
+        return inputDistribution('normal', 0.0)
+    if isinstance(spread, inputDistribution):
+        return spread
+    return inputDistribution('normal', spread)
+
+def _fallback(cols, idx, aName, a, bName, b, SI, accuracy=None):
+    """
+    Solve rows one at a time with StateSolver
+    """
+    for i in idx:
+        try:
+            cols.setRow(i, solveState(aName, bName, a[i], b[i], SI, accuracy=accuracy))
+        except Exception as e:
+            cols.errors[int(i)] = str(e)
+
+def _saturated(cols, idx, p, x, SI):
+    """
+    Two-phase rows at pressures p and qualities x; rows off the kernel's saturation line or with x outside
+    [0, 1] are left nan
+    :return: the rows of idx left
+    """
+    sat = saturationP(p, SI)
+    ok = np.isfinite(sat['tsat']) & (x >= 0.0) & (x <= 1.0)
+    rows = idx[ok]
+    for k in 'vuhs':
+        getattr(cols, k)[rows] = sat[k + 'L'][ok] + x[ok] * (sat[k + 'V'][ok] - sat[k + 'L'][ok])
+    cols.p[rows], cols.t[rows], cols.x[rows] = p[ok], sat['tsat'][ok], x[ok]
+    cols.region.codes[rows] = regionNames.index("two-phase")
+    return idx[~ok]
+
+def _linearSeeds(meanState, aName, a, bName, b, SI):
+    """
+    Starting points for samples near a single-phase mean state:  the mean's (p, t) plus the first order change
+    the samples' differences from its values ask for.  With aName 'p' only t is found.
+    :return: (p, t) arrays, or None where the mean state is not in IF97 regions 1 or 2
+    """
+    vals, dp, dT = propertiesPT(meanState.p, meanState.t, SI, derivatives=True)
+    if meanState.region == "two-phase" or vals['region'] == 0:
+        return None
+    p0, t0 = meanState.p, meanState.t
+    if aName == 'p':
+        p = a
+        t = t0 + (b - getattr(meanState, bName) - dp[bName] * (a - p0)) / dT[bName]
+    else:
+        da, db = a - getattr(meanState, aName), b - getattr(meanState, bName)
+        det = dp[aName] * dT[bName] - dT[aName] * dp[bName]
+        p = p0 + np.clip((dT[bName] * da - dT[aName] * db) / det, -0.5 * p0, p0)
+        t = t0 + (dp[aName] * db - dp[bName] * da) / det
+    # a step the linearisation cannot be trusted for is cut back to 50 K
+    return p, t0 + np.clip(t - t0, -50.0, 50.0)
+
+def solveSamples(stProp1, stProp2, a, b, SI=True, meanState=None, accuracy=None):
+    """
+    Solve a batch of states of one pair of properties with the array solvers, seeded from a state among them
+    :param stProp1: first specified property
+    :param stProp2: second specified property
+    :param a: array of values of stProp1
+    :param b: array of values of stProp2
+    :param SI: boolean True=SI units, False = English units
+    :param meanState: stateResult the samples scatter around, the starting points are found from
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a stateColumns
+    """
+    from StateProcess import statesPT, statesPY
+    from ArraySolver import solvePairArray
+    aName, bName = stProp1.lower(), stProp2.lower()
+    order = 'ptxvuhs'
+    if order.find(bName) < order.find(aName):
+        aName, bName, a, b = bName, aName, b, a
+    a, b = np.asarray(a, float), np.asarray(b, float)
+    n = len(a)
+    if aName == 'p' and bName == 't':
+        return statesPT(a, b, SI, accuracy)
+    seeds = _linearSeeds(meanState, aName, a, bName, b, SI) if meanState is not None and aName in 'pvuhs' and \
+        bName in 'vuhs' else None
+    if aName == 'p' and bName in 'vuhs':
+        return statesPY(a, bName, b, SI, None if seeds is None else seeds[1], accuracy=accuracy)
+    if aName in 'vuhs':
+        if seeds is None:
+            return solvePairArray(aName, bName, a, b, SI, accuracy=accuracy)[0]
+        return solvePairArray(aName, bName, a, b, SI, seedP=seeds[0], seedT=seeds[1], damping=1e-12,
+                              accuracy=accuracy)[0]
+    cols = stateColumns(n)
+    rest = np.arange(n)
+    if aName == 'p' and bName == 'x':
+        rest = _saturated(cols, rest, a, b, SI)
+    elif aName == 't' and bName == 'x':
+        rest = _saturated(cols, rest, saturationT(a, SI), b, SI)
+    _fallback(cols, rest, aName, a, bName, b, SI, accuracy)
+    return cols
+
+def propagate(stProp1, stProp2, mean1, mean2, spread1=None, spread2=None, n=10000, SI=True, seed=0,
+              percentiles=(2.5, 50.0, 97.5), accuracy=None):
+    """
+    Monte Carlo propagation of the uncertainty of a state's two specified values to all its properties
+    :param stProp1: first specified property ('p','t','v','u','h','s' or 'x')
+    :param stProp2: second specified property
+    :param mean1: mean value of stProp1
+    :param mean2: mean value of stProp2
+    :param spread1: inputDistribution of stProp1, or a number for a normal distribution's standard deviation;
+                    None for no uncertainty
+    :param spread2: the same for stProp2
+    :param n: number of samples
+    :param SI: boolean True=SI units, False = English units
+    :param seed: the same seed gives the same samples
+    :param percentiles: percentiles of every property to report
+    :param accuracy: name of the AccuracyTier tier to solve to, the process default if None
+    :return: a propagation
+    """
+    rng = np.random.default_rng(seed)
+    a = _asDistribution(spread1).sample(rng, float(mean1), n)
+    b = _asDistribution(spread2).sample(rng, float(mean2), n)
+    meanState = solveState(stProp1, stProp2, mean1, mean2, SI, accuracy=accuracy)
+    states = solveSamples(stProp1, stProp2, a, b, SI, meanState, accuracy)
+    return propagation(stProp1, stProp2, a, b, states, meanState, percentiles, SI)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import time
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Monte Carlo uncertainty of a few states")
+    parser.add_argument('--n', type=int, default=10000, help="samples per state")
+    args = parser.parse_args()
+    from ThermoStateCalc_app import thermoState
+    cases = [
+        # superheated steam at a turbine inlet, a 0.25 % of reading transmitter and a +/-1 C thermocouple
+        ('p', 't', 80.0, 480.0, inputDistribution('normal', 0.0025, True), inputDistribution('uniform', 1.0)),
+        # boiler feed water just below saturation:  some samples boil
+        ('p', 't', 10.0, 178.0, 0.05, 1.0),
+        # wet steam at a turbine exhaust by p and h
+        ('p', 'h', 0.1, 2400.0, inputDistribution('normal', 0.01, True), 10.0),
+        # a state known by h and s, as from an energy and entropy balance
+        ('h', 's', 3200.0, 6.9, 5.0, 0.005),
+        ('t', 'x', 150.0, 0.9, 0.5, inputDistribution('triangular', 0.02)),
+    ]
+    for p1, p2, m1, m2, s1, s2 in cases:
+        t0 = time.perf_counter()
+        result = propagate(p1, p2, m1, m2, s1, s2, args.n)
+        batch = time.perf_counter() - t0
+        # the same samples one at a time, as before
+        m = min(args.n, 1000)
+        state = thermoState()
+        t0 = time.perf_counter()
+        for x, y in zip(result.samples[0][:m], result.samples[1][:m]):
+            try:
+                state.setState(p1, p2, x, y)
+            except Exception:
+                pass
+        scalar = (time.perf_counter() - t0) / m * args.n
+        print(result.report())
+        print("{:0.3f} s as a batch, {:0.2f} s ({:0.0f}x) one setState at a time\n".format(
+            batch, scalar, scalar / batch))
+#endregion
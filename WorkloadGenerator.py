@@ -0,0 +1,329 @@
+"""
+Seeded synthetic inputs for setState and the batch engines, with a chosen mix of property pairs and regions.
+Every row is made from a reference state (kept with the rows, so results can be checked against it):
+    sub-cooled          IF97 region 1, p from 0.1 to 500 bar (or the same in psi), t up to saturation or 350 C
+    two-phase           saturation line from 0.05 bar to psat(350 C), any x
+    super-heated        IF97 region 2, p from 0.05 to 500 bar, t from saturation or the B23 line to 800 C
+    near-critical       IF97 region 3 within about 8% of the critical temperature, off the dome
+The same seed gives the same physical states in either unit system.  A row's pair comes from the pair mix and
+its region from the region mix, limited to the regions the pair can fix (x pairs are two-phase, p-t is not).
+    python WorkloadGenerator.py --n 1000000 --pairs pt-heavy --regions plant --out rows.npz
+writes a workload as .npz, as text for StateBatch.parseRows (.csv or .txt) or as a StateRecorder log (.rec)
+to replay.
+"""
+#region imports
+import itertools
+from functools import lru_cache
+import numpy as np
+import IF97
+import IF97Array
+from IF97 import fromMPa, fromKelvin, toMPa, _vToSI
+#endregion
+
+#region class definitions
+pairs = tuple(a + b for a, b in itertools.combinations('ptvhusx', 2))
+regions = ('sub-cooled liquid', 'two-phase', 'super-heated vapor', 'near-critical')
+
+def _mix(heavy, weight, rest=None):
+    """
+    Weights putting weight on each of heavy and sharing what is left over the other pairs
+    """
+    rest = [p for p in pairs if p not in heavy] if rest is None else rest
+    out = {p: (1.0 - weight * len(heavy)) / len(rest) for p in rest}
+    out.update({p: weight for p in heavy})
+    return out
+
+# named mixes; any dict of {pair or region: weight} also works
+pairMixes = {'uniform': {p: 1.0 for p in pairs},
+             'pt-heavy': _mix(['pt'], 0.7),
+             'hs-heavy': _mix(['hs'], 0.7),
+             'px-heavy': _mix(['px', 'tx'], 0.35),
+             'process': _mix(['ph', 'ps'], 0.3)}
+regionMixes = {'uniform': {r: 1.0 for r in regions},
+               'plant': {'sub-cooled liquid': 0.3, 'two-phase': 0.2, 'super-heated vapor': 0.45, 'near-critical': 0.05},
+               'near-critical': {'sub-cooled liquid': 0.1, 'two-phase': 0.1, 'super-heated vapor': 0.1,
+                                 'near-critical': 0.7}}
+
+class workload:
+    def __init__(self, props, a, b, region, ref, SI):
+        '''
+        Rows for setState with the states they were made from.
+        :param props: array of pair names ('pt', 'hs', ...), as bytes
+        :param a: values of each row's first property
+        :param b: values of its second property
+        :param region: index into regions of each row
+        :param ref: dict of arrays p, t, v, u, h, s, x of the reference states
+        :param SI: boolean True=SI units, False = English units
+        '''
+        self.props = props
+        self.a = a
+        self.b = b
+        self.region = region
+        self.ref = ref
+        self.SI = SI
+
+    def __len__(self):
+        return len(self.a)
+
+    def rows(self, start=0, stop=None):
+        """
+        :return: list of (stProp1, stProp2, stPropVal1, stPropVal2), as StateBatch.solveBatch and
+                 solveBatchStream take them
+        """
+        return [(p[0], p[1], a, b) for p, a, b in zip(self.props[start:stop].astype(str).tolist(),
+                                                      self.a[start:stop].tolist(), self.b[start:stop].tolist())]
+
+    def byPair(self):
+        """
+        The rows grouped by pair and order of its properties, as ArraySolver.solvePairArray and StateProcess
+        take them
+        :return: generator of (pair, row indices, values of the first property, values of the second)
+        """
+        names, inverse = np.unique(self.props, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(names) + 1))
+        for k, name in enumerate(names):
+            idx = order[bounds[k]:bounds[k + 1]]
+            yield name.decode(), idx, self.a[idx], self.b[idx]
+
+    def save(self, path, rate=1000.0, seed=0):
+        """
+        Write the rows:  .npz keeps everything (read it back with loadWorkload), .rec is a StateRecorder log
+        with Poisson arrivals at rate per second, .jsonl is requests for StateStream (the row number as id),
+        anything else is text for StateBatch.parseRows.
+        :param path: file name
+        :param rate: requests per second in a .rec log
+        :return: nothing
+        """
+        path = str(path)
+        if path.endswith('.npz'):
+            np.savez(path, props=self.props, a=self.a, b=self.b, region=self.region, SI=self.SI, **self.ref)
+        elif path.endswith('.rec'):
+            from StateRecorder import recordType, writeRecording
+            records = np.zeros(len(self), dtype=recordType)
+            gaps = np.random.default_rng(seed).exponential(1.0 / rate, len(self))
+            records['time'] = np.cumsum(gaps)
+            records['props'] = self.props
+            records['flags'] = 1 if self.SI else 0
+            records['a'], records['b'] = self.a, self.b
+            writeRecording(path, records)
+        elif path.endswith('.jsonl'):
+            import json
+            units = 'SI' if self.SI else 'EN'
+            with open(path, 'w', newline='') as f:
+                f.writelines(json.dumps({'pair': p, 'values': [x, y], 'units': units, 'id': i}) + '\n'
+                             for i, (p, x, y) in enumerate(zip(self.props.astype(str).tolist(), self.a.tolist(),
+                                                               self.b.tolist())))
+        else:
+            a, b = np.char.mod('%.10g', self.a), np.char.mod('%.10g', self.b)
+            with open(path, 'w', newline='') as f:
+                f.write("# {:} units\nprop1,prop2,value1,value2\n".format('SI' if self.SI else 'English'))
+                f.writelines('{:},{:},{:},{:}\n'.format(p[0], p[1], x, y)
+                             for p, x, y in zip(self.props.astype(str).tolist(), a.tolist(), b.tolist()))
+#endregion
+
+#region function definitions
+def loadWorkload(path):
+    """
+    Read a workload written by workload.save to a .npz file
+    :return: a workload
+    """
+    with np.load(path) as data:
+        return workload(data['props'], data['a'], data['b'], data['region'],
+                        {k: data[k] for k in 'ptvuhsx'}, bool(data['SI']))
+
+def _weights(mix, names, kind):
+    """
+    Normalized weights of names from a named mix or a dict
+    """
+    table = pairMixes if kind == 'pair' else regionMixes
+    if isinstance(mix, str):
+        if mix not in table:
+            raise ValueError("Unknown {:} mix {:}, expected one of {:} or a dict".format(kind, mix, list(table)))
+        mix = table[mix]
+    unknown = set(mix) - set(names)
+    if unknown:
+        raise ValueError("Unknown {:}s in mix: {:}".format(kind, sorted(unknown)))
+    w = np.array([float(mix.get(k, 0.0)) for k in names])
+    if w.sum() <= 0.0 or (w < 0.0).any():
+        raise ValueError("The {:} mix needs non-negative weights that are not all zero".format(kind))
+    return w / w.sum()
+
+def _allowed(pair):
+    """
+    Which regions a pair can fix:  x only fixes two-phase states and p, t fixes everything but them
+    """
+    if 'x' in pair:
+        return np.array([False, True, False, False])
+    if pair == 'pt':
+        return np.array([True, False, True, True])
+    return np.ones(4, dtype=bool)
+
+@lru_cache(maxsize=None)
+def _domeDensities():
+    """
+    Saturated liquid and vapor densities from 623.15 K to the critical point, for telling region 3 points off
+    the dome from those under it
+    :return: (T, rhoL, rhoV) arrays
+    """
+    from StateSolver import getSteamTable
+    st = getSteamTable(True)
+    T = np.linspace(623.15, IF97.T_C - 0.05, 400)
+    return T, np.array([st.rhoL_t(x - 273.15) for x in T]), np.array([st.rhoV_t(x - 273.15) for x in T])
+
+def _subCooled(rng, n):
+    P = 10 ** rng.uniform(-2.0, np.log10(50.0), n)
+    top = np.where(P < 22.064, np.minimum(IF97Array.tsatP(np.minimum(P, 22.064)), 623.15), 623.15) - 0.5
+    T = 273.66 + rng.random(n) * (top - 273.66)
+    return P, T
+
+def _superHeated(rng, n):
+    P = 10 ** rng.uniform(np.log10(0.005), np.log10(50.0), n)
+    with np.errstate(invalid='ignore'):
+        tB23 = IF97.n23[3] + np.sqrt(np.maximum(P - IF97.n23[4], 0.0) / IF97.n23[2])
+    bottom = np.where(P <= IF97Array.psatT(623.15), IF97Array.tsatP(np.minimum(P, 22.064)), tB23) + 0.5
+    T = bottom + rng.random(n) * (1073.15 - bottom)
+    return P, T
+
+def _nearCritical(rng, n):
+    """
+    (P, T, rho) in region 3 off the dome:  uniform in rho and T around the critical point, keeping the points
+    inside region 3 and at least 1% away from the saturated densities
+    """
+    Td, rhoL, rhoV = _domeDensities()
+    out = [(np.zeros(0), np.zeros(0), np.zeros(0))]
+    got = 0
+    while got < n:
+        m = 2 * (n - got) + 16
+        T = rng.uniform(623.15 + 0.5, 1.08 * IF97.T_C, m)
+        rho = rng.uniform(0.4 * IF97.RHO_C, 1.9 * IF97.RHO_C, m)
+        P = toMPa(IF97Array.properties3(1.0 / rho, T - 273.15)['p'])
+        with np.errstate(invalid='ignore'):
+            tB23 = IF97.n23[3] + np.sqrt(np.maximum(P - IF97.n23[4], 0.0) / IF97.n23[2])
+            sub = T < Td[-1]
+            offDome = ~sub | (rho > 1.01 * np.interp(T, Td, rhoL)) | (rho < 0.99 * np.interp(T, Td, rhoV))
+            keep = (P > IF97Array.psatT(623.15)) & (P <= 100.0) & (T <= tB23 - 0.5) & offDome
+        out.append((P[keep], T[keep], rho[keep]))
+        got += int(keep.sum())
+    P, T, rho = (np.concatenate(c)[:n] for c in zip(*out))
+    return P, T, rho
+
+def makeWorkload(n, pairMix='uniform', regionMix='uniform', SI=True, seed=0):
+    """
+    A seeded workload of n rows
+    :param n: number of rows
+    :param pairMix: name in pairMixes or dict {pair: weight}
+    :param regionMix: name in regionMixes or dict {region: weight}
+    :param SI: boolean True=SI units, False = English units
+    :param seed: the same seed, mixes and n give the same rows
+    :return: a workload
+    """
+    pw = _weights(pairMix, pairs, 'pair')
+    rw = _weights(regionMix, regions, 'region')
+    rng = np.random.default_rng(seed)
+    pairIndex = rng.choice(len(pairs), size=n, p=pw)
+    region = np.empty(n, dtype=np.int8)
+    for k, pair in enumerate(pairs):
+        idx = np.flatnonzero(pairIndex == k)
+        if len(idx) == 0:
+            continue
+        w = rw * _allowed(pair)
+        if w.sum() <= 0.0:
+            raise ValueError("The region mix gives no weight to any region the pair {:} can fix".format(pair))
+        region[idx] = rng.choice(len(regions), size=len(idx), p=w / w.sum())
+    ref = {k: np.full(n, np.nan) for k in 'ptvuhsx'}
+    # single phase from (p, t) with the kernel
+    for r, make in ((0, _subCooled), (2, _superHeated)):
+        idx = np.flatnonzero(region == r)
+        P, T = make(rng, len(idx))
+        p, t = fromMPa(P, SI), fromKelvin(T, SI)
+        vals = IF97Array.propertiesPT(p, t, SI)
+        ref['p'][idx], ref['t'][idx] = p, t
+        for k in 'vuhs':
+            ref[k][idx] = vals[k]
+        ref['x'][idx] = 0.0 if r == 0 else 1.0
+    # two-phase from (p, x)
+    idx = np.flatnonzero(region == 1)
+    p = fromMPa(10 ** rng.uniform(np.log10(0.005), np.log10(IF97Array.psatT(623.15) * 0.999), len(idx)), SI)
+    x = rng.random(len(idx))
+    sat = IF97Array.saturationP(p, SI)
+    ref['p'][idx], ref['t'][idx], ref['x'][idx] = p, sat['tsat'], x
+    for k in 'vuhs':
+        ref[k][idx] = sat[k + 'L'] + x * (sat[k + 'V'] - sat[k + 'L'])
+    # near-critical from (v, t) with the region 3 equation
+    idx = np.flatnonzero(region == 3)
+    P, T, rho = _nearCritical(rng, len(idx))
+    t = fromKelvin(T, SI)
+    vals = IF97Array.properties3(1.0 / rho / _vToSI[SI], t, SI)
+    ref['t'][idx] = t
+    for k in 'pvuhs':
+        ref[k][idx] = vals[k]
+    liquid = np.where(P < 22.064, T < IF97Array.tsatP(np.minimum(P, 22.064)), T < IF97.T_C)
+    ref['x'][idx] = np.where(liquid, 0.0, 1.0)
+    # each row's pair of values, in a random order of the two properties as a caller would give them
+    names = np.array(pairs, dtype='S2')[pairIndex]
+    flip = rng.random(n) < 0.5
+    first = np.array([p[0] for p in pairs])[pairIndex]
+    second = np.array([p[1] for p in pairs])[pairIndex]
+    a, b = np.empty(n), np.empty(n)
+    for k in 'ptvhusx':
+        a = np.where(first == k, ref[k], a)
+        b = np.where(second == k, ref[k], b)
+    props = np.where(flip, np.char.add(second.astype('S1'), first.astype('S1')), names)
+    a, b = np.where(flip, b, a), np.where(flip, a, b)
+    return workload(props, a, b, region, ref, SI)
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import time
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Generate seeded setState inputs")
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--pairs', default='uniform', help="pair mix: {:}, or pair=weight,...".format(
+        ", ".join(pairMixes)))
+    parser.add_argument('--regions', default='uniform', help="region mix: {:}, or region=weight,...".format(
+        ", ".join(regionMixes)))
+    parser.add_argument('--english', action='store_true', help="use English units")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help=".npz, .rec, or text for StateBatch.parseRows")
+    parser.add_argument('--check', type=int, default=200, help="rows to solve back with solveState")
+    args = parser.parse_args()
+
+    def parseMix(text):
+        if '=' not in text:
+            return text
+        return {k.strip(): float(w) for k, w in (item.split('=') for item in text.split(','))}
+    SI = not args.english
+    t0 = time.perf_counter()
+    work = makeWorkload(args.n, parseMix(args.pairs), parseMix(args.regions), SI, args.seed)
+    dt = time.perf_counter() - t0
+    print("{:} rows in {:0.2f} s ({:0.0f} rows/s)".format(len(work), dt, len(work) / dt))
+    counts = np.bincount(work.region, minlength=len(regions))
+    print("regions: " + ", ".join("{:} {:0.1%}".format(r, c / len(work)) for r, c in zip(regions, counts)))
+    top = sorted(((int(np.sum((work.props == p.encode()) | (work.props == p[::-1].encode()))), p) for p in pairs),
+                 reverse=True)[:6]
+    print("most common pairs: " + ", ".join("{:} {:0.1%}".format(p, c / len(work)) for c, p in top))
+    if args.check:
+        from StateSolver import solveState
+        rng = np.random.default_rng(args.seed + 1)
+        bad = failed = 0
+        tTol = 0.01 if SI else 0.018
+        for i in rng.choice(len(work), size=min(args.check, len(work)), replace=False):
+            p = work.props[i].decode()
+            try:
+                s = solveState(p[0], p[1], work.a[i], work.b[i], SI)
+            except Exception:
+                failed += 1
+                continue
+            if abs(s.p / work.ref['p'][i] - 1.0) > 1e-4 or abs(s.t - work.ref['t'][i]) > tTol:
+                bad += 1
+        print("solved {:} rows back with solveState: {:} failed, {:} at another state".format(
+            min(args.check, len(work)), failed, bad))
+    if args.out:
+        t0 = time.perf_counter()
+        work.save(args.out)
+        print("wrote {:} in {:0.2f} s".format(args.out, time.perf_counter() - t0))
+#endregion